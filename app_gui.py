@@ -9,10 +9,11 @@ el log del sistema y las predicciones del clasificador.
 Requisitos: PyQt6 (pip install PyQt6)
 
 Arquitectura:
-- VideoThread: captura frames con IPCamera y emite frames (obj)
-- ClassifierThread: recibe frames (cola) y ejecuta classify_image en hilo
+- VisionThread: ejecuta pipeline.Pipeline (captura con IPCamera → clasificación en cola
+  acotada) y emite frames y predicciones
 - LogHandler -> cola: los logs se encolan y un QTimer los muestra en el QTextEdit
-- SSH: invocación a send_palletize en hilo para no bloquear GUI
+- SSH: invocación a send_palletize en hilo para no bloquear GUI, sobre la sesión
+  persistente de ev3_link.py
 
 Nota: el modelo se carga dentro del thread de clasificación para evitar bloquear
 la inicialización de la interfaz hasta que el usuario inicie la clasificación.
@@ -26,7 +27,6 @@ import logging
 import traceback
 import queue
 import threading
-from typing import Any
 
 import cv2
 import numpy as np
@@ -46,17 +46,28 @@ except Exception as _e:
 
 from PyQt6 import QtCore, QtGui, QtWidgets
 
-from camera import IPCamera
+from camera import get_working_camera
+from ev3_link import close_links, get_link
+from frame_sources import open_source
+from motor_client import MotorServerPollError, MotorServerUnavailable, close_clients, get_client
+from pipeline import Pipeline, frame_source_reader
 
 # Import send_palletize desde main_pc para realizar la llamada por SSH
 try:
     # preferimos NO importar send_palletize aquí para no sobrescribir la
     # implementación local ni forzar efectos secundarios al importar main_pc.
     from main_pc import CAMERA_URLS as _CAMERA_URLS
+    from main_pc import CAMERA_ROIS, CROP_OVERLAP, CROP_TILES, FRAME_SOURCE, MOTION_GATE, RESULT_CACHE
     CAMERA_URLS = _CAMERA_URLS
 except Exception:
     # si no se puede importar main_pc (por alguna razón), definir valores por defecto
     CAMERA_URLS = ["http://192.168.1.28:8080/video", "http://192.168.1.29:8080/video"]
+    CAMERA_ROIS = {}
+    CROP_TILES = (1, 1)
+    CROP_OVERLAP = 0.2
+    FRAME_SOURCE = None
+    RESULT_CACHE = {"max_entries": 64, "ttl": 5.0, "max_distance": 4}
+    MOTION_GATE = {"min_area": 0.01, "settle_time": 1.5}
 
 # Umbral de confianza para disparar acciones automáticas desde la GUI
 CONF_THRESHOLD = 0.5
@@ -77,8 +88,11 @@ OBJETIVOS_MAP = {
 EV3_USER = "robot"
 EV3_HOST = "ev3dev.local"
 EV3_SCRIPT = "/home/robot/rutina_botella.py"
+# Canal SSH persistente compartido por todos los comandos (ver ev3_link.py)
+EV3_TRANSPORT = "auto"
+# Actuación principal por motor_server.py (ver motor_client.py); SSH como respaldo. None = solo SSH
+MOTOR_SERVER = {"port": 9999, "timeout": 5.0, "retries": 2}
 
-import subprocess
 import signal
 import traceback as _traceback
 
@@ -113,14 +127,10 @@ def send_palletize(velocidad, altura):
     Retorna "OK" si la ejecución remota devolvió código 0, o None en caso de error.
     """
     try:
-        cmd = [
-            "ssh",
-            "-o", "StrictHostKeyChecking=no",
-            f"{EV3_USER}@{EV3_HOST}",
-            f"{EV3_SCRIPT} {velocidad} {altura}"
-        ]
-        logging.info(f"Ejecutando en EV3: {' '.join(cmd)} (thread={threading.current_thread().name})")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        link = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT)
+        command = f"{EV3_SCRIPT} {velocidad} {altura}"
+        logging.info(f"Ejecutando en EV3 ({link}): {command} (thread={threading.current_thread().name})")
+        result = link.run(command, timeout=120)
         # Loguear la salida del EV3 (stdout y stderr) para que aparezca en la GUI
         if result.stdout:
             logging.info(f"Salida EV3:\n{result.stdout}")
@@ -141,16 +151,24 @@ def send_stop_motors():
     """
     Envía un comando SSH para detener los motores en el EV3 en caso de que
     queden girando tras la rutina. Ejecuta un pequeño comando Python remoto
-    que detiene los motores conectados a OUTPUT_A y OUTPUT_B.
+    que detiene los motores conectados a OUTPUT_A y OUTPUT_B. Si motor_server
+    está disponible se usa su comando STOP (inmediato) en lugar de SSH.
     """
+    if MOTOR_SERVER is not None:
+        try:
+            if get_client(EV3_HOST, **MOTOR_SERVER).stop():
+                logging.info("Parada de motores confirmada por motor_server")
+                return True
+        except Exception as e:
+            logging.warning(f"STOP por motor_server falló ({e}); usando SSH")
     try:
         pycmd = (
             "python3 -c \"from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B;"
             "LargeMotor(OUTPUT_A).stop(); LargeMotor(OUTPUT_B).stop()\""
         )
-        cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", pycmd]
-        logging.info(f"Enviando comando de parada de motores al EV3: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        link = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT)
+        logging.info(f"Enviando comando de parada de motores al EV3 ({link}): {pycmd}")
+        result = link.run(pycmd, timeout=30)
         if result.stdout:
             logging.info(f"Salida stop EV3:\n{result.stdout}")
         if result.stderr:
@@ -168,15 +186,37 @@ def send_stop_motors():
 
 def send_routine(script_name: str, velocidad, altura):
     """
-    Ejecuta un script específico en el EV3 vía SSH. `script_name` es el
-    nombre del archivo en /home/robot/ (por ejemplo 'rutina_botella.py' o
-    'rutina_caja.py'). Retorna 'OK' si returncode == 0.
+    Ejecuta la rutina de `script_name` en el EV3: primero por motor_server y,
+    si no está disponible, el script vía SSH. `script_name` es el nombre del
+    archivo en /home/robot/ (por ejemplo 'rutina_botella.py' o
+    'rutina_caja.py'). Retorna 'OK' si la rutina terminó correctamente.
     """
+    if MOTOR_SERVER is not None:
+        try:
+            client = get_client(EV3_HOST, **MOTOR_SERVER)
+            logging.info(f"Ejecutando {script_name} en motor_server {client} (thread={threading.current_thread().name})")
+            res = client.run_script(script_name, velocidad, altura)
+            if res != "OK":
+                logging.error(f"motor_server respondió {res}")
+                return None
+            return "OK"
+        except MotorServerPollError as e:
+            # La rutina ya estaba encolada y puede seguir moviendo los motores: no repetirla por SSH
+            logging.error(f"{e}; la rutina no se repite por SSH")
+            return None
+        except MotorServerUnavailable as e:
+            # PALLETIZE no llegó a entregarse: es seguro ejecutar el script por SSH
+            logging.warning(f"{e}; usando SSH como respaldo")
+        except Exception as e:
+            # La rutina pudo haberse lanzado: no repetirla por SSH
+            logging.error(f"Error al ejecutar rutina en motor_server: {e}")
+            return None
     try:
         remote = f"/home/robot/{script_name}"
-        cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", f"{remote} {velocidad} {altura}"]
-        logging.info(f"Ejecutando en EV3: {' '.join(cmd)} (thread={threading.current_thread().name})")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        link = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT)
+        command = f"{remote} {velocidad} {altura}"
+        logging.info(f"Ejecutando en EV3 ({link}): {command} (thread={threading.current_thread().name})")
+        result = link.run(command, timeout=120)
         if result.stdout:
             logging.info(f"Salida EV3:\n{result.stdout}")
         if result.stderr:
@@ -216,9 +256,8 @@ def check_ev3_via_ssh(timeout: int = 10) -> bool:
             # when passed through ssh -> remote shell. The payload itself uses
             # double quotes for the print() call which is safe here.
             pycmd = f"{py_exec} -c '{py_snip}'"
-            cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", pycmd]
             logging.info(f"Verificando EV3 vía SSH (python import) usando '{py_exec}'...")
-            res = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            res = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT).run(pycmd, timeout=timeout)
             out = (res.stdout or "").strip()
             err = (res.stderr or "").strip()
             logging.debug(f"SSH stdout (via {py_exec}): {out}")
@@ -232,9 +271,8 @@ def check_ev3_via_ssh(timeout: int = 10) -> bool:
 
     # Segunda estrategia: comprobar los nodos de sysfs que exponen motores
     try:
-        ls_cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", "ls /sys/class/tacho-motor"]
         logging.info("Verificando EV3 vía SSH (ls /sys/class/tacho-motor) ...")
-        res2 = subprocess.run(ls_cmd, capture_output=True, text=True, timeout=timeout)
+        res2 = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT).run("ls /sys/class/tacho-motor", timeout=timeout)
         out2 = (res2.stdout or "").strip()
         err2 = (res2.stderr or "").strip()
         logging.debug(f"SSH ls stdout: {out2}")
@@ -362,95 +400,113 @@ class QueueLogHandler(logging.Handler):
             pass
 
 
-class VideoThread(QtCore.QThread):
-    """Hilo que captura frames desde IPCamera y los emite como objetos."""
+class VisionThread(QtCore.QThread):
+    """
+    Hilo que ejecuta el pipeline de visión (pipeline.Pipeline): la fuente emite cada frame
+    para mostrarlo y la etapa de clasificación (cola acotada, descarta el frame más antiguo)
+    emite las predicciones. La decisión/actuación queda en MainWindow.on_prediction.
+    """
 
     frame_ready = QtCore.pyqtSignal(object)  # emit numpy array (BGR)
+    camera_connected = QtCore.pyqtSignal(str)  # URL de la cámara conectada
+    # emite (top-3 [(etiqueta, confianza)], objetivo detectado (objetivo, confianza, etiqueta) o None)
+    prediction_ready = QtCore.pyqtSignal(object)
 
-    def __init__(self, camera_urls, fps: float = 10.0, parent: QtCore.QObject | None = None):
+    def __init__(self, camera_urls, fps: float = 10.0, source_config: dict | None = None,
+                 parent: QtCore.QObject | None = None):
         super().__init__(parent)
         self.camera_urls = camera_urls
         self.fps = fps
+        self.source_config = source_config
         self._stopped = threading.Event()
+        # ROI (x, y, ancho, alto) de la cámara activa y rejilla de recortes
+        self.roi: tuple[int, int, int, int] | None = None
+        self.tiles = CROP_TILES
+        self.overlap = CROP_OVERLAP
+        self._cache = None
+        self._gate = None
+        self._matcher = None
+
+    def _setup_classifier(self) -> None:
+        # cargar y calentar el modelo en el hilo de la etapa para no bloquear la interfaz
+        from classifier import TargetMatcher, load_model, set_result_cache, warmup
+        from frame_cache import PerceptualCache
+        from motion_gate import MotionGate
+        load_model()
+        warmup()
+        # frames casi idénticos (cinta parada) reutilizan el resultado sin inferencia;
+        # misma configuración que main_pc (None desactiva la caché o la puerta)
+        self._cache = PerceptualCache(**RESULT_CACHE) if RESULT_CACHE else None
+        set_result_cache(self._cache)
+        # solo se clasifican frames en los que algo entra o cambia en la escena
+        self._gate = MotionGate(**MOTION_GATE) if MOTION_GATE else None
+        # Mapa clase ImageNet -> objetivo calculado una sola vez
+        self._matcher = TargetMatcher(OBJETIVOS_MAP, CONF_THRESHOLD)
+
+    def _classify(self, frame):
+        from classifier import crop_roi, decode_predictions, invalidate_result_cache, predict_regions
+        roi = self.roi
+        if self._gate is not None:
+            if not self._gate.update(crop_roi(frame.image, roi)):
+                return None
+            if self._gate.changed:
+                # escena nueva: no reutilizar resultados de antes del cambio (cinta vacía)
+                invalidate_result_cache()
+        # una sola pasada (todos los recortes en un lote): top-3 para mostrar
+        # y gather sobre las clases objetivo
+        probs = predict_regions(frame.image, roi, self.tiles, self.overlap)
+        preds = decode_predictions(probs[np.newaxis, :], 3)[0]
+        return preds, self._matcher.match(probs)
 
     def run(self) -> None:
+        self._stopped.clear()
         cam = None
+        pipeline = None
         try:
-            # intentar encontrar cámara funcional
-            for url in self.camera_urls:
+            if self.source_config:
+                # fuente offline (video, carpeta de imágenes, sintética)
+                cam = open_source(self.source_config)
+            else:
+                # probar todas las URLs en paralelo; decodificar solo al ritmo de la GUI (grab para el resto)
                 try:
-                    cam = IPCamera(url)
-                    break
-                except Exception:
-                    continue
-            if cam is None:
-                logging.error("No se pudo conectar a ninguna cámara desde GUI.")
-                return
-
-            period = 1.0 / max(1.0, self.fps)
+                    cam = get_working_camera(self.camera_urls, threaded=True, skip_decode=True, target_fps=self.fps)
+                except RuntimeError:
+                    logging.error("No se pudo conectar a ninguna cámara desde GUI.")
+                    return
+            self.roi = CAMERA_ROIS.get(cam.url)
+            self.camera_connected.emit(cam.url)
+
+            pipeline = (
+                Pipeline("gui")
+                .source("captura", frame_source_reader(cam), interval=1.0 / max(1.0, self.fps),
+                        on_output=lambda frame: self.frame_ready.emit(frame.image))
+                .stage("clasificar", self._classify, queue_size=2, policy="drop_oldest",
+                       setup=self._setup_classifier, on_output=self.prediction_ready.emit)
+            )
+            pipeline.start()
             while not self._stopped.is_set():
-                frame = cam.get_frame()
-                if frame is not None:
-                    self.frame_ready.emit(frame)
-                time.sleep(period)
+                if pipeline.wait(0.2):
+                    logging.info("Fuente de frames agotada.")
+                    break
         except Exception:
-            logging.error("Error en VideoThread:\n" + traceback.format_exc())
+            logging.error("Error en VisionThread:\n" + traceback.format_exc())
         finally:
             try:
+                if pipeline is not None:
+                    pipeline.stop()
+                    pipeline.log_stats()
                 if cam is not None:
                     cam.release()
             except Exception:
                 pass
+            if self._cache is not None:
+                self._cache.log_stats()
+            if self._gate is not None:
+                self._gate.log_stats()
 
     def stop(self) -> None:
         self._stopped.set()
-        self.wait(1000)
-
-
-class ClassifierThread(QtCore.QThread):
-    """Hilo que consume frames desde una cola y emite predicciones."""
-
-    prediction_ready = QtCore.pyqtSignal(object)  # emit list of tuples
-
-    def __init__(self, parent: QtCore.QObject | None = None):
-        super().__init__(parent)
-        self._stopped = threading.Event()
-        self._queue: queue.Queue[Any] = queue.Queue(maxsize=2)
-
-    def enqueue(self, frame: np.ndarray) -> None:
-        # si la cola está llena, descartar frame anterior para priorizar frescura
-        try:
-            if self._queue.full():
-                try:
-                    self._queue.get_nowait()
-                except Exception:
-                    pass
-            self._queue.put_nowait(frame)
-        except Exception:
-            pass
-
-    def run(self) -> None:
-        # importar el clasificador aquí para que la carga del modelo ocurra en este hilo
-        try:
-            from classifier import classify_image
-        except Exception as e:
-            logging.error(f"No se pudo importar classifier: {e}")
-            return
-
-        while not self._stopped.is_set():
-            try:
-                frame = self._queue.get(timeout=0.5)
-            except queue.Empty:
-                continue
-            try:
-                preds = classify_image(frame, top=3)
-                self.prediction_ready.emit(preds)
-            except Exception as e:
-                logging.error(f"Error en clasificación: {e}")
-
-    def stop(self) -> None:
-        self._stopped.set()
-        self.wait(1000)
+        self.wait(6000)
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -503,12 +559,11 @@ class MainWindow(QtWidgets.QMainWindow):
         h.addLayout(right)
 
         # Threads
-        self.video_thread = VideoThread(CAMERA_URLS, fps=10.0)
-        self.class_thread = ClassifierThread()
+        self.vision_thread = VisionThread(CAMERA_URLS, fps=10.0, source_config=FRAME_SOURCE)
 
         # Conexiones
-        self.video_thread.frame_ready.connect(self.on_frame)
-        self.class_thread.prediction_ready.connect(self.on_prediction)
+        self.vision_thread.frame_ready.connect(self.on_frame)
+        self.vision_thread.prediction_ready.connect(self.on_prediction)
         self.btn_start.clicked.connect(self.start_all)
         self.btn_stop.clicked.connect(self.stop_all)
         self.btn_ssh.clicked.connect(self.on_test_ssh)
@@ -549,8 +604,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # para diagnósticos, pero la detección arrancará inmediatamente.
 
         logging.info("Iniciando captura y clasificación desde GUI")
-        self.class_thread.start()
-        self.video_thread.start()
+        self.vision_thread.start()
         self._running = True
 
     def stop_all(self) -> None:
@@ -558,11 +612,7 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         logging.info("Deteniendo captura y clasificación desde GUI")
         try:
-            self.video_thread.stop()
-        except Exception:
-            pass
-        try:
-            self.class_thread.stop()
+            self.vision_thread.stop()
         except Exception:
             pass
         self._running = False
@@ -580,14 +630,9 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             logging.error(f"Error mostrando frame: {e}")
 
-        # enviar frame a clasificador (no bloqueante)
-        try:
-            self.class_thread.enqueue(frame)
-        except Exception:
-            pass
-
     @QtCore.pyqtSlot(object)
-    def on_prediction(self, preds: list[tuple[str, float]]) -> None:
+    def on_prediction(self, result: tuple[list[tuple[str, float]], tuple[str, float, str] | None]) -> None:
+        preds, deteccion = result
         # actualizar lista
         try:
             self.pred_list.clear()
@@ -610,20 +655,11 @@ class MainWindow(QtWidgets.QMainWindow):
             if now - self._last_trigger < getattr(self, "_cooldown", 10.0):
                 return
 
-            # buscar objetivo en predicciones
-            objetivo_encontrado = None
-            for label, conf in preds:
-                ll = label.lower()
-                if conf >= CONF_THRESHOLD:
-                    for objetivo, (vel, altura) in OBJETIVOS_MAP.items():
-                        if objetivo in ll:
-                            objetivo_encontrado = (objetivo, vel, altura)
-                            break
-                if objetivo_encontrado:
-                    break
-
-            if objetivo_encontrado is None:
+            # objetivo ya resuelto por TargetMatcher en el hilo de clasificación
+            if deteccion is None:
                 return
+            objetivo = deteccion[0]
+            objetivo_encontrado = (objetivo,) + tuple(OBJETIVOS_MAP[objetivo])
 
             # Lanzar la llamada SSH en hilo separado y actualizar cooldown
             def trigger_thread(obj, v, h):
@@ -780,9 +816,9 @@ class MainWindow(QtWidgets.QMainWindow):
                 for py_exec in python_candidates:
                     try:
                         pycmd = f"{py_exec} -c '{py_snip}'"
-                        cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", pycmd]
-                        logging.info(f"Ejecutando: {' '.join(cmd)}")
-                        res = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
+                        link = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT)
+                        logging.info(f"Ejecutando en {link}: {pycmd}")
+                        res = link.run(pycmd, timeout=15)
                         logging.info(f"[{py_exec}] stdout:\n{res.stdout}")
                         if res.stderr:
                             logging.error(f"[{py_exec}] stderr:\n{res.stderr}")
@@ -791,9 +827,9 @@ class MainWindow(QtWidgets.QMainWindow):
                         logging.error(f"Error ejecutando {py_exec} via SSH: {e}")
 
                 # sysfs check
-                ls_cmd = ["ssh", "-o", "StrictHostKeyChecking=no", f"{EV3_USER}@{EV3_HOST}", "ls -la /sys/class/tacho-motor"]
-                logging.info(f"Ejecutando: {' '.join(ls_cmd)}")
-                res2 = subprocess.run(ls_cmd, capture_output=True, text=True, timeout=15)
+                ls_cmd = "ls -la /sys/class/tacho-motor"
+                logging.info(f"Ejecutando: {ls_cmd}")
+                res2 = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT).run(ls_cmd, timeout=15)
                 logging.info(f"[sysfs] stdout:\n{res2.stdout}")
                 if res2.stderr:
                     logging.error(f"[sysfs] stderr:\n{res2.stderr}")
@@ -816,19 +852,10 @@ class MainWindow(QtWidgets.QMainWindow):
             MODULE_SHUTTING_DOWN = True
         except Exception:
             pass
-        # Vaciar cola del clasificador para evitar que procese frames residuales
-        try:
-            q = getattr(self.class_thread, "_queue", None)
-            if q is not None:
-                try:
-                    while True:
-                        q.get_nowait()
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
+        # stop_all detiene el pipeline y descarta los frames pendientes del clasificador
         self.stop_all()
+        close_clients()
+        close_links()
         super().closeEvent(event)
 
 
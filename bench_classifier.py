@@ -0,0 +1,190 @@
+r"""
+bench_classifier.py
+Mide la latencia de inferencia del clasificador EfficientNetV2B0.
+Usa el mismo modelo que `classifier.py`.
+
+Ejecución:
+    python .\bench_classifier.py preprocess --runs 200
+    python .\bench_classifier.py coldstart --runs 3
+    python .\bench_classifier.py session --runs 200
+    python .\bench_classifier.py session --xla
+    python .\bench_classifier.py backends --images .\frames_muestra --mode int8
+    python .\bench_classifier.py backends --images .\frames_muestra --candidate onnx --threads 2
+
+Nota: requiere TensorFlow instalado en el entorno (salvo `preprocess`, que solo usa OpenCV/NumPy).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Script que mide, en un proceso nuevo, el tiempo hasta la primera clasificación
+_COLDSTART_SNIPPET = (
+    "import time; t0 = time.perf_counter(); "
+    "import numpy as np, classifier; "
+    "classifier.load_model({backend!r}); "
+    "classifier.classify_image(np.zeros((480, 640, 3), np.uint8)); "
+    "print(time.perf_counter() - t0)"
+)
+
+
+def _legacy_preprocess(frame):
+    """Preprocesado anterior: BGR->RGB a resolución completa, resize, expand_dims y cast."""
+    import cv2
+    import numpy as np
+    import classifier
+
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    resized = cv2.resize(frame_rgb, classifier.MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    return np.expand_dims(resized, axis=0).astype(np.float32)
+
+
+def cmd_preprocess(args):
+    """
+    Microbenchmark del preprocesado a 720p y 1080p: tiempo por frame y pico de memoria
+    asignada por frame (tracemalloc), preprocesado anterior frente al fusionado con pool.
+    """
+    import tracemalloc
+    import numpy as np
+    import classifier
+
+    def fused(frame):
+        buffer = classifier._buffer_pool.acquire(1)
+        try:
+            classifier._preprocess_into([frame], buffer)
+        finally:
+            classifier._buffer_pool.release(buffer)
+
+    print(f"{'resolución':<12}{'camino':<10}{'ms/frame':>10}{'KB asignados/frame':>20}")
+    for name, (h, w) in (("720p", (720, 1280)), ("1080p", (1080, 1920))):
+        frame = np.random.randint(0, 256, size=(h, w, 3), dtype=np.uint8)
+        reference = _legacy_preprocess(frame)
+        buffer = classifier.InputBuffer(1)
+        if not np.array_equal(classifier._preprocess_into([frame], buffer), reference):
+            print(f"AVISO: el preprocesado fusionado difiere del anterior en {name}")
+        for label, fn in (("anterior", _legacy_preprocess), ("fusionado", fused)):
+            fn(frame)  # calentamiento (y primer buffer del pool)
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                fn(frame)
+            ms = (time.perf_counter() - start) * 1000.0 / args.runs
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            fn(frame)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<12}{label:<10}{ms:>10.3f}{peak / 1024:>20.1f}")
+
+
+def cmd_coldstart(args):
+    """
+    Mide el arranque en frío (import + carga del modelo + primera clasificación) en
+    procesos nuevos, construyendo el modelo Keras frente a cargar el artefacto congelado.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'backend':<10}{'mín (s)':>10}{'media (s)':>12}")
+    for backend in args.backends:
+        samples = []
+        for _ in range(args.runs):
+            out = subprocess.run(
+                [sys.executable, "-c", _COLDSTART_SNIPPET.format(backend=backend)],
+                cwd=here, capture_output=True, text=True, timeout=600,
+            )
+            if out.returncode != 0:
+                raise RuntimeError(f"Fallo midiendo {backend}: {out.stderr.strip().splitlines()[-1:]}")
+            samples.append(float(out.stdout.strip().splitlines()[-1]))
+        print(f"{backend:<10}{min(samples):>10.2f}{sum(samples) / len(samples):>12.2f}")
+
+
+def cmd_session(args):
+    """Compara `model.predict` con la sesión de inferencia trazada (p50/p99)."""
+    import classifier
+
+    report = classifier.benchmark_session(
+        runs=args.runs, warmup=args.warmup, batch_size=args.batch, jit_compile=args.xla
+    )
+    print(f"{'camino':<10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'media (ms)':>12}")
+    for name in ("predict", "session"):
+        stats = report[name]
+        print(f"{name:<10}{stats['p50']:>12.2f}{stats['p99']:>12.2f}{stats['mean']:>12.2f}")
+    print(f"Ahorro p50: {report['saved_p50_ms']:.2f} ms | Ahorro p99: {report['saved_p99_ms']:.2f} ms")
+
+
+def cmd_backends(args):
+    """
+    Compara un backend alternativo (TFLite u ONNX) con el Keras sobre una carpeta
+    de imágenes: coincidencia del top-k y latencia por frame (media y p99).
+    """
+    import cv2
+    import classifier
+
+    files = sorted(f for f in os.listdir(args.images) if f.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+    frames = [cv2.imread(os.path.join(args.images, f), cv2.IMREAD_COLOR) for f in files]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        raise ValueError(f"No hay imágenes legibles en {args.images}")
+
+    if args.candidate == "tflite":
+        candidate_options = {"mode": args.mode}
+    else:
+        candidate_options = {"intra_op_threads": args.threads, "inter_op_threads": 1}
+
+    results = {}
+    for name, options in (("keras", {}), (args.candidate, candidate_options)):
+        classifier.set_backend(name, **options)
+        classifier.classify_image(frames[0], top=args.top)  # calentamiento
+        samples = []
+        results[name] = []
+        for f in frames:
+            start = time.perf_counter()
+            results[name].append(classifier.classify_image(f, top=args.top))
+            samples.append((time.perf_counter() - start) * 1000.0)
+        stats = classifier.latency_stats(samples)
+        print(f"{name:<8} media={stats['mean']:8.2f} ms  p99={stats['p99']:8.2f} ms")
+
+    reference, candidate = results["keras"], results[args.candidate]
+    same_top1 = sum(k[0][0] == t[0][0] for k, t in zip(reference, candidate))
+    same_topk = sum([l for l, _ in k] == [l for l, _ in t] for k, t in zip(reference, candidate))
+    print(f"Top-1 coincidente: {same_top1}/{len(frames)} | Top-{args.top} idéntico: {same_topk}/{len(frames)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del clasificador")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_pre = sub.add_parser("preprocess", help="preprocesado anterior vs fusionado (720p/1080p)")
+    p_pre.add_argument("--runs", type=int, default=200)
+    p_pre.set_defaults(func=cmd_preprocess)
+
+    p_cold = sub.add_parser("coldstart", help="tiempo hasta la primera clasificación")
+    p_cold.add_argument("--runs", type=int, default=3)
+    p_cold.add_argument("--backends", nargs="+", default=["keras", "frozen"])
+    p_cold.set_defaults(func=cmd_coldstart)
+
+    p_session = sub.add_parser("session", help="predict vs sesión de inferencia trazada")
+    p_session.add_argument("--runs", type=int, default=100)
+    p_session.add_argument("--warmup", type=int, default=5)
+    p_session.add_argument("--batch", type=int, default=1)
+    p_session.add_argument("--xla", action="store_true", help="compilar la sesión con XLA")
+    p_session.set_defaults(func=cmd_session)
+
+    p_backends = sub.add_parser("backends", help="Keras vs TFLite/ONNX: top-k y latencia")
+    p_backends.add_argument("--images", required=True, help="carpeta de imágenes de prueba")
+    p_backends.add_argument("--candidate", choices=("tflite", "onnx"), default="tflite")
+    p_backends.add_argument("--mode", choices=("float32", "float16", "int8"), default="float32")
+    p_backends.add_argument("--threads", type=int, default=2, help="hilos intra-op de ONNX Runtime")
+    p_backends.add_argument("--top", type=int, default=3)
+    p_backends.set_defaults(func=cmd_backends)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except Exception as e:
+        print("ERROR durante el benchmark:", e)
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
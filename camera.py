@@ -1,32 +1,131 @@
-
 """
 camera.py
 
 Módulo para capturar frames desde una cámara IP usando OpenCV.
+Con backend="mjpeg" usa el lector nativo de mjpeg_stream.py (decodificación a resolución reducida).
 Proporciona la clase IPCamera para gestionar la conexión, obtención de frames y liberación de recursos de una cámara IP.
+Define además la interfaz común `FrameSource` y el registro `Frame` (imagen, marca de tiempo, secuencia)
+que implementan IPCamera, CameraGroup y las fuentes offline de frame_sources.py.
 Pensado para sistemas de visión artificial en tiempo real y uso con EV3.
 """
 
 
 import logging
+import os
+import threading
 import cv2
 import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from mjpeg_stream import MJPEGStream
+
+
+# Última URL que entregó frames: se prueba primero en el siguiente arranque
+LAST_CAMERA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".last_camera_url")
+# Tiempo máximo total de descubrimiento y tiempo de espera del primer frame por cámara (segundos)
+DISCOVERY_TIMEOUT = 5.0
+FIRST_FRAME_TIMEOUT = 1.0
+
+
+# Frame entregado por una fuente: imagen BGR (o None), marca de tiempo de captura y número de secuencia
+Frame = namedtuple("Frame", ["image", "timestamp", "seq"])
+
+
+class FrameSource:
+    """
+    Interfaz común de las fuentes de frames (cámaras IP, grupos de cámaras, videos, carpetas
+    de imágenes, generador sintético; ver frame_sources.py).
+
+    Las subclases implementan `get_frame_info()` y, si tienen recursos, `release()`.
+    Atributos:
+        url (str): Identificador de la fuente (URL, ruta...), usado p. ej. para buscar su ROI.
+        realtime (bool): True si la fuente entrega frames al ritmo del mundo real; False si
+            entrega el siguiente frame tan rápido como se le pida (el llamante no debe esperar).
+        finished (bool): True cuando una fuente finita se agotó.
+    """
+
+    url = None
+    realtime = True
+    finished = False
+
+    def get_frame_info(self):
+        """
+        Returns:
+            Frame: (image | None, timestamp | None, seq).
+        """
+        raise NotImplementedError
+
+    def get_frame(self):
+        """
+        Returns:
+            frame (np.ndarray | None): Imagen del último frame, o None si no hay.
+        """
+        return self.get_frame_info().image
+
+    def frame_age(self):
+        """
+        Returns:
+            float | None: Segundos desde la captura del último frame, o None si aún no hay.
+        """
+        return None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Estadísticas propias de la fuente.
+        """
+        return {}
+
+    def release(self):
+        """Libera los recursos de la fuente."""
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc):
+        self.release()
+        return False
 
 
-class IPCamera:
+class IPCamera(FrameSource):
     """
     Clase para gestionar una cámara IP usando OpenCV.
     Permite conectar, obtener frames y liberar el recurso de la cámara de forma robusta.
+
+    En modo `threaded` un hilo dedicado vacía continuamente el stream y guarda solo el
+    último frame decodificado (con su marca de tiempo) en una única ranura: `get_frame`
+    retorna de inmediato el frame más reciente en lugar de frames viejos acumulados en
+    el buffer interno de OpenCV.
+
+    Con `skip_decode` el hilo usa `cap.grab()` para todos los frames y `cap.retrieve()`
+    (la decodificación) solo para los que va a entregar, al ritmo de `target_fps` o,
+    si no se indica, al ritmo al que el consumidor pide frames.
+
+    Con `backend="mjpeg"` el stream se lee con `MJPEGStream` en lugar de `cv2.VideoCapture`:
+    `grab()` solo lee los bytes del JPEG y `retrieve()` lo decodifica a 1/`decode_scale`
+    de resolución. Las ROIs se expresan entonces en coordenadas del frame reducido.
     """
 
-    def __init__(self, url, reconnect_delay=2):
+    # Margen sobre el ritmo del consumidor: se decodifica al doble de su frecuencia
+    # para que el frame entregado tenga como mucho medio periodo de antigüedad
+    CONSUMER_OVERSAMPLING = 2.0
+
+    BACKENDS = ("opencv", "mjpeg")
+
+    def __init__(self, url, reconnect_delay=2, threaded=False, skip_decode=False, target_fps=None,
+                 backend="opencv", decode_scale=1):
         """
         Inicializa la cámara IP y realiza la primera conexión.
 
         Args:
             url (str): URL del stream de video (ej. http://192.168.1.29:8080/video)
             reconnect_delay (int, optional): Tiempo en segundos para reintentar conexión si falla. Default=2.
+            threaded (bool, optional): Leer el stream en un hilo propio y servir siempre el último frame. Default=False.
+            skip_decode (bool, optional): Decodificar solo los frames que se entregan (grab/retrieve). Implica threaded. Default=False.
+            target_fps (float, optional): Frames decodificados por segundo con skip_decode. Default=None (ritmo del consumidor).
+            backend (str, optional): "opencv" (cv2.VideoCapture) o "mjpeg" (lector nativo). Default="opencv".
+            decode_scale (int, optional): Reducción al decodificar con backend="mjpeg": 1, 2, 4 u 8. Default=1.
 
         Raises:
             ValueError: Si la URL es inválida.
@@ -35,26 +134,130 @@ class IPCamera:
         if not isinstance(url, str) or not url.startswith("http"):
             logging.error("URL de cámara inválida: %s", url)
             raise ValueError("URL de cámara inválida")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend de cámara desconocido: {backend}")
+        if backend == "opencv" and decode_scale != 1:
+            raise ValueError("decode_scale solo está disponible con backend='mjpeg'")
 
         self.url = url
+        self.backend = backend
+        self.decode_scale = decode_scale
         self.reconnect_delay = reconnect_delay
+        self.skip_decode = skip_decode
+        self.threaded = threaded or skip_decode
+        self.target_fps = target_fps
         self.cap = None
+
+        # Ranura del último frame (modo threaded)
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_time = None
+        self._frame_seq = 0
+        self._consumed_seq = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self.frames_read = 0
+        self.dropped_frames = 0
+        self.frames_grabbed = 0
+        self.skipped_decodes = 0
+        self._last_decode = 0.0
+        self._last_consume = None
+        self._consume_interval = None  # media móvil del periodo entre lecturas del consumidor
+        self.last_activity = None  # instante del último grab/read correcto (salud del stream)
+
         self.connect()
+        if self.threaded:
+            self.start()
 
     def connect(self):
         """
-        Conecta a la cámara IP usando OpenCV.
+        Conecta a la cámara IP usando OpenCV (o el lector MJPEG nativo).
         Si ya existe una conexión previa, la libera antes de reconectar.
 
         Raises:
             RuntimeError: Si no se puede abrir el stream de la cámara.
         """
         if self.cap is not None:
-            self.release()
-        self.cap = cv2.VideoCapture(self.url)
+            self._release_capture()
+        if self.backend == "mjpeg":
+            self.cap = MJPEGStream(self.url, scale=self.decode_scale)
+        else:
+            self.cap = cv2.VideoCapture(self.url)
         if not self.cap.isOpened():
             logging.error(f"No se puede conectar con la cámara en {self.url}")
             raise RuntimeError(f"No se puede conectar con la cámara en {self.url}")
+        if self.threaded:
+            # El hilo ya vacía el stream: no hace falta que OpenCV acumule frames
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def start(self):
+        """Arranca el hilo lector del modo threaded (si no está ya en marcha)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._reader_loop, name=f"IPCamera-{self.url}", daemon=True)
+        self._thread.start()
+
+    def _reader_loop(self):
+        """Bucle del hilo lector: decodifica cada frame y reemplaza la ranura del último frame."""
+        while not self._stopped.is_set():
+            try:
+                if self.cap is None or not self.cap.isOpened():
+                    logging.warning(f"Cámara {self.url} desconectada, reintentando...")
+                    self._stopped.wait(self.reconnect_delay)
+                    if self._stopped.is_set():
+                        break
+                    self.connect()
+                    continue
+
+                if self.skip_decode:
+                    # grab() solo demultiplexa; la decodificación se paga en retrieve()
+                    if not self.cap.grab():
+                        logging.warning(f"No se pudo leer el frame de {self.url}")
+                        self._release_capture()
+                        continue
+                    now = time.time()
+                    self.frames_grabbed += 1
+                    self.last_activity = now
+                    if not self._should_decode(now):
+                        self.skipped_decodes += 1
+                        continue
+                    self._last_decode = now
+                    ret, frame = self.cap.retrieve()
+                else:
+                    ret, frame = self.cap.read()
+                    self.frames_grabbed += 1
+                if not ret or frame is None:
+                    logging.warning(f"No se pudo leer el frame de {self.url}")
+                    self._release_capture()
+                    continue
+                self.last_activity = time.time()
+                self._store_frame(frame, self.last_activity)
+            except Exception as e:
+                logging.error(f"Error en el hilo lector de {self.url}: {e}")
+                self._stopped.wait(self.reconnect_delay)
+        # El propio hilo libera la captura al salir, así nunca se libera durante un read()
+        self._release_capture()
+
+    def _should_decode(self, now):
+        """Decide si el frame recién capturado con grab() debe decodificarse."""
+        if self.target_fps:
+            interval = 1.0 / self.target_fps
+        elif self._consume_interval is not None:
+            interval = self._consume_interval / self.CONSUMER_OVERSAMPLING
+        else:
+            return True  # aún no se conoce el ritmo del consumidor
+        return now - self._last_decode >= interval
+
+    def _store_frame(self, frame, timestamp):
+        with self._lock:
+            if self._frame is not None and self._frame_seq != self._consumed_seq:
+                # El consumidor no llegó a ver el frame anterior
+                self.dropped_frames += 1
+            self._frame = frame
+            self._frame_time = timestamp
+            self._frame_seq += 1
+            self.frames_read += 1
 
     def get_frame(self):
         """
@@ -63,8 +266,13 @@ class IPCamera:
         Returns:
             frame (np.ndarray | None): Frame capturado o None si falla.
 
-        Maneja reconexión automática si la cámara se desconecta.
+        Maneja reconexión automática si la cámara se desconecta. En modo threaded
+        retorna de inmediato el último frame decodificado (la reconexión ocurre
+        en el hilo lector, fuera del bucle del llamante).
         """
+        if self.threaded:
+            return self.get_frame_info()[0]
+
         try:
             # Si la cámara está desconectada, intenta reconectar
             if self.cap is None or not self.cap.isOpened():
@@ -80,19 +288,405 @@ class IPCamera:
             if not ret or frame is None:
                 logging.warning("No se pudo leer el frame")
                 return None
+            self.last_activity = time.time()
+            self._store_frame(frame, self.last_activity)
+            self._consumed_seq = self._frame_seq
             return frame
         except Exception as e:
             logging.error(f"Error al obtener frame de la cámara: {e}")
             return None
 
+    def get_frame_info(self):
+        """
+        Retorna el último frame junto con su marca de tiempo de captura y su número de secuencia.
+
+        Returns:
+            Frame: (image | None, timestamp | None, seq). `seq` aumenta con cada frame
+            decodificado, así el llamante puede saber si el frame es nuevo.
+        """
+        if not self.threaded:
+            frame = self.get_frame()
+            return Frame(frame, self._frame_time if frame is not None else None, self._frame_seq)
+        now = time.time()
+        with self._lock:
+            if self._last_consume is not None:
+                interval = now - self._last_consume
+                self._consume_interval = (
+                    interval if self._consume_interval is None else 0.8 * self._consume_interval + 0.2 * interval
+                )
+            self._last_consume = now
+            self._consumed_seq = self._frame_seq
+            return Frame(self._frame, self._frame_time, self._frame_seq)
+
+    def frame_age(self):
+        """
+        Returns:
+            float | None: Segundos desde que se capturó el último frame, o None si aún no hay.
+        """
+        with self._lock:
+            if self._frame_time is None:
+                return None
+            return time.time() - self._frame_time
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frames capturados, decodificados, decodificaciones omitidas, frames descartados
+            sin consumir y edad del último frame.
+        """
+        with self._lock:
+            read, dropped = self.frames_read, self.dropped_frames
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "frames_read": read,
+            "skipped_decodes": self.skipped_decodes,
+            "dropped_frames": dropped,
+            "frame_age": self.frame_age(),
+        }
+
+    def _release_capture(self):
+        try:
+            if self.cap is not None:
+                self.cap.release()
+        finally:
+            self.cap = None
+
     def release(self):
         """
         Libera el recurso de la cámara y cierra la conexión.
         Es importante llamar a este método al finalizar el uso de la cámara para evitar fugas de recursos.
         """
         try:
-            if self.cap is not None:
-                self.cap.release()
-                self.cap = None
+            self._stopped.set()
+            thread = self._thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout=max(2.0, self.reconnect_delay))
+                if thread.is_alive():
+                    # Bloqueado en read(): el hilo liberará la captura al terminar
+                    logging.warning(f"El hilo lector de {self.url} sigue activo; se liberará al terminar")
+                    return
+            self._thread = None
+            self._release_capture()
         except Exception as e:
             logging.error(f"Error al liberar la cámara: {e}")
+
+
+def _load_last_camera(cache_file):
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _save_last_camera(cache_file, url):
+    try:
+        with open(cache_file, "w", encoding="utf-8") as f:
+            f.write(url)
+    except OSError as e:
+        logging.warning(f"No se pudo guardar la última cámara en {cache_file}: {e}")
+
+
+def _probe_camera(url, frame_timeout, cancelled, camera_options):
+    """
+    Conecta a una URL y espera un frame válido. Retorna la cámara o None.
+    Si el descubrimiento ya terminó (otra sonda ganó) libera la cámara y retorna None.
+    """
+    try:
+        cam = IPCamera(url, **camera_options)
+    except Exception as e:
+        logging.warning(f"No se pudo conectar a {url}: {e}")
+        return None
+    start = time.time()
+    frame = None
+    while time.time() - start < frame_timeout and not cancelled.is_set():
+        frame = cam.get_frame()
+        if frame is not None and frame.size > 0:
+            break
+        frame = None
+        time.sleep(0.05)
+    if frame is None or cancelled.is_set():
+        if frame is None and not cancelled.is_set():
+            logging.warning(f"No se pudo obtener frame de {url} en {frame_timeout:.1f} segundos")
+        cam.release()
+        return None
+    return cam
+
+
+def _release_probe_result(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    cam = future.result()
+    if cam is not None:
+        cam.release()
+
+
+def get_working_camera(urls, timeout=DISCOVERY_TIMEOUT, frame_timeout=FIRST_FRAME_TIMEOUT,
+                       cache_file=LAST_CAMERA_FILE, **camera_options):
+    """
+    Prueba en paralelo todas las URLs de cámara y retorna la primera que entrega un frame válido.
+    Las sondas restantes se cancelan y las cámaras que lleguen a conectarse después se liberan.
+    La URL ganadora se guarda en `cache_file` y en el siguiente arranque se lanza primero.
+    El tiempo de arranque/reconexión queda acotado por `timeout`, sin importar cuántas URLs haya.
+
+    Args:
+        urls (list): Lista de URLs de cámaras IP.
+        timeout (float, optional): Tiempo máximo total de descubrimiento en segundos. Default=DISCOVERY_TIMEOUT.
+        frame_timeout (float, optional): Espera del primer frame por cámara. Default=FIRST_FRAME_TIMEOUT.
+        cache_file (str | None, optional): Archivo con la última URL buena; None para no usarlo. Default=LAST_CAMERA_FILE.
+        **camera_options: Argumentos para IPCamera (threaded, skip_decode, backend, ...).
+
+    Returns:
+        IPCamera: Cámara conectada y entregando frames.
+
+    Raises:
+        RuntimeError: Si ninguna cámara entrega un frame dentro del tiempo máximo.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        raise RuntimeError("No hay URLs de cámara configuradas.")
+    last = _load_last_camera(cache_file) if cache_file else None
+    if last in urls:
+        urls.remove(last)
+        urls.insert(0, last)
+
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="camera-probe")
+    priority = {executor.submit(_probe_camera, url, frame_timeout, cancelled, camera_options): i
+                for i, url in enumerate(urls)}
+    pending = set(priority)
+    camera = None
+    deadline = time.time() + timeout
+    try:
+        while pending and camera is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            # Si varias terminan a la vez, gana la primera en el orden de prioridad
+            for future in sorted(done, key=priority.get):
+                cam = future.result()
+                if cam is None:
+                    continue
+                if camera is None:
+                    camera = cam
+                else:
+                    cam.release()
+    finally:
+        cancelled.set()
+        for future in pending:
+            # Las sondas bloqueadas en la conexión terminan solas; si conectan, se liberan
+            future.add_done_callback(_release_probe_result)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if camera is None:
+        raise RuntimeError("No se pudo conectar a ninguna cámara IP.")
+    logging.info(f"Cámara conectada exitosamente a {camera.url}")
+    if cache_file and camera.url != last:
+        _save_last_camera(cache_file, camera.url)
+    return camera
+
+
+class CameraGroup(FrameSource):
+    """
+    Grupo de cámaras IP con respaldo en caliente.
+
+    Todas las URLs se mantienen conectadas en modo threaded: la activa decodifica al ritmo
+    normal y las de respaldo solo hacen `grab()` y decodifican a `standby_fps`, así siempre
+    tienen un frame listo. Si la activa deja de entregar frames durante `stall_timeout`, el
+    siguiente `get_frame` (o el hilo supervisor, cada `check_interval`) pasa a la primera
+    cámara sana en orden de prioridad, sin dormir ni reconectar en el bucle del llamante.
+    Las cámaras caídas se reconectan en segundo plano con espera exponencial y, cuando la
+    de mayor prioridad vuelve a entregar frames, se regresa a ella.
+    """
+
+    def __init__(self, urls, stall_timeout=1.0, check_interval=0.1, standby_fps=1.0,
+                 initial_backoff=1.0, max_backoff=30.0, **camera_options):
+        """
+        Conecta el grupo: la primera cámara en entregar un frame queda activa y el resto se
+        conecta como respaldo en segundo plano.
+
+        Args:
+            urls (list): URLs de cámara en orden de prioridad (la primera es la principal).
+            stall_timeout (float, optional): Segundos sin frames para dar una cámara por caída. Default=1.0.
+            check_interval (float, optional): Periodo del hilo supervisor en segundos. Default=0.1.
+            standby_fps (float, optional): Frames decodificados por segundo en las cámaras de respaldo. Default=1.0.
+            initial_backoff (float, optional): Primera espera antes de reintentar una cámara caída. Default=1.0.
+            max_backoff (float, optional): Espera máxima entre reintentos. Default=30.0.
+            **camera_options: Argumentos para IPCamera (target_fps, backend, decode_scale, ...).
+
+        Raises:
+            RuntimeError: Si ninguna cámara entrega un frame al arrancar.
+        """
+        self.urls = list(dict.fromkeys(urls))
+        if not self.urls:
+            raise ValueError("CameraGroup necesita al menos una URL")
+        self.stall_timeout = stall_timeout
+        self.check_interval = check_interval
+        self.standby_fps = standby_fps
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        # El respaldo en caliente requiere el hilo lector y grab() sin decodificar
+        self._options = dict(camera_options, threaded=True, skip_decode=True)
+        self._active_fps = self._options.pop("target_fps", None)
+
+        self._lock = threading.Lock()
+        self._cameras = dict.fromkeys(self.urls)
+        self._connected_at = dict.fromkeys(self.urls, 0.0)
+        self._backoff = dict.fromkeys(self.urls, initial_backoff)
+        self._next_retry = dict.fromkeys(self.urls, 0.0)
+        self._connecting = set()
+        self._active = None
+        self._seq = 0
+        self._last_key = None
+        self.failovers = 0
+
+        cam = get_working_camera(self.urls, cache_file=None, target_fps=self._active_fps, **self._options)
+        self._cameras[cam.url] = cam
+        self._connected_at[cam.url] = time.time()
+        self._active = cam.url
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._supervisor_loop, name="CameraGroup", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        """URL de la cámara activa."""
+        return self._active
+
+    def _delivering(self, url, now):
+        """True si la cámara entregó frames en los últimos `stall_timeout` segundos."""
+        cam = self._cameras.get(url)
+        return cam is not None and cam.last_activity is not None and now - cam.last_activity <= self.stall_timeout
+
+    def _healthy(self, url, now):
+        """Como _delivering, pero con margen para una cámara recién conectada que aún no entrega."""
+        cam = self._cameras.get(url)
+        if cam is None:
+            return False
+        activity = cam.last_activity or self._connected_at[url]
+        return now - activity <= self.stall_timeout
+
+    def _switch_to(self, url, reason):
+        """Cambia la cámara activa (llamar con el lock tomado)."""
+        previous = self._active
+        if url == previous:
+            return
+        self._active = url
+        self._cameras[url].target_fps = self._active_fps
+        if self._cameras.get(previous) is not None:
+            self._cameras[previous].target_fps = self.standby_fps
+        self.failovers += 1
+        logging.warning(f"Cámara activa: {previous} -> {url} ({reason})")
+
+    def _select(self, now):
+        """Elige la cámara sana de mayor prioridad (llamar con el lock tomado)."""
+        for url in self.urls:
+            if self._delivering(url, now):
+                if url != self._active:
+                    reason = "respaldo" if not self._delivering(self._active, now) else "vuelve la principal"
+                    self._switch_to(url, reason)
+                return True
+        return False
+
+    def get_frame_info(self):
+        """
+        Retorna el último frame de la cámara activa, su marca de tiempo y un número de
+        secuencia propio del grupo (aumenta con cada frame nuevo, también al cambiar de cámara).
+
+        Returns:
+            Frame: (image | None, timestamp | None, seq). image es None si ninguna cámara está sana.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._delivering(self._active, now) and not self._select(now):
+                return Frame(None, None, self._seq)
+            url = self._active
+            cam = self._cameras[url]
+        frame, timestamp, seq = cam.get_frame_info()
+        if frame is not None and (url, seq) != self._last_key:
+            self._last_key = (url, seq)
+            self._seq += 1
+        return Frame(frame, timestamp, self._seq)
+
+    def get_frame(self):
+        """
+        Returns:
+            frame (np.ndarray | None): Último frame de la cámara activa, o None si ninguna está sana.
+        """
+        return self.get_frame_info()[0]
+
+    def frame_age(self):
+        with self._lock:
+            cam = self._cameras.get(self._active)
+        return cam.frame_age() if cam is not None else None
+
+    def _supervisor_loop(self):
+        """Detecta cámaras caídas, hace el failover y programa las reconexiones fuera del hot path."""
+        while not self._stopped.wait(self.check_interval):
+            now = time.time()
+            dead = []
+            with self._lock:
+                self._select(now)
+                for url in self.urls:
+                    cam = self._cameras[url]
+                    if cam is not None and url != self._active and not self._healthy(url, now):
+                        # Caída: se suelta y se reintenta con espera exponencial
+                        self._cameras[url] = None
+                        self._schedule_retry(url, now)
+                        dead.append(cam)
+                    elif cam is None and url not in self._connecting and now >= self._next_retry[url]:
+                        self._connecting.add(url)
+                        threading.Thread(target=self._connect, args=(url,), name=f"CameraGroup-{url}",
+                                         daemon=True).start()
+            for cam in dead:
+                logging.warning(f"Cámara {cam.url} sin frames; reintentando en segundo plano")
+                threading.Thread(target=cam.release, daemon=True).start()
+
+    def _schedule_retry(self, url, now):
+        self._next_retry[url] = now + self._backoff[url]
+        self._backoff[url] = min(self._backoff[url] * 2, self.max_backoff)
+
+    def _connect(self, url):
+        cam = None
+        try:
+            cam = IPCamera(url, target_fps=self.standby_fps, **self._options)
+        except Exception as e:
+            logging.debug(f"Reintento de cámara {url} fallido: {e}")
+        with self._lock:
+            self._connecting.discard(url)
+            if cam is None or self._stopped.is_set():
+                self._schedule_retry(url, time.time())
+            else:
+                logging.info(f"Cámara {url} conectada en respaldo")
+                self._cameras[url] = cam
+                self._connected_at[url] = time.time()
+                self._backoff[url] = self.initial_backoff
+                cam = None
+        if cam is not None:
+            cam.release()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cámara activa, número de cambios de cámara y estadísticas por URL (None si está caída).
+        """
+        with self._lock:
+            cameras = dict(self._cameras)
+            active, failovers = self._active, self.failovers
+        return {
+            "active": active,
+            "failovers": failovers,
+            "cameras": {url: cam.stats() if cam is not None else None for url, cam in cameras.items()},
+        }
+
+    def release(self):
+        """Detiene el supervisor y libera todas las cámaras del grupo."""
+        self._stopped.set()
+        self._thread.join(timeout=max(1.0, self.check_interval * 2))
+        with self._lock:
+            cameras = [cam for cam in self._cameras.values() if cam is not None]
+            self._cameras = dict.fromkeys(self.urls)
+        for cam in cameras:
+            cam.release()
@@ -2,37 +2,699 @@
 classifier.py
 Módulo para clasificación de imágenes usando EfficientNetV2B0 preentrenado en ImageNet.
 Compatible con integración en visión artificial en tiempo real.
+
+Backends disponibles (seleccionables con `set_backend` sin cambiar la llamada a `classify_image`):
+- "keras": modelo Keras completo con TensorFlow (por defecto).
+- "tflite": el mismo modelo convertido a `.tflite` (float32, float16 o int8) con
+  `export_model.py`; funciona con tflite-runtime sin TensorFlow completo.
+- "frozen": artefacto de solo inferencia (SavedModel congelado y optimizado) generado
+  una vez con `export_model.py frozen` en la caché local; arranca sin red y se verifica
+  con su checksum.
+- "onnx": el mismo modelo exportado a ONNX y ejecutado con ONNX Runtime en CPU,
+  con presupuesto fijo de hilos/núcleos para no quitarle CPU a la GUI ni a la captura.
+
+Importar el módulo es barato: TensorFlow y el modelo se cargan en `load_model()`
+(o en la primera clasificación) y `warmup()` ejecuta pasadas de calentamiento para
+que el primer frame real no pague el coste de tracing ni de reserva de memoria.
 """
 
 
+import hashlib
+import json
 import logging
-import tensorflow as tf
+import os
+import threading
+import time
 import numpy as np
 import cv2
 
+# TensorFlow se importa de forma perezosa (ver `_tensorflow`): importar este módulo
+# no debe pagar el import de TF ni la construcción del modelo
+tf = None
+_tf_checked = False
+
 
 # Configuración del logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 # Configuración del modelo
 MODEL_INPUT_SIZE = (224, 224)  # Tamaño estándar para EfficientNetV2B0
+USE_XLA = False  # Compilar el forward pass con XLA (jit_compile) en la sesión de inferencia
+BACKEND = "auto"  # "auto" (artefacto congelado si existe, si no Keras), "keras", "frozen", "tflite" u "onnx"
+TFLITE_MODE = "float32"  # Variante del modelo TFLite: "float32", "float16" o "int8"
+TFLITE_THREADS = None  # Hilos del intérprete TFLite (None = valor por defecto)
+TF_INTRA_OP_THREADS = None  # Hilos intra-op de TensorFlow (None = todos los núcleos)
+TF_INTER_OP_THREADS = None  # Hilos inter-op de TensorFlow (None = todos los núcleos)
+ONNX_INTRA_OP_THREADS = 2  # Hilos intra-op de ONNX Runtime (presupuesto fijo de núcleos)
+ONNX_INTER_OP_THREADS = 1  # Hilos inter-op de ONNX Runtime (>1 activa ejecución paralela)
+ONNX_GRAPH_OPTIMIZATION = "all"  # "disabled", "basic", "extended" o "all"
+ONNX_CPU_CORES = None  # Núcleos lógicos (0..N-1) a los que fijar los hilos de ONNX Runtime
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+FROZEN_MODEL_DIR = os.path.join(MODEL_DIR, "efficientnetv2b0_frozen")  # SavedModel congelado
+FROZEN_MANIFEST_FILE = "manifest.json"  # Checksum y metadatos del artefacto congelado
+CLASS_INDEX_FILE = "imagenet_class_index.json"
+CLASS_INDEX_URL = "https://storage.googleapis.com/download.tensorflow.org/data/imagenet_class_index.json"
+
+
+def _tensorflow():
+    """
+    Importa TensorFlow la primera vez que se necesita.
+    :return: El módulo tensorflow, o None si no está instalado (p. ej. con tflite-runtime).
+    """
+    global tf, _tf_checked
+    if not _tf_checked:
+        try:
+            import tensorflow
+            tf = tensorflow
+        except ImportError:
+            tf = None
+        _tf_checked = True
+    return tf
+
+
+def tflite_model_path(mode=TFLITE_MODE):
+    """
+    Ruta del modelo TFLite convertido para una variante de cuantización.
+    :param mode: "float32", "float16" o "int8".
+    """
+    return os.path.join(MODEL_DIR, f"efficientnetv2b0_{mode}.tflite")
+
+
+def onnx_model_path():
+    """Ruta del modelo ONNX exportado por `export_model.py`."""
+    return os.path.join(MODEL_DIR, "efficientnetv2b0.onnx")
+
+
+class InferenceSession:
+    """
+    Sesión de inferencia de bajo overhead para un modelo Keras.
+    Traza el forward pass una sola vez como tf.function con firma de entrada fija
+    (lote variable de imágenes 224x224x3 float32) y reutiliza ese grafo en cada frame,
+    evitando el data adapter y el bucle que `model.predict` construye en cada llamada.
+    """
+
+    def __init__(self, keras_model, jit_compile=False):
+        """
+        :param keras_model: Modelo Keras ya construido.
+        :param jit_compile: Si es True, compila el grafo con XLA.
+        """
+        self.model = keras_model
+        self.jit_compile = jit_compile
+        spec = tf.TensorSpec(shape=(None, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=tf.float32)
+        self._forward = tf.function(self._call_model, input_signature=[spec], jit_compile=jit_compile)
+        # Trazar ahora para que el primer frame real no pague el coste de tracing
+        self._forward.get_concrete_function()
+
+    def _call_model(self, input_tensor):
+        return self.model(input_tensor, training=False)
+
+    def __call__(self, input_tensor):
+        """
+        Ejecuta el forward pass sobre un lote ya preprocesado.
+        :param input_tensor: Array (N, 224, 224, 3).
+        :return: Array numpy (N, 1000) con las probabilidades por clase.
+        """
+        input_tensor = tf.convert_to_tensor(np.asarray(input_tensor, dtype=np.float32))
+        return self._forward(input_tensor).numpy()
+
+
+class KerasBackend:
+    """
+    Backend TensorFlow/Keras: EfficientNetV2B0 completo ejecutado con `InferenceSession`.
+    """
+
+    name = "keras"
+
+    def __init__(self, jit_compile=USE_XLA, intra_op_threads=TF_INTRA_OP_THREADS,
+                 inter_op_threads=TF_INTER_OP_THREADS):
+        if _tensorflow() is None:
+            raise RuntimeError("TensorFlow no está instalado; usa el backend 'tflite'.")
+        try:
+            if intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Solo se puede fijar antes de que TensorFlow inicialice su runtime
+            logging.warning(f"No se pudo limitar los hilos de TensorFlow: {e}")
+        self.model = tf.keras.applications.EfficientNetV2B0(
+            weights="imagenet",
+            include_top=True,
+            input_shape=(224, 224, 3)  # Fuerza entrada RGB
+        )
+        self.session = InferenceSession(self.model, jit_compile=jit_compile)
+
+    def predict(self, input_tensor):
+        """
+        :param input_tensor: Array float32 (N, 224, 224, 3).
+        :return: Array numpy (N, 1000) con las probabilidades por clase.
+        """
+        return self.session(input_tensor)
+
+
+def artifact_checksum(artifact_dir):
+    """
+    SHA-256 de todos los ficheros de un artefacto (excepto el manifiesto), en orden estable.
+    :param artifact_dir: Directorio del SavedModel.
+    :return: Digest hexadecimal.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(artifact_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name == FROZEN_MANIFEST_FILE:
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, artifact_dir).replace(os.sep, "/").encode("utf-8"))
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_artifact(artifact_dir=FROZEN_MODEL_DIR):
+    """
+    Comprueba que el artefacto congelado existe y que su checksum coincide con el manifiesto.
+    :return: Diccionario del manifiesto.
+    :raises RuntimeError: Si falta el artefacto o el checksum no coincide.
+    """
+    manifest_path = os.path.join(artifact_dir, FROZEN_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise RuntimeError(
+            f"No existe el artefacto congelado en {artifact_dir}. Genéralo con: python export_model.py frozen"
+        )
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    checksum = artifact_checksum(artifact_dir)
+    if checksum != manifest.get("sha256"):
+        raise RuntimeError(f"Checksum inválido del artefacto {artifact_dir}: vuelve a exportarlo")
+    return manifest
+
+
+def frozen_artifact_available(artifact_dir=FROZEN_MODEL_DIR):
+    """Indica si hay un artefacto congelado (con manifiesto) en la caché local."""
+    return os.path.exists(os.path.join(artifact_dir, FROZEN_MANIFEST_FILE))
+
+
+class FrozenGraphBackend:
+    """
+    Backend de artefacto congelado: carga el SavedModel de solo inferencia exportado por
+    `export_model.py frozen` (variables convertidas en constantes, constant folding aplicado
+    y nodos de entrenamiento eliminados). No descarga pesos ni reconstruye el modelo Keras.
+    """
+
+    name = "frozen"
+
+    def __init__(self, artifact_dir=FROZEN_MODEL_DIR, verify=True):
+        """
+        :param artifact_dir: Directorio del SavedModel congelado.
+        :param verify: Verificar el checksum antes de cargar.
+        """
+        if _tensorflow() is None:
+            raise RuntimeError("TensorFlow no está instalado; usa el backend 'tflite'.")
+        if verify:
+            self.manifest = verify_artifact(artifact_dir)
+        else:
+            with open(os.path.join(artifact_dir, FROZEN_MANIFEST_FILE), "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self.artifact_dir = artifact_dir
+        self._loaded = tf.saved_model.load(artifact_dir)
+        self._forward = self._loaded.signatures["serving_default"]
+
+    def predict(self, input_tensor):
+        """
+        :param input_tensor: Array float32 (N, 224, 224, 3).
+        :return: Array numpy (N, 1000) con las probabilidades por clase.
+        """
+        input_tensor = tf.convert_to_tensor(np.asarray(input_tensor, dtype=np.float32))
+        return self._forward(input=input_tensor)["probabilities"].numpy()
+
+
+def _tflite_interpreter_class():
+    """Retorna la clase Interpreter de tflite-runtime o, si no está, la de TensorFlow."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        if _tensorflow() is None:
+            raise RuntimeError("No está instalado tflite-runtime ni TensorFlow.")
+        return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    """
+    Backend TFLite: ejecuta el modelo convertido por `export_model.py`.
+    Acepta modelos float32, float16 o int8; si la entrada/salida del modelo está
+    cuantizada se aplican la escala y el punto cero del propio tensor, de modo que
+    el contrato de entrada (float32 0..255) y salida (probabilidades) es el mismo
+    que el del backend Keras.
+    """
 
-# Cargar modelo al importar módulo (una sola vez)
+    name = "tflite"
+
+    def __init__(self, model_path=None, mode=TFLITE_MODE, num_threads=TFLITE_THREADS):
+        """
+        :param model_path: Ruta al `.tflite`. Por defecto `tflite_model_path(mode)`.
+        :param mode: Variante de cuantización si no se indica `model_path`.
+        :param num_threads: Hilos del intérprete.
+        """
+        self.model_path = model_path or tflite_model_path(mode)
+        if not os.path.exists(self.model_path):
+            raise RuntimeError(
+                f"No existe el modelo TFLite {self.model_path}. "
+                f"Genéralo con: python export_model.py tflite --mode {mode}"
+            )
+        interpreter_cls = _tflite_interpreter_class()
+        self.interpreter = interpreter_cls(model_path=self.model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._lock = threading.Lock()  # el intérprete no es thread-safe
+        self._batch_size = None
+        self._refresh_details()
+
+    def _refresh_details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+
+    def _resize_batch(self, batch_size):
+        self.interpreter.resize_tensor_input(
+            self._input["index"], [batch_size, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3]
+        )
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+
+    def predict(self, input_tensor):
+        """
+        :param input_tensor: Array float32 (N, 224, 224, 3).
+        :return: Array numpy (N, 1000) con las probabilidades por clase.
+        """
+        input_tensor = np.asarray(input_tensor, dtype=np.float32)
+        with self._lock:
+            if input_tensor.shape[0] != self._batch_size:
+                self._resize_batch(input_tensor.shape[0])
+
+            in_dtype = self._input["dtype"]
+            if in_dtype in (np.int8, np.uint8):
+                scale, zero_point = self._input["quantization"]
+                info = np.iinfo(in_dtype)
+                input_tensor = np.clip(np.round(input_tensor / scale + zero_point), info.min, info.max).astype(in_dtype)
+
+            self.interpreter.set_tensor(self._input["index"], input_tensor)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output["index"])
+
+            if self._output["dtype"] in (np.int8, np.uint8):
+                scale, zero_point = self._output["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+        return np.asarray(output, dtype=np.float32)
+
+
+class ONNXBackend:
+    """
+    Backend ONNX Runtime (CPU): ejecuta el modelo exportado por `export_model.py onnx`.
+    Permite fijar hilos intra/inter-op, nivel de optimización del grafo, arena de
+    memoria y afinidad de núcleos, de forma que la inferencia use un presupuesto
+    fijo de CPU y no compita con la GUI (app_gui.py) ni con el hilo de captura.
+    """
+
+    name = "onnx"
+
+    _OPT_LEVELS = {
+        "disabled": "ORT_DISABLE_ALL",
+        "basic": "ORT_ENABLE_BASIC",
+        "extended": "ORT_ENABLE_EXTENDED",
+        "all": "ORT_ENABLE_ALL",
+    }
+
+    def __init__(self, model_path=None, intra_op_threads=ONNX_INTRA_OP_THREADS,
+                 inter_op_threads=ONNX_INTER_OP_THREADS, graph_optimization=ONNX_GRAPH_OPTIMIZATION,
+                 enable_cpu_mem_arena=True, enable_mem_pattern=True, allow_spinning=False,
+                 cpu_cores=ONNX_CPU_CORES, optimized_model_path=None):
+        """
+        :param model_path: Ruta al `.onnx`. Por defecto `onnx_model_path()`.
+        :param intra_op_threads: Hilos para paralelizar cada operador (incluye el hilo llamante).
+        :param inter_op_threads: Hilos para ejecutar operadores en paralelo (>1 activa ORT_PARALLEL).
+        :param graph_optimization: "disabled", "basic", "extended" o "all".
+        :param enable_cpu_mem_arena: Reutilizar la arena de memoria de CPU entre llamadas.
+        :param enable_mem_pattern: Preplanificar las reservas de memoria según la forma de entrada.
+        :param allow_spinning: Si es False los hilos ociosos duermen en vez de hacer busy-wait.
+        :param cpu_cores: Lista de núcleos lógicos a los que fijar los hilos de trabajo.
+        :param optimized_model_path: Si se indica, guarda ahí el grafo ya optimizado.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime no está instalado (pip install onnxruntime).")
+
+        self.model_path = model_path or onnx_model_path()
+        if not os.path.exists(self.model_path):
+            raise RuntimeError(
+                f"No existe el modelo ONNX {self.model_path}. Genéralo con: python export_model.py onnx"
+            )
+        if graph_optimization not in self._OPT_LEVELS:
+            raise ValueError(f"Nivel de optimización inválido: {graph_optimization}")
+
+        if cpu_cores:
+            cpu_cores = list(cpu_cores)
+            intra_op_threads = intra_op_threads or len(cpu_cores)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or 0
+        options.inter_op_num_threads = inter_op_threads or 0
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if (inter_op_threads or 0) > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, self._OPT_LEVELS[graph_optimization])
+        options.enable_cpu_mem_arena = enable_cpu_mem_arena
+        options.enable_mem_pattern = enable_mem_pattern
+        options.add_session_config_entry("session.intra_op.allow_spinning", "1" if allow_spinning else "0")
+        options.add_session_config_entry("session.inter_op.allow_spinning", "1" if allow_spinning else "0")
+        if optimized_model_path:
+            options.optimized_model_filepath = optimized_model_path
+        if cpu_cores and intra_op_threads and intra_op_threads > 1:
+            # ORT crea intra_op_threads - 1 hilos de trabajo (el llamante es el primero);
+            # la afinidad se indica por hilo, separada por ';', con núcleos numerados desde 1.
+            workers = cpu_cores[1:intra_op_threads] or cpu_cores[:1]
+            affinities = ";".join(str(core + 1) for core in workers)
+            try:
+                options.add_session_config_entry("session.intra_op_thread_affinities", affinities)
+            except Exception as e:
+                logging.warning(f"Esta versión de onnxruntime no admite afinidad de hilos: {e}")
+
+        self.session = ort.InferenceSession(self.model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+        self._output_name = self.session.get_outputs()[0].name
+        logging.info(
+            f"ONNX Runtime: intra_op={intra_op_threads} inter_op={inter_op_threads} "
+            f"optimización={graph_optimization} núcleos={cpu_cores}"
+        )
+
+    def predict(self, input_tensor):
+        """
+        :param input_tensor: Array float32 (N, 224, 224, 3).
+        :return: Array numpy (N, 1000) con las probabilidades por clase.
+        """
+        input_tensor = np.ascontiguousarray(input_tensor, dtype=np.float32)
+        return self.session.run([self._output_name], {self._input_name: input_tensor})[0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "frozen": FrozenGraphBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+}
+
+
+def load_class_index():
+    """
+    Carga la lista de clases ImageNet [(wnid, etiqueta), ...] indexada por clase.
+    Busca primero en MODEL_DIR (copiada por `export_model.py`) y en la caché de Keras,
+    para funcionar sin red ni TensorFlow; solo descarga si no la encuentra.
+    """
+    candidates = [
+        os.path.join(MODEL_DIR, CLASS_INDEX_FILE),
+        os.path.join(os.path.expanduser("~"), ".keras", "models", CLASS_INDEX_FILE),
+    ]
+    path = next((c for c in candidates if os.path.exists(c)), None)
+    if path is None:
+        if _tensorflow() is None:
+            raise RuntimeError(f"No se encontró {CLASS_INDEX_FILE} en {MODEL_DIR}")
+        path = tf.keras.utils.get_file(CLASS_INDEX_FILE, CLASS_INDEX_URL, cache_subdir="models")
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return [tuple(raw[str(i)]) for i in range(len(raw))]
+
+
+def decode_predictions(predictions, top):
+    """
+    Equivalente a `decode_predictions` sobre numpy: retorna por frame una lista
+    de tuplas (etiqueta, confianza) ordenadas por confianza.
+    """
+    top_idx = np.argsort(-predictions, axis=1, kind="stable")[:, :top]
+    return [
+        [(class_index[i][1], float(frame_preds[i])) for i in frame_top]
+        for frame_preds, frame_top in zip(predictions, top_idx)
+    ]
+
+
+# Estado del modelo: se carga de forma perezosa y thread-safe en `load_model()`
+_load_lock = threading.RLock()
+_backend = None
 model = None
-preprocess = None
-decode = None
-try:
-    model = tf.keras.applications.EfficientNetV2B0(
-        weights="imagenet",
-        include_top=True,
-        input_shape=(224, 224, 3)  # Fuerza entrada RGB
-    )
-    preprocess = tf.keras.applications.efficientnet_v2.preprocess_input
-    decode = tf.keras.applications.efficientnet_v2.decode_predictions
-    logging.info("EfficientNetV2B0 cargado correctamente.")
-except Exception as e:
-    logging.error(f"No se pudo cargar el modelo EfficientNetV2B0: {e}")
-    raise RuntimeError(f"No se pudo cargar el modelo EfficientNetV2B0: {e}")
+session = None
+class_index = None
+_warmed_batch_sizes = set()
+
+
+def _resolve_backend_name(name):
+    """Traduce "auto" al artefacto congelado si está en la caché local, o a "keras" si no."""
+    if name != "auto":
+        return name
+    return "frozen" if frozen_artifact_available() else "keras"
+
+
+def set_backend(name=BACKEND, **options):
+    """
+    Selecciona (y carga) el backend de inferencia usado por `classify_image`/`classify_batch`.
+    :param name: "auto", "keras", "frozen", "tflite" u "onnx".
+    :param options: Argumentos del constructor del backend (p. ej. mode="int8" o intra_op_threads=2).
+    :return: La instancia del backend activo.
+    """
+    global _backend, model, session, class_index
+    name = _resolve_backend_name(name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {name}. Opciones: {sorted(BACKENDS)}")
+    with _load_lock:
+        if class_index is None:
+            class_index = load_class_index()
+        backend = BACKENDS[name](**options)
+        _backend = backend
+        model = getattr(backend, "model", None)
+        session = getattr(backend, "session", None)
+        _warmed_batch_sizes.clear()
+    logging.info(f"Backend de clasificación activo: {name}")
+    return backend
+
+
+def load_model(name=None, **options):
+    """
+    Carga el modelo una sola vez (thread-safe e idempotente).
+    Si ya hay un backend cargado y no se pide otro distinto, no hace nada.
+    :param name: Backend a cargar. Default=`BACKEND`.
+    :param options: Argumentos del constructor del backend.
+    :return: La instancia del backend activo.
+    :raises RuntimeError: Si no se puede cargar el modelo.
+    """
+    with _load_lock:
+        if name is not None:
+            name = _resolve_backend_name(name)
+        if _backend is not None and (name is None or name == _backend.name):
+            return _backend
+        start = time.perf_counter()
+        try:
+            backend = set_backend(name or BACKEND, **options)
+        except Exception as e:
+            logging.error(f"No se pudo cargar el modelo EfficientNetV2B0: {e}")
+            raise RuntimeError(f"No se pudo cargar el modelo EfficientNetV2B0: {e}")
+        logging.info(f"EfficientNetV2B0 cargado correctamente en {time.perf_counter() - start:.2f} s.")
+        return backend
+
+
+def warmup(n=3, batch_size=1, frame_shape=(480, 640, 3)):
+    """
+    Ejecuta `n` clasificaciones de calentamiento con frames sintéticos para que el
+    primer frame real no pague tracing, reservas de memoria ni inicialización de OpenCV.
+    Es idempotente por tamaño de lote: repetir la llamada no vuelve a calentar.
+    :param n: Número de pasadas de calentamiento.
+    :param batch_size: Tamaño de lote a calentar (p. ej. el número de cámaras).
+    :param frame_shape: Forma de los frames sintéticos (alto, ancho, canales).
+    :return: Lista de latencias (ms) de cada pasada; vacía si ya estaba calentado.
+    """
+    load_model()
+    with _load_lock:
+        if batch_size in _warmed_batch_sizes:
+            return []
+        frames = np.zeros((batch_size,) + tuple(frame_shape), dtype=np.uint8)
+        samples = []
+        for _ in range(max(1, n)):
+            start = time.perf_counter()
+            _predict_uncached(frames)  # sin pasar por la caché de resultados
+            samples.append((time.perf_counter() - start) * 1000.0)
+        _warmed_batch_sizes.add(batch_size)
+    logging.info(f"Calentamiento del modelo (lote {batch_size}): " + ", ".join(f"{ms:.1f}ms" for ms in samples))
+    return samples
+
+
+class InputBuffer:
+    """
+    Buffer de entrada preasignado para un tamaño de lote: tensor float32 (N, 224, 224, 3)
+    que se entrega directamente al modelo y una imagen uint8 224x224 para el resize.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.tensor = np.empty((batch_size, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.float32)
+        self.resized = np.empty((MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.uint8)
+
+
+class InputBufferPool:
+    """
+    Pool thread-safe de `InputBuffer` reutilizables, agrupados por tamaño de lote.
+    Evita reservar los arrays de entrada en cada frame; si todos los buffers de un
+    tamaño están en uso (varios hilos clasificando a la vez) se crea uno nuevo.
+    """
+
+    def __init__(self, max_per_size=2):
+        """
+        :param max_per_size: Buffers libres que se conservan por tamaño de lote.
+        """
+        self.max_per_size = max_per_size
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, batch_size):
+        """Retorna un buffer libre para `batch_size` frames (o uno nuevo si no hay)."""
+        with self._lock:
+            free = self._free.get(batch_size)
+            if free:
+                return free.pop()
+        return InputBuffer(batch_size)
+
+    def release(self, buffer):
+        """Devuelve un buffer al pool para reutilizarlo."""
+        with self._lock:
+            free = self._free.setdefault(buffer.batch_size, [])
+            if len(free) < self.max_per_size:
+                free.append(buffer)
+
+
+_buffer_pool = InputBufferPool()
+
+# Caché opcional de resultados por hash perceptual (ver frame_cache.PerceptualCache)
+_result_cache = None
+
+
+def set_result_cache(cache):
+    """
+    Activa (o desactiva con None) la caché de resultados delante del modelo.
+    Los frames casi idénticos a uno reciente reutilizan sus probabilidades sin inferencia.
+    :param cache: Instancia de `frame_cache.PerceptualCache` o None.
+    """
+    global _result_cache
+    _result_cache = cache
+
+
+def invalidate_result_cache():
+    """
+    Vacía la caché de resultados activa, si hay una. Se llama cuando la puerta de movimiento
+    detecta un cambio en la escena: un objeto pequeño puede mover el hash perceptual menos de
+    `max_distance` bits y reutilizaría el resultado de la cinta vacía.
+    """
+    cache = _result_cache
+    if cache is not None:
+        cache.clear()
+
+
+def _check_frames(frames):
+    if isinstance(frames, np.ndarray) and frames.ndim == 3:
+        frames = [frames]
+    if frames is None or len(frames) == 0:
+        logging.error("Lote de frames vacío para clasificación")
+        raise ValueError("Lote de frames vacío para clasificación")
+    for frame in frames:
+        if frame is None or not hasattr(frame, "shape") or frame.ndim != 3 or frame.shape[2] != 3:
+            logging.error("Frame inválido o vacío para clasificación")
+            raise ValueError("Frame inválido o vacío para clasificación")
+    return frames
+
+
+def _preprocess_into(frames, buffer):
+    """
+    Preprocesado fusionado: redimensiona primero (INTER_AREA sobre el frame BGR completo)
+    y convierte BGR->RGB sobre la imagen ya pequeña, escribiendo directamente en el tensor
+    preasignado del buffer. El cambio de canales y la conversión a float32 se hacen en una
+    sola copia sobre una vista invertida, sin arrays intermedios.
+    EfficientNetV2 incluye el reescalado dentro del modelo (preprocess_input es la
+    identidad), así que basta con pasar los píxeles 0..255 como float32.
+    :param frames: Secuencia de imágenes BGR (uint8, alto x ancho x 3) ya validadas.
+    :param buffer: `InputBuffer` con `batch_size == len(frames)`.
+    :return: El tensor del buffer, listo para el modelo.
+    """
+    for i, frame in enumerate(frames):
+        # El resize es lineal por canal, así que redimensionar antes de reordenar canales
+        # da el mismo resultado que convertir el frame completo y luego redimensionar
+        cv2.resize(frame, MODEL_INPUT_SIZE, dst=buffer.resized, interpolation=cv2.INTER_AREA)
+        np.copyto(buffer.tensor[i], buffer.resized[:, :, ::-1], casting="unsafe")
+    return buffer.tensor
+
+
+def _preprocess_batch(frames):
+    """
+    Convierte uno o varios frames BGR en un tensor de entrada nuevo (no reutilizado).
+    :param frames: Lista de imágenes BGR o array apilado de forma (N, alto, ancho, 3).
+    :return: Tensor (N, 224, 224, 3) listo para el modelo.
+    """
+    frames = _check_frames(frames)
+    return _preprocess_into(frames, InputBuffer(len(frames)))
+
+
+def predict_batch(frames, cache=None):
+    """
+    Ejecuta una sola pasada del modelo sobre uno o varios frames.
+    :param frames: Lista de imágenes BGR o array apilado de forma (N, alto, ancho, 3).
+    :param cache: `PerceptualCache` a usar en lugar de la activa (`set_result_cache`), o una
+                  lista con una caché (o None) por frame.
+    :return: Array numpy (N, 1000) con las probabilidades por clase ImageNet.
+    """
+    frames = _check_frames(frames)
+    if cache is None:
+        cache = _result_cache
+    caches = cache if isinstance(cache, (list, tuple)) else [cache] * len(frames)
+    if all(c is None for c in caches):
+        return _predict_uncached(frames)
+
+    keys = [c.key(frame) if c is not None else None for c, frame in zip(caches, frames)]
+    cached = [c.get(key) if c is not None else None for c, key in zip(caches, keys)]
+    missing = [i for i, probs in enumerate(cached) if probs is None]
+    if missing:
+        fresh = _predict_uncached([frames[i] for i in missing])
+        for i, probs in zip(missing, fresh):
+            if caches[i] is not None:
+                caches[i].put(keys[i], probs)
+            cached[i] = probs
+    return np.stack(cached, axis=0)
+
+
+def _predict_uncached(frames):
+    backend = _backend if _backend is not None else load_model()
+
+    buffer = _buffer_pool.acquire(len(frames))
+    try:
+        input_tensor = _preprocess_into(frames, buffer)
+        return backend.predict(input_tensor)
+    except ValueError:
+        raise
+    except Exception as e:
+        logging.error(f"Error en la clasificación: {e}")
+        raise RuntimeError(f"Error en la clasificación: {e}")
+    finally:
+        # los backends retornan arrays nuevos: el buffer ya puede reutilizarse
+        _buffer_pool.release(buffer)
+
+
+def classify_batch(frames, top=1):
+    """
+    Clasifica varios frames en una sola pasada del modelo.
+    Útil con varias cámaras o varios recortes de un mismo frame: el coste fijo
+    de cada llamada al modelo se paga una vez por lote y no una vez por frame.
+    :param frames: Lista de imágenes BGR o array apilado de forma (N, alto, ancho, 3).
+    :param top: Número de predicciones a retornar por frame.
+    :return: Lista (una por frame) de listas de tuplas (etiqueta, confianza).
+    """
+    results = decode_predictions(predict_batch(frames), top)
+    logging.debug(f"Predicciones: {results}")
+    return results
 
 
 def classify_image(frame, top=1):
@@ -42,25 +704,258 @@ def classify_image(frame, top=1):
     :param top: Número de predicciones a retornar.
     :return: Lista de tuplas (etiqueta, confianza) ordenadas por confianza.
     """
-    if model is None or preprocess is None or decode is None:
-        logging.error("El modelo EfficientNetV2B0 no está cargado.")
-        raise RuntimeError("El modelo EfficientNetV2B0 no está cargado.")
+    if frame is None or not hasattr(frame, "shape"):
+        logging.error("Frame inválido o vacío para clasificación")
+        raise ValueError("Frame inválido o vacío para clasificación")
+    return classify_batch([frame], top=top)[0]
+
+
+def crop_roi(frame, roi=None):
+    """
+    Recorta la región de interés de un frame (vista, sin copiar).
+    :param frame: Imagen BGR.
+    :param roi: Rectángulo (x, y, ancho, alto) en píxeles, o None para el frame completo.
+                Se ajusta a los límites del frame.
+    :return: Vista del frame limitada a la ROI.
+    """
+    if roi is None:
+        return frame
+    h, w = frame.shape[:2]
+    x, y, rw, rh = (int(v) for v in roi)
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + rw), min(h, y + rh)
+    if x1 <= x0 or y1 <= y0:
+        logging.error(f"ROI {roi} fuera del frame {w}x{h}")
+        raise ValueError(f"ROI {roi} fuera del frame {w}x{h}")
+    return frame[y0:y1, x0:x1]
+
+
+def crop_regions(frame, roi=None, tiles=(1, 1), overlap=0.0):
+    """
+    Divide la ROI de un frame en una rejilla de recortes (vistas, sin copiar).
+    Más recortes dan más resolución a objetos pequeños a cambio de más latencia
+    (todos se clasifican en la misma pasada).
+    :param frame: Imagen BGR.
+    :param roi: Rectángulo (x, y, ancho, alto) o None para el frame completo.
+    :param tiles: (columnas, filas) de la rejilla; (1, 1) = solo la ROI.
+    :param overlap: Solapamiento entre recortes vecinos como fracción del recorte (0 a <1).
+    :return: Lista de recortes.
+    """
+    region = crop_roi(frame, roi)
+    cols, rows = tiles
+    if cols < 1 or rows < 1 or not 0.0 <= overlap < 1.0:
+        raise ValueError(f"Configuración de recortes inválida: tiles={tiles} overlap={overlap}")
+    if cols == 1 and rows == 1:
+        return [region]
+    h, w = region.shape[:2]
+    # tamaño del recorte tal que cols recortes con solapamiento cubran el ancho
+    tile_w = int(round(w / (cols - (cols - 1) * overlap)))
+    tile_h = int(round(h / (rows - (rows - 1) * overlap)))
+    step_x = (w - tile_w) / (cols - 1) if cols > 1 else 0
+    step_y = (h - tile_h) / (rows - 1) if rows > 1 else 0
+    crops = []
+    for r in range(rows):
+        for c in range(cols):
+            x0, y0 = int(round(c * step_x)), int(round(r * step_y))
+            crops.append(region[y0:y0 + tile_h, x0:x0 + tile_w])
+    return crops
+
+
+def predict_regions(frame, roi=None, tiles=(1, 1), overlap=0.0):
+    """
+    Clasifica todos los recortes de un frame en una sola pasada y fusiona el resultado
+    tomando, por clase, la probabilidad máxima entre recortes (el objeto basta con que
+    aparezca en uno de ellos).
+    :return: Vector (1000,) de probabilidades fusionadas.
+    """
+    if frame is None or not hasattr(frame, "shape"):
+        logging.error("Frame inválido o vacío para clasificación")
+        raise ValueError("Frame inválido o vacío para clasificación")
+    return predict_batch(crop_regions(frame, roi, tiles, overlap)).max(axis=0)
+
+
+def predict_regions_batch(requests, caches=None):
+    """
+    Versión por lotes de `predict_regions` para varias fuentes (p. ej. varias cámaras):
+    los recortes de todos los frames se clasifican en una sola pasada del modelo.
+    :param requests: Lista de (frame, roi, tiles, overlap), una por frame.
+    :param caches: Lista con la `PerceptualCache` (o None) de cada frame, p. ej. una por cámara
+                   para que invalidar la de un puesto no vacíe las de los demás. None = la caché activa.
+    :return: Array (N, 1000) con las probabilidades fusionadas de cada frame.
+    """
+    if caches is not None and len(caches) != len(requests):
+        raise ValueError(f"Se esperaban {len(requests)} cachés y se recibieron {len(caches)}")
+    crops, counts, crop_caches = [], [], []
+    for i, (frame, roi, tiles, overlap) in enumerate(requests):
+        if frame is None or not hasattr(frame, "shape"):
+            logging.error("Frame inválido o vacío para clasificación")
+            raise ValueError("Frame inválido o vacío para clasificación")
+        regions = crop_regions(frame, roi, tiles, overlap)
+        crops.extend(regions)
+        counts.append(len(regions))
+        if caches is not None:
+            crop_caches.extend([caches[i]] * len(regions))
+    if not crops:
+        return np.empty((0, 1000), dtype=np.float32)
+    predictions = predict_batch(crops, crop_caches if caches is not None else None)
+    bounds = np.cumsum([0] + counts)
+    return np.stack([predictions[a:b].max(axis=0) for a, b in zip(bounds[:-1], bounds[1:])])
+
+
+def classify_regions(frame, roi=None, tiles=(1, 1), overlap=0.0, top=1):
+    """
+    Como `classify_image`, pero sobre la ROI de la cámara y, opcionalmente, en modo
+    multi-recorte: los recortes se clasifican en un único lote y se fusionan en una
+    sola lista de predicciones.
+    :return: Lista de tuplas (etiqueta, confianza) ordenadas por confianza.
+    """
+    return decode_predictions(predict_regions(frame, roi, tiles, overlap)[np.newaxis, :], top)[0]
+
+
+class TargetMatcher:
+    """
+    Cabeza de salida orientada a objetivos: precalcula una sola vez qué clases ImageNet
+    corresponden a cada objetivo (p. ej. las claves de `OBJETIVOS_MAP`) y, por frame,
+    hace un gather vectorizado y un argmax solo sobre esas clases, sin decodificar las
+    1000 etiquetas ni comparar cadenas en el camino caliente.
+    """
+
+    def __init__(self, targets, threshold=0.5, exact=False, inclusive=True):
+        """
+        :param targets: Objetivos en orden de prioridad (iterable o dict como `OBJETIVOS_MAP`).
+        :param threshold: Confianza mínima para aceptar una detección.
+        :param exact: Si es True la etiqueta debe ser igual al objetivo; si no, basta con
+                      que lo contenga (mismo criterio que el emparejamiento por subcadena previo).
+        :param inclusive: Si es True acepta `confianza >= threshold` (main_pc, app_gui); con False
+                          exige `confianza > threshold`, como main.py y logica_paletizadora.py.
+        """
+        global class_index
+        with _load_lock:
+            if class_index is None:
+                class_index = load_class_index()
+        self.targets = list(targets)
+        self.threshold = threshold
+        self.inclusive = inclusive
+        indices, routines, labels = [], [], []
+        for i, (_, label) in enumerate(class_index):
+            label_l = label.lower()
+            for objetivo in self.targets:
+                if (label_l == objetivo) if exact else (objetivo in label_l):
+                    indices.append(i)
+                    routines.append(objetivo)
+                    labels.append(label)
+                    break
+        if not indices:
+            raise ValueError(f"Ningún objetivo corresponde a una clase ImageNet: {self.targets}")
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.routines = routines
+        self.labels = labels
+        logging.info(f"TargetMatcher: {len(indices)} clases ImageNet para {len(self.targets)} objetivos")
+
+    def match_batch(self, predictions):
+        """
+        :param predictions: Array (N, 1000) de probabilidades.
+        :return: Lista (una por frame) de (objetivo, confianza, etiqueta) o None si ninguna
+                 clase objetivo supera el umbral.
+        """
+        target_probs = np.asarray(predictions)[:, self.indices]
+        best = target_probs.argmax(axis=1)
+        confs = target_probs[np.arange(len(best)), best]
+        accepted = confs >= self.threshold if self.inclusive else confs > self.threshold
+        return [
+            (self.routines[j], float(conf), self.labels[j]) if ok else None
+            for j, conf, ok in zip(best, confs, accepted)
+        ]
 
+    def match(self, predictions):
+        """
+        :param predictions: Vector (1000,) de probabilidades de un frame.
+        :return: (objetivo, confianza, etiqueta) o None.
+        """
+        return self.match_batch(np.asarray(predictions)[np.newaxis, :])[0]
+
+
+def classify_targets_batch(frames, matcher):
+    """
+    Clasifica varios frames en una pasada y retorna directamente el objetivo detectado en cada uno.
+    :param frames: Lista de imágenes BGR o array apilado.
+    :param matcher: `TargetMatcher` construido una vez al arrancar.
+    :return: Lista de (objetivo, confianza, etiqueta) o None por frame.
+    """
+    return matcher.match_batch(predict_batch(frames))
+
+
+def classify_targets(frame, matcher, roi=None, tiles=(1, 1), overlap=0.0):
+    """
+    Clasifica un frame y retorna el objetivo detectado sin decodificar las 1000 clases.
+    :param frame: Imagen en formato BGR (numpy array).
+    :param matcher: `TargetMatcher` construido una vez al arrancar.
+    :param roi: Rectángulo (x, y, ancho, alto) de la cinta en el frame, o None.
+    :param tiles: (columnas, filas) del modo multi-recorte dentro de la ROI.
+    :param overlap: Solapamiento entre recortes (fracción).
+    :return: (objetivo, confianza, etiqueta) o None si no hay objetivo sobre el umbral.
+    """
     if frame is None or not hasattr(frame, "shape"):
         logging.error("Frame inválido o vacío para clasificación")
         raise ValueError("Frame inválido o vacío para clasificación")
+    if roi is None and tuple(tiles) == (1, 1):
+        return classify_targets_batch([frame], matcher)[0]
+    return matcher.match(predict_regions(frame, roi, tiles, overlap))
 
-    try:
-        # Convertir de BGR (OpenCV) a RGB (modelo)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        resized_image = cv2.resize(frame_rgb, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
-        # Usar preprocess_input directamente sobre la imagen uint8
-        input_tensor = preprocess(np.expand_dims(resized_image, axis=0))
-        predictions = model.predict(input_tensor, verbose=0)
-        decoded = decode(predictions, top=top)[0]
-        result = [(label, float(conf)) for (_, label, conf) in decoded]
-        logging.debug(f"Predicciones: {result}")
-        return result
-    except Exception as e:
-        logging.error(f"Error en la clasificación: {e}")
-        raise RuntimeError(f"Error en la clasificación: {e}")
+
+def latency_stats(samples_ms):
+    """
+    Resume una lista de latencias en milisegundos.
+    :return: Diccionario con p50, p99 y media.
+    """
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p99": float(np.percentile(samples, 99)),
+        "mean": float(samples.mean()),
+    }
+
+
+def _time_calls(fn, runs, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def benchmark_session(runs=100, warmup=5, batch_size=1, jit_compile=USE_XLA):
+    """
+    Compara la latencia de `model.predict` frente a la sesión de inferencia.
+    :param runs: Número de llamadas medidas por camino.
+    :param warmup: Llamadas descartadas antes de medir.
+    :param batch_size: Tamaño de lote de la entrada sintética.
+    :param jit_compile: Compilar con XLA la sesión medida.
+    :return: Diccionario con p50/p99 (ms) de cada camino y el ahorro obtenido.
+    """
+    load_model()
+    if model is None:
+        raise RuntimeError("benchmark_session requiere el backend 'keras' activo.")
+
+    dummy = np.random.randint(0, 256, size=(batch_size, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3)).astype(np.float32)
+    bench_session = session
+    if bench_session is None or bench_session.jit_compile != jit_compile:
+        bench_session = InferenceSession(model, jit_compile=jit_compile)
+
+    predict_stats = latency_stats(_time_calls(lambda: model.predict(dummy, verbose=0), runs, warmup))
+    session_stats = latency_stats(_time_calls(lambda: bench_session(dummy), runs, warmup))
+    report = {
+        "predict": predict_stats,
+        "session": session_stats,
+        "saved_p50_ms": predict_stats["p50"] - session_stats["p50"],
+        "saved_p99_ms": predict_stats["p99"] - session_stats["p99"],
+    }
+    logging.info(
+        f"Latencia predict p50={predict_stats['p50']:.2f}ms p99={predict_stats['p99']:.2f}ms | "
+        f"sesión{' (XLA)' if jit_compile else ''} p50={session_stats['p50']:.2f}ms p99={session_stats['p99']:.2f}ms | "
+        f"ahorro p50={report['saved_p50_ms']:.2f}ms p99={report['saved_p99_ms']:.2f}ms"
+    )
+    return report
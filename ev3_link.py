@@ -0,0 +1,375 @@
+"""
+ev3_link.py
+
+Canal SSH persistente hacia el EV3.
+
+Antes cada comando (`send_routine`, `send_palletize`, `send_stop_motors`, `check_ev3_via_ssh`)
+lanzaba un `ssh` nuevo y pagaba cada vez la creación del proceso, la conexión TCP, el
+intercambio de claves y la autenticación en la CPU ARM del EV3 (varios segundos).
+`EV3Link` abre una sola sesión autenticada y la reutiliza para todos los comandos:
+    - "paramiko": cliente SSH dentro del proceso (un canal por comando sobre la misma conexión).
+    - "openssh": `ssh` del sistema con multiplexación ControlMaster/ControlPersist (no
+      disponible en el OpenSSH de Windows).
+    - "subprocess": un `ssh` por comando, como antes (último recurso).
+    - "fake": transporte simulado para probar sin EV3.
+Con "auto" se usa paramiko si está instalado, si no openssh (fuera de Windows) o subprocess.
+Si la sesión se cae se reconecta automáticamente. `run()` retorna un
+`subprocess.CompletedProcess`, así los llamantes conservan el mismo criterio de OK/error.
+"""
+
+
+import logging
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+
+# Conexión por defecto (misma que main_pc.py / app_gui.py)
+EV3_USER = "robot"
+EV3_HOST = "ev3dev.local"
+# Transporte: "auto", "paramiko", "openssh", "subprocess" o "fake"
+EV3_TRANSPORT = "auto"
+# Autenticación para paramiko: None usa las claves de ~/.ssh (ver setup_ssh_ev3.ps1)
+EV3_PASSWORD = None
+EV3_KEY_FILE = None
+CONNECT_TIMEOUT = 10.0
+# Segundos que el ControlMaster de OpenSSH sigue vivo sin comandos
+CONTROL_PERSIST = 600
+
+
+class EV3ConnectionError(RuntimeError):
+    """La sesión SSH con el EV3 no está disponible."""
+
+
+class SubprocessTransport:
+    """Un proceso `ssh` por comando (comportamiento original, sin reutilizar la sesión)."""
+
+    name = "subprocess"
+
+    def __init__(self, user, host, connect_timeout=CONNECT_TIMEOUT):
+        self.user = user
+        self.host = host
+        self.connect_timeout = connect_timeout
+
+    def _ssh_args(self):
+        return ["ssh", "-o", "StrictHostKeyChecking=no", "-o", f"ConnectTimeout={int(self.connect_timeout)}"]
+
+    def connect(self):
+        pass
+
+    def run(self, command, timeout):
+        cmd = self._ssh_args() + [f"{self.user}@{self.host}", command]
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+    def close(self):
+        pass
+
+
+class OpenSSHTransport(SubprocessTransport):
+    """
+    `ssh` del sistema con un ControlMaster persistente: el primer comando autentica y los
+    siguientes viajan como canales nuevos sobre esa conexión (sin TCP, kex ni auth).
+    """
+
+    name = "openssh"
+
+    def __init__(self, user, host, connect_timeout=CONNECT_TIMEOUT, control_persist=CONTROL_PERSIST):
+        super().__init__(user, host, connect_timeout)
+        self.control_persist = control_persist
+        # %C = hash de usuario/host/puerto: ruta corta para el socket unix
+        self.control_path = os.path.join(tempfile.gettempdir(), "ev3-ssh-%C")
+        # El maestro solo se verifica al conectar por primera vez o tras un fallo de ssh
+        self._master_ok = False
+
+    def _ssh_args(self):
+        return super()._ssh_args() + [
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_path}",
+            "-o", f"ControlPersist={self.control_persist}",
+        ]
+
+    def _control(self, operation):
+        cmd = self._ssh_args() + ["-O", operation, f"{self.user}@{self.host}"]
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=self.connect_timeout)
+
+    def connect(self):
+        if self._master_ok:
+            return
+        if self._control("check").returncode != 0:
+            # Un comando vacío deja el maestro en segundo plano gracias a ControlPersist
+            result = super().run("true", timeout=self.connect_timeout + 5)
+            if result.returncode != 0:
+                raise EV3ConnectionError(f"No se pudo abrir la sesión SSH maestra: {result.stderr.strip()}")
+        self._master_ok = True
+
+    def run(self, command, timeout):
+        result = super().run(command, timeout)
+        # 255 = error del propio ssh (p. ej. maestro caído): verificarlo en el próximo connect()
+        if result.returncode == 255:
+            self._master_ok = False
+        return result
+
+    def close(self):
+        self._master_ok = False
+        try:
+            self._control("exit")
+        except Exception:
+            pass
+
+
+class ParamikoTransport:
+    """Cliente SSH dentro del proceso: una conexión autenticada, un canal por comando."""
+
+    name = "paramiko"
+
+    def __init__(self, user, host, connect_timeout=CONNECT_TIMEOUT, password=EV3_PASSWORD, key_filename=EV3_KEY_FILE):
+        import paramiko
+        self._paramiko = paramiko
+        self.user = user
+        self.host = host
+        self.connect_timeout = connect_timeout
+        self.password = password
+        self.key_filename = key_filename
+        self._client = None
+
+    def _active(self):
+        transport = self._client.get_transport() if self._client is not None else None
+        return transport is not None and transport.is_active()
+
+    def connect(self):
+        if self._active():
+            return
+        self.close()
+        client = self._paramiko.SSHClient()
+        # Equivalente a StrictHostKeyChecking=no
+        client.set_missing_host_key_policy(self._paramiko.AutoAddPolicy())
+        try:
+            client.connect(self.host, username=self.user, password=self.password, key_filename=self.key_filename,
+                           timeout=self.connect_timeout, banner_timeout=self.connect_timeout,
+                           auth_timeout=self.connect_timeout)
+        except (self._paramiko.SSHException, OSError) as e:
+            raise EV3ConnectionError(f"No se pudo conectar por SSH con {self.user}@{self.host}: {e}") from e
+        # Mantener viva la sesión entre rutinas
+        client.get_transport().set_keepalive(30)
+        self._client = client
+
+    def run(self, command, timeout):
+        if not self._active():
+            raise EV3ConnectionError("Sesión SSH cerrada")
+        try:
+            channel = self._client.get_transport().open_session(timeout=self.connect_timeout)
+        except (self._paramiko.SSHException, OSError) as e:
+            raise EV3ConnectionError(f"No se pudo abrir un canal SSH: {e}") from e
+        channel.set_combine_stderr(False)
+        try:
+            channel.exec_command(command)
+            stdout, stderr = self._drain(channel, command, timeout)
+            returncode = channel.recv_exit_status()
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(command, timeout)
+        except (self._paramiko.SSHException, EOFError, OSError) as e:
+            # El comando pudo haberse ejecutado: no se reintenta; el siguiente reconecta
+            self.close()
+            raise RuntimeError(f"Sesión SSH perdida durante el comando: {e}") from e
+        finally:
+            channel.close()
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    @staticmethod
+    def _drain(channel, command, timeout):
+        # Leer stdout y stderr a la vez: si uno se leyera hasta EOF antes que el otro, una
+        # salida de error mayor que la ventana del canal bloquearía el comando remoto
+        stdout, stderr = [], []
+        deadline = time.monotonic() + timeout
+        while True:
+            received = False
+            while channel.recv_ready():
+                stdout.append(channel.recv(32768))
+                received = True
+            while channel.recv_stderr_ready():
+                stderr.append(channel.recv_stderr(32768))
+                received = True
+            # El estado de salida llega después de todos los datos del canal
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            if time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(command, timeout)
+            if not received:
+                time.sleep(0.01)
+        decode = lambda chunks: b"".join(chunks).decode("utf-8", errors="replace")
+        return decode(stdout), decode(stderr)
+
+    def close(self):
+        if self._client is not None:
+            try:
+                self._client.close()
+            finally:
+                self._client = None
+
+
+class FakeTransport:
+    """
+    Transporte simulado: `handler(command)` retorna (returncode, stdout, stderr).
+    Por defecto responde "OK" con código 0. Guarda los comandos recibidos en `commands`.
+    Con `drops=N` las N próximas llamadas a `run` encuentran la sesión caída (el comando no
+    llega a enviarse), como una conexión SSH que se cortó entre rutinas; `drop()` simula
+    una caída más.
+    """
+
+    name = "fake"
+
+    def __init__(self, user, host, handler=None, latency=0.0, drops=0, **_):
+        self.user = user
+        self.host = host
+        self.handler = handler or (lambda command: (0, "OK\n", ""))
+        self.latency = latency
+        self.drops = drops
+        self.commands = []
+        self.connects = 0
+        self.connected = False
+
+    def connect(self):
+        if not self.connected:
+            self.connects += 1
+            self.connected = True
+
+    def run(self, command, timeout):
+        if not self.connected:
+            raise EV3ConnectionError("Sesión simulada cerrada")
+        if self.drops:
+            self.drops -= 1
+            self.connected = False
+            raise EV3ConnectionError("Sesión simulada caída")
+        self.commands.append(command)
+        if self.latency:
+            time.sleep(self.latency)
+        returncode, stdout, stderr = self.handler(command)
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    def drop(self):
+        """La próxima llamada a `run` encuentra la sesión caída."""
+        self.drops += 1
+
+    def close(self):
+        self.connected = False
+
+
+def _resolve_transport(name):
+    if name != "auto":
+        return name
+    try:
+        import paramiko  # noqa: F401
+        return "paramiko"
+    except ImportError:
+        return "subprocess" if os.name == "nt" else "openssh"
+
+
+TRANSPORTS = {
+    "subprocess": SubprocessTransport,
+    "openssh": OpenSSHTransport,
+    "paramiko": ParamikoTransport,
+    "fake": FakeTransport,
+}
+
+
+class EV3Link:
+    """
+    Sesión SSH reutilizable con el EV3, con reconexión automática.
+    Thread-safe: varios hilos pueden lanzar comandos a la vez (cada uno en su canal).
+    """
+
+    def __init__(self, host=EV3_HOST, user=EV3_USER, transport=EV3_TRANSPORT, **options):
+        """
+        Args:
+            host (str, optional): Host o IP del EV3. Default=EV3_HOST.
+            user (str, optional): Usuario. Default=EV3_USER.
+            transport (str, optional): "auto", "paramiko", "openssh", "subprocess" o "fake". Default=EV3_TRANSPORT.
+            **options: Opciones del transporte (connect_timeout, password, key_filename, handler...).
+
+        Raises:
+            ValueError: Si el transporte es desconocido.
+        """
+        name = _resolve_transport(transport)
+        if name not in TRANSPORTS:
+            raise ValueError(f"Transporte SSH desconocido: {transport}")
+        self.host = host
+        self.user = user
+        self.transport = TRANSPORTS[name](user, host, **options)
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.reconnects = 0
+
+    def __str__(self):
+        return f"{self.user}@{self.host} ({self.transport.name})"
+
+    def connect(self):
+        """Abre (o verifica) la sesión. Raises EV3ConnectionError si no se puede."""
+        with self._lock:
+            self.transport.connect()
+
+    def run(self, command, timeout=120):
+        """
+        Ejecuta un comando en el EV3 sobre la sesión persistente. Si la sesión está caída se
+        reconecta y se reintenta una vez; solo se reintentan fallos anteriores a lanzar el comando
+        (un timeout o una caída a mitad de la rutina no se repiten).
+
+        Args:
+            command (str): Comando para el shell remoto.
+            timeout (float, optional): Tiempo máximo del comando en segundos. Default=120.
+
+        Returns:
+            subprocess.CompletedProcess: returncode, stdout y stderr del comando remoto.
+
+        Raises:
+            EV3ConnectionError: Si no se puede conectar con el EV3.
+            subprocess.TimeoutExpired: Si el comando supera `timeout`.
+        """
+        for attempt in range(2):
+            try:
+                self.connect()
+                result = self.transport.run(command, timeout)
+                self.commands += 1
+                return result
+            except EV3ConnectionError as e:
+                with self._lock:
+                    self.transport.close()
+                if attempt:
+                    raise
+                self.reconnects += 1
+                logging.warning(f"Sesión SSH con {self} caída ({e}); reconectando...")
+
+    def close(self):
+        with self._lock:
+            self.transport.close()
+
+
+_links = {}
+_links_lock = threading.Lock()
+
+
+def get_link(host=EV3_HOST, user=EV3_USER, transport=EV3_TRANSPORT, **options):
+    """
+    Retorna la sesión compartida para (usuario, host), creándola la primera vez. Así
+    main_pc.py, app_gui.py y las rutinas en segundo plano reutilizan la misma conexión.
+    """
+    key = (user, host)
+    with _links_lock:
+        link = _links.get(key)
+        if link is None:
+            link = EV3Link(host, user, transport, **options)
+            _links[key] = link
+            logging.info(f"Canal SSH con el EV3: {link}")
+        return link
+
+
+def close_links():
+    """Cierra todas las sesiones compartidas (p. ej. al salir)."""
+    with _links_lock:
+        links = list(_links.values())
+        _links.clear()
+    for link in links:
+        link.close()
+
@@ -0,0 +1,267 @@
+r"""
+export_model.py
+Exporta EfficientNetV2B0 (el mismo modelo que `classifier.py`) a formatos de
+inferencia alternativos y los deja en `models/` (caché local de artefactos) para
+que `classifier.py` los use sin acceso a la red.
+
+Ejecución:
+    python .\export_model.py frozen
+    python .\export_model.py tflite --mode float32
+    python .\export_model.py tflite --mode float16
+    python .\export_model.py tflite --mode int8 --calibration-dir .\frames_muestra
+    python .\export_model.py onnx --opset 13
+
+Nota: requiere TensorFlow instalado en el entorno (solo para exportar; el
+modelo exportado puede ejecutarse luego con tflite-runtime u onnxruntime).
+La exportación a ONNX requiere además tf2onnx.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+
+import cv2
+import numpy as np
+
+import classifier
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _keras_model():
+    """Retorna el modelo Keras de `classifier.py`, cargándolo si hace falta."""
+    classifier.load_model("keras")
+    return classifier.model
+
+
+def _save_class_index():
+    """Copia la lista de clases ImageNet a MODEL_DIR para decodificar sin red."""
+    path = os.path.join(classifier.MODEL_DIR, classifier.CLASS_INDEX_FILE)
+    index = classifier.load_class_index()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(i): list(entry) for i, entry in enumerate(index)}, f)
+    return path
+
+
+def _optimize_graph_def(graph_def, input_names, output_names):
+    """
+    Elimina nodos de entrenamiento y aplica constant folding (Grappler) a un grafo congelado.
+    :param graph_def: GraphDef sin variables.
+    :param input_names: Tensores de entrada a conservar (p. ej. "input:0").
+    :param output_names: Tensores de salida a conservar.
+    :return: GraphDef optimizado.
+    """
+    import tensorflow as tf
+    from tensorflow.core.protobuf import config_pb2, meta_graph_pb2
+    from tensorflow.python.grappler import tf_optimizer
+
+    protected = [name.split(":")[0] for name in input_names + output_names]
+    graph_def = tf.compat.v1.graph_util.remove_training_nodes(graph_def, protected_nodes=protected)
+
+    config = config_pb2.ConfigProto()
+    config.graph_options.infer_shapes = True
+    rewrite = config.graph_options.rewrite_options
+    rewrite.optimizers[:] = ["constfold", "arithmetic", "dependency", "function"]
+    rewrite.meta_optimizer_iterations = rewrite.TWO
+
+    meta_graph = tf.compat.v1.train.export_meta_graph(graph_def=graph_def)
+    fetch = meta_graph_pb2.CollectionDef()
+    for name in input_names + output_names:
+        fetch.node_list.value.append(name)
+    meta_graph.collection_def["train_op"].CopyFrom(fetch)
+    return tf_optimizer.OptimizeGraph(config, meta_graph)
+
+
+def export_frozen(output_dir=None):
+    """
+    Exporta una sola vez el artefacto de solo inferencia que usa el backend "frozen":
+    forward pass con training=False, variables convertidas en constantes, nodos de
+    entrenamiento eliminados y constant folding, guardado como SavedModel en la caché
+    local junto con un manifiesto con su checksum SHA-256.
+
+    Args:
+        output_dir (str, optional): Directorio destino. Default=`classifier.FROZEN_MODEL_DIR`.
+
+    Returns:
+        str: Ruta del artefacto generado.
+    """
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    output_dir = output_dir or classifier.FROZEN_MODEL_DIR
+    model = _keras_model()
+    spec = tf.TensorSpec((None, classifier.MODEL_INPUT_SIZE[1], classifier.MODEL_INPUT_SIZE[0], 3),
+                         tf.float32, name="input")
+    concrete = tf.function(lambda x: model(x, training=False)).get_concrete_function(spec)
+    frozen = convert_variables_to_constants_v2(concrete)
+    input_name = frozen.inputs[0].name
+    output_name = frozen.outputs[0].name
+    graph_def = frozen.graph.as_graph_def()
+    nodes_before = len(graph_def.node)
+    graph_def = _optimize_graph_def(graph_def, [input_name], [output_name])
+    logging.info(f"Grafo congelado: {nodes_before} -> {len(graph_def.node)} nodos tras la optimización")
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    with tf.Graph().as_default() as graph:
+        tf.compat.v1.import_graph_def(graph_def, name="")
+        signature = tf.compat.v1.saved_model.predict_signature_def(
+            inputs={"input": graph.get_tensor_by_name(input_name)},
+            outputs={"probabilities": graph.get_tensor_by_name(output_name)},
+        )
+        with tf.compat.v1.Session(graph=graph) as sess:
+            builder = tf.compat.v1.saved_model.Builder(output_dir)
+            builder.add_meta_graph_and_variables(
+                sess,
+                [tf.compat.v1.saved_model.tag_constants.SERVING],
+                signature_def_map={"serving_default": signature},
+                strip_default_attrs=True,
+            )
+            builder.save()
+
+    manifest = {
+        "model": "EfficientNetV2B0",
+        "input_size": list(classifier.MODEL_INPUT_SIZE),
+        "nodes": len(graph_def.node),
+        "tensorflow": tf.__version__,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sha256": classifier.artifact_checksum(output_dir),
+    }
+    with open(os.path.join(output_dir, classifier.FROZEN_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    _save_class_index()
+    logging.info(f"Artefacto congelado guardado en {output_dir} (sha256={manifest['sha256'][:12]}...)")
+    return output_dir
+
+
+def iter_calibration_frames(calibration_dir, limit=100):
+    """
+    Genera lotes de un frame preprocesados igual que en `classifier.py` a partir
+    de una carpeta local de imágenes de muestra (frames reales de la línea).
+    :param calibration_dir: Carpeta con imágenes .jpg/.png.
+    :param limit: Máximo de imágenes a usar.
+    """
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        raise ValueError(f"Carpeta de calibración inválida: {calibration_dir}")
+    files = sorted(
+        f for f in os.listdir(calibration_dir) if f.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    if not files:
+        raise ValueError(f"La carpeta de calibración {calibration_dir} no contiene imágenes")
+    for name in files:
+        frame = cv2.imread(os.path.join(calibration_dir, name), cv2.IMREAD_COLOR)
+        if frame is None:
+            logging.warning(f"No se pudo leer la imagen de calibración {name}")
+            continue
+        yield classifier._preprocess_batch([frame])
+
+
+def convert_tflite(mode="float32", output_path=None, calibration_dir=None, num_samples=100):
+    """
+    Convierte EfficientNetV2B0 a TFLite.
+    La entrada y la salida se mantienen en float32 incluso en modo int8, para que
+    el preprocesado y las probabilidades sean idénticos a los del backend Keras.
+
+    Args:
+        mode (str): "float32", "float16" o "int8".
+        output_path (str, optional): Destino del `.tflite`. Default=`classifier.tflite_model_path(mode)`.
+        calibration_dir (str, optional): Carpeta de frames de muestra (obligatoria en int8).
+        num_samples (int, optional): Máximo de frames de calibración. Default=100.
+
+    Returns:
+        str: Ruta del modelo generado.
+    """
+    import tensorflow as tf
+
+    if mode not in ("float32", "float16", "int8"):
+        raise ValueError(f"Modo de cuantización inválido: {mode}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(_keras_model())
+    if mode == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        frames = list(iter_calibration_frames(calibration_dir, num_samples))
+        logging.info(f"Calibrando int8 con {len(frames)} frames de {calibration_dir}")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([f] for f in frames)
+        # Operaciones int8 donde existan kernels; el resto queda en float
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+        ]
+
+    tflite_model = converter.convert()
+    output_path = output_path or classifier.tflite_model_path(mode)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    _save_class_index()
+    logging.info(f"Modelo TFLite ({mode}) guardado en {output_path} ({len(tflite_model) / 1e6:.1f} MB)")
+    return output_path
+
+
+def export_onnx(output_path=None, opset=13):
+    """
+    Exporta EfficientNetV2B0 a ONNX (una sola vez) para el backend "onnx".
+    La entrada admite lote variable (N, 224, 224, 3) float32, igual que el backend Keras.
+
+    Args:
+        output_path (str, optional): Destino del `.onnx`. Default=`classifier.onnx_model_path()`.
+        opset (int, optional): Versión de opset ONNX. Default=13.
+
+    Returns:
+        str: Ruta del modelo generado.
+    """
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        raise RuntimeError("tf2onnx no está instalado (pip install tf2onnx).")
+
+    output_path = output_path or classifier.onnx_model_path()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    spec = (tf.TensorSpec((None, classifier.MODEL_INPUT_SIZE[1], classifier.MODEL_INPUT_SIZE[0], 3),
+                          tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(_keras_model(), input_signature=spec, opset=opset, output_path=output_path)
+    _save_class_index()
+    logging.info(f"Modelo ONNX guardado en {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta EfficientNetV2B0 para inferencia")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_frozen = sub.add_parser("frozen", help="SavedModel congelado y optimizado (caché local)")
+    p_frozen.add_argument("--output", default=None)
+
+    p_tflite = sub.add_parser("tflite", help="convertir a TFLite")
+    p_tflite.add_argument("--mode", choices=("float32", "float16", "int8"), default="float32")
+    p_tflite.add_argument("--output", default=None)
+    p_tflite.add_argument("--calibration-dir", default=None, help="frames de muestra para int8")
+    p_tflite.add_argument("--samples", type=int, default=100)
+
+    p_onnx = sub.add_parser("onnx", help="exportar a ONNX")
+    p_onnx.add_argument("--output", default=None)
+    p_onnx.add_argument("--opset", type=int, default=13)
+
+    args = parser.parse_args()
+    try:
+        if args.command == "frozen":
+            export_frozen(args.output)
+        elif args.command == "tflite":
+            convert_tflite(args.mode, args.output, args.calibration_dir, args.samples)
+        elif args.command == "onnx":
+            export_onnx(args.output, args.opset)
+    except Exception as e:
+        print("ERROR al exportar el modelo:", e)
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+frame_cache.py
+
+Caché de resultados de clasificación indexada por hash perceptual del frame.
+Con la cinta parada se clasifica la misma escena una y otra vez; esta caché
+reconoce frames casi idénticos (distancia de Hamming pequeña entre sus dHash)
+y devuelve las predicciones guardadas sin ejecutar la red.
+Incluye expulsión LRU, caducidad (TTL) y contadores de aciertos/fallos.
+"""
+
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+
+def dhash(frame, hash_size=8):
+    """
+    Calcula el difference hash (dHash) de un frame BGR.
+    Reduce primero el frame a (hash_size+1) x hash_size y solo entonces pasa a gris,
+    así el coste es despreciable frente a la inferencia.
+
+    Args:
+        frame (np.ndarray): Imagen BGR (o en escala de grises).
+        hash_size (int, optional): Lado del hash; produce hash_size² bits. Default=8.
+
+    Returns:
+        int: Hash de hash_size² bits.
+    """
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a, b):
+    """Número de bits distintos entre dos hashes."""
+    return bin(a ^ b).count("1")
+
+
+class PerceptualCache:
+    """
+    Caché LRU con TTL indexada por hash perceptual.
+    Un frame cuyo hash está a distancia de Hamming <= max_distance de una entrada
+    vigente se considera la misma escena y reutiliza su resultado.
+    """
+
+    def __init__(self, max_entries=64, ttl=5.0, max_distance=4, hash_size=8):
+        """
+        Args:
+            max_entries (int, optional): Entradas máximas antes de expulsar la menos usada. Default=64.
+            ttl (float, optional): Segundos de vigencia de cada entrada. Default=5.0.
+            max_distance (int, optional): Distancia de Hamming máxima para un acierto. Default=4.
+            hash_size (int, optional): Lado del dHash. Default=8.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._entries = OrderedDict()  # hash -> (timestamp, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, frame):
+        """Hash perceptual de un frame con la configuración de esta caché."""
+        return dhash(frame, self.hash_size)
+
+    def _purge_expired(self, now):
+        expired = [k for k, (ts, _) in self._entries.items() if now - ts > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        self.expirations += len(expired)
+
+    def get(self, key):
+        """
+        Busca un resultado para el hash dado.
+
+        Returns:
+            object | None: Resultado guardado o None si no hay acierto.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            match = key if key in self._entries else None
+            if match is None and self.max_distance > 0:
+                best = self.max_distance + 1
+                for k in self._entries:
+                    d = hamming(k, key)
+                    if d < best:
+                        best, match = d, k
+                if best > self.max_distance:
+                    match = None
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return self._entries[match][1]
+
+    def put(self, key, value):
+        """Guarda el resultado de un frame (o lo refresca) y expulsa el LRU si hace falta."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Vacía la caché (los contadores se conservan)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Aciertos, fallos, tasa de aciertos, entradas, expulsiones y caducadas.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def log_stats(self):
+        """Escribe en el log el resumen de uso (inferencias ahorradas)."""
+        s = self.stats()
+        logging.info(
+            f"Caché perceptual: {s['hits']} aciertos / {s['misses']} fallos "
+            f"({s['hit_rate']:.1%} inferencias ahorradas), {s['entries']} entradas, "
+            f"{s['evictions']} expulsadas, {s['expirations']} caducadas"
+        )
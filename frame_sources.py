@@ -0,0 +1,251 @@
+"""
+frame_sources.py
+
+Fuentes de frames offline con la misma interfaz que IPCamera (`camera.FrameSource`):
+video grabado, carpeta de imágenes y generador sintético. Permiten ejecutar el camino
+completo captura→clasificación→decisión sin cámara, en tiempo real o tan rápido como
+sea posible, para hacer benchmarks y reproducir problemas con grabaciones.
+
+`open_source(config)` construye la fuente a partir de un diccionario de configuración
+(ver `FRAME_SOURCE` en main_pc.py).
+"""
+
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from camera import CameraGroup, Frame, FrameSource, get_working_camera
+from shm_transport import SharedMemoryFrameSource
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class _PacedSource(FrameSource):
+    """
+    Base de las fuentes offline: numera los frames y, en modo `realtime`, los entrega
+    al ritmo de `fps` como lo haría una cámara en vivo.
+    """
+
+    def __init__(self, fps, realtime):
+        self.fps = fps
+        self.realtime = bool(realtime and fps)
+        self.finished = False
+        self._seq = 0
+        self._start = None
+        self._last_time = None
+
+    def _wait_for(self, index):
+        """En modo realtime duerme hasta el instante en que corresponde el frame `index`."""
+        if not self.realtime:
+            return
+        if self._start is None:
+            self._start = time.time()
+        delay = self._start + index / self.fps - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _deliver(self, image):
+        if image is None:
+            self.finished = True
+            return Frame(None, None, self._seq)
+        self._seq += 1
+        self._last_time = time.time()
+        return Frame(image, self._last_time, self._seq)
+
+    def frame_age(self):
+        return None if self._last_time is None else time.time() - self._last_time
+
+    def stats(self):
+        return {"frames": self._seq, "finished": self.finished}
+
+
+class VideoFileSource(_PacedSource):
+    """
+    Reproduce un video grabado. En modo `realtime` se comporta como una cámara en vivo:
+    entrega el frame que corresponde al reloj y descarta (sin decodificar) los que el
+    consumidor no alcanzó a pedir. Con `realtime=False` entrega todos los frames, uno por
+    llamada, tan rápido como se pidan.
+    """
+
+    def __init__(self, path, realtime=True, loop=False, fps=None):
+        """
+        Args:
+            path (str): Ruta del archivo de video.
+            realtime (bool, optional): Reproducir al ritmo del video. Default=True.
+            loop (bool, optional): Volver al inicio al terminar. Default=False.
+            fps (float, optional): Forzar fps (si el archivo no los declara). Default=None.
+
+        Raises:
+            RuntimeError: Si no se puede abrir el video.
+        """
+        self.url = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"No se puede abrir el video {path}")
+        fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(fps, realtime)
+        self._index = 0  # índice del próximo frame del archivo
+        self.skipped_frames = 0
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self._index = 0
+        self._start = None
+
+    def get_frame_info(self):
+        if self.cap is None or self.finished:
+            return Frame(None, None, self._seq)
+        if self.realtime:
+            if self._start is None:
+                self._start = time.time()
+            # Saltar hasta el frame que corresponde al reloj (o esperar al siguiente)
+            target = int((time.time() - self._start) * self.fps)
+            while self._index < target:
+                if not self.cap.grab():
+                    break
+                self._index += 1
+                self.skipped_frames += 1
+            self._wait_for(self._index)
+        ok, image = self.cap.read()
+        if not ok and self.loop and self._index > 0:
+            self._rewind()
+            ok, image = self.cap.read()
+        self._index += 1
+        return self._deliver(image if ok else None)
+
+    def stats(self):
+        return dict(super().stats(), skipped_frames=self.skipped_frames)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageDirSource(_PacedSource):
+    """Entrega en orden alfabético las imágenes de una carpeta (a `fps` o tan rápido como se pidan)."""
+
+    def __init__(self, directory, fps=None, loop=False):
+        """
+        Args:
+            directory (str): Carpeta con imágenes (.jpg, .jpeg, .png, .bmp).
+            fps (float, optional): Ritmo de entrega; None = sin espera. Default=None.
+            loop (bool, optional): Volver a la primera imagen al terminar. Default=False.
+
+        Raises:
+            ValueError: Si la carpeta no contiene imágenes.
+        """
+        self.url = directory
+        self.loop = loop
+        self.files = sorted(
+            os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not self.files:
+            raise ValueError(f"No hay imágenes en {directory}")
+        super().__init__(fps, realtime=fps is not None)
+        self._index = 0
+
+    def get_frame_info(self):
+        if self.finished:
+            return Frame(None, None, self._seq)
+        while True:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    return self._deliver(None)
+                self._index = 0
+                self._start = None
+            self._wait_for(self._index)
+            path = self.files[self._index]
+            self._index += 1
+            image = cv2.imread(path)
+            if image is not None:
+                return self._deliver(image)
+            logging.warning(f"No se pudo leer la imagen {path}; se omite")
+
+
+class SyntheticSource(_PacedSource):
+    """
+    Generador sintético: fondo fijo con ruido leve y un rectángulo que cruza la escena,
+    como un objeto sobre la cinta. Útil para medir el rendimiento sin ningún archivo.
+    """
+
+    def __init__(self, width=640, height=480, fps=None, frames=None, box_size=120, speed=8, seed=0):
+        """
+        Args:
+            width (int, optional): Ancho del frame. Default=640.
+            height (int, optional): Alto del frame. Default=480.
+            fps (float, optional): Ritmo de entrega; None = sin espera. Default=None.
+            frames (int, optional): Número de frames a generar; None = infinito. Default=None.
+            box_size (int, optional): Lado del rectángulo en píxeles. Default=120.
+            speed (int, optional): Desplazamiento del rectángulo por frame en píxeles. Default=8.
+            seed (int, optional): Semilla del ruido (frames reproducibles). Default=0.
+        """
+        self.url = f"synthetic://{width}x{height}"
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.box_size = box_size
+        self.speed = speed
+        super().__init__(fps, realtime=fps is not None)
+        rng = np.random.default_rng(seed)
+        self._background = np.full((height, width, 3), 90, dtype=np.uint8)
+        self._background += rng.integers(0, 8, size=self._background.shape, dtype=np.uint8)
+
+    def get_frame_info(self):
+        if self.finished:
+            return Frame(None, None, self._seq)
+        index = self._seq
+        if self.frames is not None and index >= self.frames:
+            return self._deliver(None)
+        self._wait_for(index)
+        image = self._background.copy()
+        span = self.width + self.box_size
+        x = (index * self.speed) % span - self.box_size
+        y = (self.height - self.box_size) // 2
+        x0, x1 = max(x, 0), min(x + self.box_size, self.width)
+        if x1 > x0:
+            image[y:y + self.box_size, x0:x1] = (40, 120, 200)
+        return self._deliver(image)
+
+
+def open_source(config):
+    """
+    Construye una fuente de frames a partir de un diccionario de configuración.
+
+    Args:
+        config (dict): Clave "type" y los argumentos de la fuente:
+            - {"type": "camera", "urls": [...], ...opciones de IPCamera}
+            - {"type": "camera_group", "urls": [...], ...opciones de CameraGroup}
+            - {"type": "video", "path": "grabacion.mp4", "realtime": False, "loop": False}
+            - {"type": "images", "directory": "frames", "fps": None, "loop": False}
+            - {"type": "synthetic", "width": 640, "height": 480, "fps": None, "frames": 1000}
+            - {"type": "shared_memory", "source": {...otra configuración}, "slots": 4}
+              (la fuente interna corre en un proceso de captura aparte, ver shm_transport.py)
+
+    Returns:
+        FrameSource: Fuente lista para usar.
+
+    Raises:
+        ValueError: Si el tipo de fuente es desconocido.
+    """
+    options = dict(config)
+    kind = options.pop("type", None)
+    if kind == "camera":
+        return get_working_camera(options.pop("urls"), **options)
+    if kind == "camera_group":
+        return CameraGroup(options.pop("urls"), **options)
+    if kind == "video":
+        return VideoFileSource(options.pop("path"), **options)
+    if kind == "images":
+        return ImageDirSource(options.pop("directory"), **options)
+    if kind == "synthetic":
+        return SyntheticSource(**options)
+    if kind == "shared_memory":
+        return SharedMemoryFrameSource(options.pop("source"), **options)
+    raise ValueError(f"Tipo de fuente de frames desconocido: {kind}")
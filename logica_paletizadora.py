@@ -14,8 +14,11 @@ Fecha: 2025-09-14
 import logging
 import time
 import cv2
-from camera import IPCamera
-from classifier import classify_image
+from camera import CameraGroup
+from frame_sources import open_source
+from classifier import TargetMatcher, classify_targets, load_model, warmup
+from motion_gate import MotionGate
+from pipeline import Pipeline, frame_source_reader
 from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
 from ev3dev2.sensor import INPUT_1
 from ev3dev2.sensor.lego import TouchSensor
@@ -41,40 +44,15 @@ CAMERA_URLS = [
     "http://192.168.1.28:8080/video"
 ]
 FRAME_DELAY = 0.5  # segundos entre frames
-
-def get_working_camera(urls):
-    """
-    Intenta conectar a una de las cámaras IP proporcionadas y retorna el primer objeto IPCamera funcional.
-
-    Args:
-        urls (list): Lista de URLs de cámaras IP.
-
-    Returns:
-        IPCamera: Objeto IPCamera conectado y funcional.
-
-    Raises:
-        RuntimeError: Si no se puede conectar a ninguna cámara IP.
-    """
-    for url in urls:
-        try:
-            cam = IPCamera(url)
-            # Intentar leer un frame con timeout manual (1 segundo)
-            start = time.time()
-            frame = None
-            while time.time() - start < 1.0:
-                frame = cam.get_frame()
-                if frame is not None:
-                    break
-                time.sleep(0.05)
-            if frame is not None:
-                logging.info(f"Cámara conectada exitosamente a {url}")
-                return cam
-            else:
-                logging.warning(f"No se pudo obtener frame de {url} en 1 segundo")
-                cam.release()
-        except Exception as e:
-            logging.warning(f"No se pudo conectar a {url}: {e}")
-    raise RuntimeError("No se pudo conectar a ninguna cámara IP.")
+MOTION_GATE = {"min_area": 0.01, "settle_time": 1.5}  # None para clasificar todos los frames
+# Respaldo en caliente: la segunda URL queda conectada y se usa si la principal deja de entregar frames
+CAMERA_GROUP = {"stall_timeout": 1.0, "standby_fps": 1.0, "max_backoff": 30.0}
+# Fuente offline en lugar de las cámaras (ver frame_sources.open_source), p. ej.
+# {"type": "video", "path": "grabacion.mp4", "realtime": False}. None = cámaras IP.
+FRAME_SOURCE = None
+# Colas del pipeline: clasificar el frame más reciente y no paletizar por detecciones viejas
+PIPELINE_CLASSIFY = {"workers": 1, "queue_size": 2, "policy": "drop_oldest"}
+PIPELINE_ACTUATE = {"workers": 1, "queue_size": 1, "policy": "drop_oldest", "max_age": 2.0}
 
 # Objetos que disparan la paletizadora
 OBJETIVOS = {"bottle", "banana"}
@@ -133,51 +111,73 @@ def main():
     - Captura frames y detecta objetos usando el clasificador.
     - Si se detecta un objetivo, ejecuta la rutina de paletizado.
     - Muestra la imagen en pantalla y permite salir con 'q'.
+    Captura, clasificación y paletizado corren como etapas de pipeline.Pipeline.
     """
+    # Cargar y calentar el modelo antes del primer frame real
+    load_model()
+    warmup()
+    # Clases ImageNet de los objetivos (etiqueta exacta) calculadas una sola vez
+    matcher = TargetMatcher(sorted(OBJETIVOS), threshold=0.6, exact=True, inclusive=False)
+    # Solo se clasifica cuando algo entra o cambia en la escena
+    gate = MotionGate(**MOTION_GATE) if MOTION_GATE else None
+
     camera = None
     while camera is None:
         try:
-            camera = get_working_camera(CAMERA_URLS)
+            if FRAME_SOURCE:
+                camera = open_source(FRAME_SOURCE)
+            else:
+                # La cámara principal y la de respaldo quedan conectadas; el failover ocurre en segundo plano
+                camera = CameraGroup(CAMERA_URLS, **CAMERA_GROUP)
         except Exception as e:
             logging.error(f"No se pudo inicializar la cámara: {e}. Reintentando en 2 segundos...")
             time.sleep(2)
 
+    url_activa = [camera.url]
+
+    def clasificar(frame):
+        if camera.url != url_activa[0]:
+            # Cambio de cámara: el fondo del detector de movimiento ya no sirve
+            url_activa[0] = camera.url
+            if gate is not None:
+                gate.reset()
+        if gate is not None and not gate.update(frame.image):
+            return None
+        return classify_targets(frame.image, matcher)
+
+    def actuar(deteccion):
+        _, confianza, etiqueta = deteccion
+        logging.info(f"¡Objeto detectado! Ejecutando rutina de paletizado para {etiqueta} (confianza={confianza:.2f})")
+        rutina_paletizadora()
+        return deteccion
+
+    # captura → clasificar → actuar; las fuentes offline en modo rápido no esperan entre frames
+    pipeline = (
+        Pipeline("paletizadora")
+        .source("captura", frame_source_reader(camera), interval=FRAME_DELAY if camera.realtime else 0.0)
+        .stage("clasificar", clasificar, **PIPELINE_CLASSIFY)
+        .stage("actuar", actuar, **PIPELINE_ACTUATE)
+    )
+    pipeline.start()
     try:
-        while True:
-            frame = camera.get_frame()
-            if frame is None:
-                logging.warning("No se pudo capturar imagen. Reintentando cámara...")
-                camera.release()
-                camera = None
-                # Reintentar obtener cámara
-                while camera is None:
-                    try:
-                        camera = get_working_camera(CAMERA_URLS)
-                    except Exception as e:
-                        logging.error(f"No se pudo reconectar la cámara: {e}. Reintentando en 2 segundos...")
-                        time.sleep(2)
-                continue
-
-            resultados = classify_image(frame, top=3)
-            logging.info(f"Detecciones: {resultados}")
-
-            for etiqueta, confianza in resultados:
-                if etiqueta in OBJETIVOS and confianza > 0.6:
-                    logging.info(f"¡Objeto detectado! Ejecutando rutina de paletizado para {etiqueta} (confianza={confianza:.2f})")
-                    rutina_paletizadora()
-                    break
-
-            cv2.imshow("Cámara IP", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+        shown = None
+        while not pipeline.finished.is_set():
+            frame = pipeline.latest("captura")
+            if frame is not None and frame is not shown:
+                shown = frame
+                cv2.imshow("Cámara IP", frame.image)
+            if cv2.waitKey(30) & 0xFF == ord('q'):
                 break
 
-            time.sleep(FRAME_DELAY)
-
     except KeyboardInterrupt:
         logging.info("Interrumpido por el usuario.")
     except Exception as e:
         logging.error(f"Error en el bucle principal: {e}")
     finally:
+        pipeline.stop()
+        pipeline.log_stats()
+        if gate is not None:
+            gate.log_stats()
         try:
             if camera:
                 camera.release()
@@ -5,7 +5,7 @@ main.py adaptado para EV3 con ev3dev2
 import time
 import logging
 from camera import IPCamera
-from classifier import classify_image
+from classifier import TargetMatcher, classify_targets, load_model, warmup
 from ev3_controller import connect_to_ev3, move_motor
 
 # Configuración de logging
@@ -17,6 +17,9 @@ CONFIDENCE_THRESHOLD = 0.5
 FRAME_DELAY = 0.5  # segundos
 
 def main():
+    load_model()
+    warmup()
+    matcher = TargetMatcher([TARGET_OBJECT], CONFIDENCE_THRESHOLD, exact=True, inclusive=False)
     camera = IPCamera(CAMERA_URL)
 
     try:
@@ -34,12 +37,10 @@ def main():
                 time.sleep(FRAME_DELAY)
                 continue
 
-            results = classify_image(frame)
-            label, confidence = results[0]
-            logging.info(f"Detectado: {label} ({confidence:.2f})")
-
-            if label == TARGET_OBJECT and confidence > CONFIDENCE_THRESHOLD:
-                logging.info("¡Objeto detectado! Activando motor...")
+            detection = classify_targets(frame, matcher)
+            if detection is not None:
+                _, confidence, label = detection
+                logging.info(f"¡Objeto detectado! {label} ({confidence:.2f}). Activando motor...")
                 move_motor(motor_b, speed=50, duration=2)
 
             time.sleep(FRAME_DELAY)
@@ -3,15 +3,25 @@
 """
 main_pc.py
 Script principal para la detección de objetos y control de la paletizadora desde PC.
-Captura imágenes de una cámara IP, clasifica objetos y envía comandos al EV3 vía SSH.
+Captura imágenes de una cámara IP, clasifica objetos y lanza la rutina en el EV3.
+La rutina corre en segundo plano (ActuationController) mientras la captura y la clasificación
+siguen; se envía a motor_server.py (motor_client.py) y solo si el servidor no responde se
+ejecuta el script por SSH (ev3_link.py).
 """
 
 import time
 import logging
 import cv2
-import subprocess
-from camera import IPCamera
-from classifier import classify_image
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from camera import get_working_camera
+from classifier import TargetMatcher, classify_targets, crop_roi, invalidate_result_cache, load_model, set_result_cache, warmup
+from ev3_link import close_links, get_link
+from frame_cache import PerceptualCache
+from frame_sources import open_source
+from motion_gate import MotionGate
+from motor_client import MotorServerPollError, MotorServerUnavailable, close_clients, get_client
+from pipeline import Pipeline, frame_source_reader
 
 # Configuración de logging global
 logging.basicConfig(
@@ -28,35 +38,57 @@ CAMERA_URLS = [
 # Tiempo de espera entre frames (segundos)
 FRAME_DELAY = 0.5
 
-def get_working_camera(urls):
-    """
-    Intenta conectar con una lista de URLs de cámara IP y retorna la primera que funcione.
-    """
-    for url in urls:
-        try:
-            cam = IPCamera(url)
-            # Intentar leer un frame con timeout manual (1 segundo)
-            start = time.time()
-            frame = None
-            while time.time() - start < 1.0:
-                frame = cam.get_frame()
-                if frame is not None:
-                    break
-                time.sleep(0.05)
-            if frame is not None:
-                logging.info(f"Cámara conectada exitosamente a {url}")
-                return cam
-            else:
-                logging.warning(f"No se pudo obtener frame de {url} en 1 segundo")
-                cam.release()
-        except Exception as e:
-            logging.warning(f"No se pudo conectar a {url}: {e}")
-    raise RuntimeError("No se pudo conectar a ninguna cámara IP.")
+# Leer la cámara en un hilo dedicado y clasificar siempre el último frame (evita
+# clasificar frames viejos acumulados en el buffer de OpenCV)
+CAMERA_THREADED = True
+# Decodificar solo los frames que se van a clasificar (grab/retrieve). Con
+# CAMERA_TARGET_FPS = None el ritmo de decodificación sigue al del bucle principal.
+CAMERA_SKIP_DECODE = True
+CAMERA_TARGET_FPS = None
+# Lector del stream: "opencv" (cv2.VideoCapture) o "mjpeg" (lector nativo, permite
+# decodificar directamente a 1/2, 1/4 o 1/8 de resolución: el clasificador solo usa
+# 224x224). Con CAMERA_DECODE_SCALE > 1 las ROIs van en coordenadas del frame reducido.
+CAMERA_BACKEND = "opencv"
+CAMERA_DECODE_SCALE = 1
+
+# Fuente de frames alternativa a las cámaras IP (ver frame_sources.open_source), p. ej.
+#   {"type": "video", "path": "grabacion.mp4", "realtime": False}
+#   {"type": "images", "directory": "frames_muestra"}
+#   {"type": "synthetic", "frames": 1000}
+#   {"type": "shared_memory", "source": {"type": "camera", "urls": CAMERA_URLS}}  (captura en otro proceso)
+# Las fuentes con realtime=False se procesan sin FRAME_DELAY (tan rápido como sea posible).
+# None = cámaras IP de CAMERA_URLS.
+FRAME_SOURCE = None
+
+# Región de interés por cámara (x, y, ancho, alto) en píxeles: la parte del encuadre
+# que ocupa la cinta. Las cámaras sin entrada se clasifican con el frame completo.
+CAMERA_ROIS = {
+    # "http://192.168.1.28:8080/video": (320, 120, 640, 480),
+}
+
+# Modo multi-recorte dentro de la ROI: (columnas, filas) y solapamiento. (1, 1) = un
+# solo recorte; más recortes mejoran objetos pequeños (botellas) a cambio de latencia.
+CROP_TILES = (1, 1)
+CROP_OVERLAP = 0.2
+
+# Colas entre etapas del pipeline (ver pipeline.Pipeline.stage). Clasificar siempre el frame
+# más reciente (drop_oldest) y no actuar sobre detecciones de hace más de max_age segundos.
+PIPELINE_CLASSIFY = {"workers": 1, "queue_size": 2, "policy": "drop_oldest"}
+PIPELINE_ACTUATE = {"workers": 1, "queue_size": 1, "policy": "drop_oldest", "max_age": 2.0}
+
+# Actuación en segundo plano (ver ActuationController): enfriamiento tras una rutina correcta
+# o fallida (evita disparos dobles) y antigüedad máxima de la detección que se ejecuta al terminar.
+ACTUATION = {"cooldown_ok": 10.0, "cooldown_error": 2.0, "max_age": 2.0}
 
 # Datos de conexión al EV3
 EV3_USER = "robot"                 # usuario por defecto de ev3dev
 EV3_HOST = "ev3dev.local"          # o IP del EV3, ej. "192.168.137.3"
 EV3_SCRIPT = ("/home/robot/rutina_botella.py", "/home/robot/rutina_caja.py")  # ruta absoluta al script en el EV3, para las dos opciones
+# Canal SSH persistente (ver ev3_link.py): "auto", "paramiko", "openssh", "subprocess" o "fake"
+EV3_TRANSPORT = "auto"
+# Camino principal de actuación: motor_server.py residente en el EV3 (ver motor_client.py).
+# SSH queda como respaldo si el servidor no responde. None para usar solo SSH.
+MOTOR_SERVER = {"port": 9999, "timeout": 5.0, "retries": 2}
 
 # Diccionario de objetos objetivo y su configuración (velocidad base, altura)
 OBJETIVOS_MAP = {
@@ -71,20 +103,23 @@ OBJETIVOS_MAP = {
 # Umbral de confianza mínima para considerar una detección válida
 CONF_THRESHOLD = 0.5
 
+# Caché de resultados para frames casi idénticos (cinta parada): None para desactivarla
+RESULT_CACHE = {"max_entries": 64, "ttl": 5.0, "max_distance": 4}
+
+# Puerta de movimiento antes del clasificador (área mínima como fracción del frame): None para desactivarla
+MOTION_GATE = {"min_area": 0.01, "settle_time": 1.5}
+
 def send_palletize(velocidad, altura):
     """
     Ejecuta el script de motores en el EV3 vía SSH con los parámetros dados.
+    Usa la rutina por defecto (botella), la primera de EV3_SCRIPT.
     """
     try:
         # Backwards-compatible wrapper that calls a specific remote script
-        cmd = [
-            "ssh",
-            "-o", "StrictHostKeyChecking=no",
-            f"{EV3_USER}@{EV3_HOST}",
-            f"{EV3_SCRIPT} {velocidad} {altura}"
-        ]
-        logging.info(f"Ejecutando en EV3: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        link = get_link(EV3_HOST, EV3_USER, EV3_TRANSPORT)
+        command = f"{EV3_SCRIPT[0]} {velocidad} {altura}"
+        logging.info(f"Ejecutando en EV3 ({link}): {command}")
+        result = link.run(command, timeout=120)
         logging.info(f"Salida EV3:\n{result.stdout}")
         if result.returncode == 0:
             return "OK"
@@ -96,22 +131,41 @@ def send_palletize(velocidad, altura):
         return None
 
 
-def send_routine(script_name: str, velocidad, altura):
+def send_routine(script_name: str, velocidad, altura, host=None):
     """
-    Ejecuta un script específico en el EV3 vía SSH. `script_name` es el
-    nombre del archivo en /home/robot/ (por ejemplo 'rutina_botella.py' o
-    'rutina_caja.py'). Retorna 'OK' si returncode == 0.
+    Ejecuta la rutina de `script_name` en el EV3. Primero por motor_server (motores ya
+    inicializados, sin arrancar Python en el brick); si el servidor no está disponible,
+    ejecuta el script vía SSH. `script_name` es el nombre del archivo en /home/robot/
+    (por ejemplo 'rutina_botella.py' o 'rutina_caja.py'). `host` permite elegir otro EV3
+    (por defecto EV3_HOST).
+    Retorna 'OK' si la rutina terminó correctamente.
     """
+    if MOTOR_SERVER is not None:
+        try:
+            client = get_client(host or EV3_HOST, **MOTOR_SERVER)
+            resp = client.run_script(script_name, velocidad, altura)
+            if resp != "OK":
+                logging.error(f"motor_server respondió {resp}")
+                return None
+            return "OK"
+        except MotorServerPollError as e:
+            # La rutina ya estaba encolada y puede seguir moviendo los motores: no repetirla por SSH
+            logging.error(f"{e}; la rutina no se repite por SSH")
+            return None
+        except MotorServerUnavailable as e:
+            # PALLETIZE no llegó a entregarse: es seguro ejecutar el script por SSH
+            logging.warning(f"{e}; usando SSH como respaldo")
+        except Exception as e:
+            # La rutina pudo haberse lanzado: no repetirla por SSH
+            logging.error(f"Error al ejecutar rutina en motor_server: {e}")
+            return None
     try:
         remote = f"/home/robot/{script_name}"
-        cmd = [
-            "ssh",
-            "-o", "StrictHostKeyChecking=no",
-            f"{EV3_USER}@{EV3_HOST}",
-            f"{remote} {velocidad} {altura}"
-        ]
-        logging.info(f"Ejecutando en EV3: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        # Sesión SSH persistente (ev3_link): sin conexión ni autenticación por comando
+        link = get_link(host or EV3_HOST, EV3_USER, EV3_TRANSPORT)
+        command = f"{remote} {velocidad} {altura}"
+        logging.info(f"Ejecutando en EV3 ({link}): {command}")
+        result = link.run(command, timeout=120)
         logging.info(f"Salida EV3:\n{result.stdout}")
         if result.returncode == 0:
             return "OK"
@@ -122,58 +176,219 @@ def send_routine(script_name: str, velocidad, altura):
         logging.error(f"Error al ejecutar rutina en EV3: {e}")
         return None
 
+class ActuationController:
+    """
+    Máquina de estados de la actuación: LIBRE → EJECUTANDO → ENFRIANDO → LIBRE.
+
+    La rutina del EV3 se ejecuta como tarea en segundo plano (executor de un hilo), así la
+    captura y la clasificación siguen corriendo mientras el EV3 trabaja. Durante la rutina
+    y el enfriamiento posterior (que reemplaza al antiguo `time.sleep(10.0)`) las detecciones
+    no disparan otra rutina, pero se guarda la más reciente: al terminar el enfriamiento, si
+    aún es fresca (`max_age`), se ejecuta de inmediato sin esperar al siguiente frame.
+    """
+
+    LIBRE = "libre"
+    EJECUTANDO = "ejecutando"
+    ENFRIANDO = "enfriando"
+
+    def __init__(self, action, cooldown_ok=10.0, cooldown_error=2.0, max_age=2.0):
+        """
+        Args:
+            action (callable): fn(deteccion) -> "OK" o None; se ejecuta en segundo plano.
+            cooldown_ok (float, optional): Segundos de enfriamiento tras una rutina correcta. Default=10.0.
+            cooldown_error (float, optional): Segundos de enfriamiento tras un fallo. Default=2.0.
+            max_age (float, optional): Antigüedad máxima de una detección pendiente. Default=2.0.
+        """
+        self.action = action
+        self.cooldown_ok = cooldown_ok
+        self.cooldown_error = cooldown_error
+        self.max_age = max_age
+        self.state = self.LIBRE
+        self.routines = 0
+        self.failures = 0
+        self.suppressed = 0
+        self._pending = None  # (deteccion, timestamp) más reciente recibida fuera de LIBRE
+        self._future = None
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ev3-rutina")
+
+    def offer(self, deteccion, timestamp=None):
+        """
+        Entrega una detección. Nunca bloquea: la ejecuta si el EV3 está libre o la guarda como pendiente.
+
+        Returns:
+            bool: True si se lanzó una rutina.
+        """
+        timestamp = timestamp or time.time()
+        with self._lock:
+            if self._closed:
+                return False
+            if self.state != self.LIBRE:
+                self._pending = (deteccion, timestamp)
+                self.suppressed += 1
+                return False
+            self._start(deteccion)
+            return True
+
+    def _start(self, deteccion):
+        """Lanza la rutina (llamar con el lock tomado)."""
+        self.state = self.EJECUTANDO
+        self._pending = None
+        self.routines += 1
+        self._future = self._executor.submit(self.action, deteccion)
+        self._future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        try:
+            ok = future.result() == "OK"
+        except Exception as e:
+            logging.error(f"Error en la rutina del EV3: {e}")
+            ok = False
+        with self._lock:
+            if not ok:
+                self.failures += 1
+            if self._closed:
+                self.state = self.LIBRE
+                return
+            self.state = self.ENFRIANDO
+            cooldown = self.cooldown_ok if ok else self.cooldown_error
+            self._timer = threading.Timer(cooldown, self._on_cooldown_end)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_cooldown_end(self):
+        with self._lock:
+            self.state = self.LIBRE
+            pending, self._pending = self._pending, None
+            if self._closed or pending is None:
+                return
+            deteccion, timestamp = pending
+            if time.time() - timestamp <= self.max_age:
+                # El pipeline siguió clasificando: la siguiente pieza ya está detectada
+                logging.info("EV3 libre: ejecutando la detección pendiente")
+                self._start(deteccion)
+
+    def busy(self):
+        with self._lock:
+            return self.state != self.LIBRE
+
+    def stats(self):
+        """
+        Returns:
+            dict: Estado actual, rutinas lanzadas, fallidas y detecciones suprimidas por estar ocupado.
+        """
+        with self._lock:
+            return {"state": self.state, "routines": self.routines, "failures": self.failures,
+                    "suppressed": self.suppressed}
+
+    def shutdown(self):
+        """No acepta más detecciones; una rutina en curso se deja terminar (movimiento físico)."""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+            running = self._future is not None and not self._future.done()
+        if running:
+            logging.info("Esperando a que termine la rutina en curso del EV3...")
+        self._executor.shutdown(wait=True)
+
+
 def main():
     """
     Función principal: captura frames, clasifica objetos y envía comandos al EV3 si corresponde.
+    Corre sobre pipeline.Pipeline: captura → clasificar → actuar, con colas acotadas; la rutina
+    del EV3 se ejecuta en segundo plano (ActuationController) sin detener la captura.
     """
-    camera = get_working_camera(CAMERA_URLS)
-    try:
-        while True:
-            frame = camera.get_frame()
-            if frame is None:
-                logging.warning("No se pudo capturar imagen.")
-                time.sleep(FRAME_DELAY)
-                continue
-
-            # Clasificar el frame (top=3)
-            resultados = classify_image(frame, top=3)
-            logging.info(f"Detecciones: {resultados}")
-
-            # Revisar si hay un objetivo con confianza suficiente
-            objetivo_detectado = False
-            for etiqueta, confianza in resultados:
-                etiqueta_l = etiqueta.lower()
-                for objetivo, (vel, altura) in OBJETIVOS_MAP.items():
-                    if objetivo in etiqueta_l and confianza >= CONF_THRESHOLD:
-                        logging.info("Detectado %s (%.2f). Ejecutando rutina en EV3...", etiqueta, confianza)
-                        # Si es un cartón, usar la rutina específica de caja
-                        if objetivo == "carton":
-                            resp = send_routine("rutina_caja.py", vel, altura)
-                        else:
-                            resp = send_routine("rutina_botella.py", vel, altura)
-                        if resp == "OK":
-                            logging.info("Rutina ejecutada correctamente en EV3.")
-                            time.sleep(10.0)  # evitar disparos múltiples seguidos
-                        else:
-                            logging.error("Falló la ejecución en EV3.")
-                        objetivo_detectado = True
-                        break
-                if objetivo_detectado:
-                    break
-
-            # Mostrar la cámara en ventana
-            cv2.imshow("Cámara IP", frame)
+    # Cargar y calentar el modelo antes del primer frame real
+    load_model()
+    warmup()
+    # Mapa clase ImageNet -> objetivo calculado una sola vez
+    matcher = TargetMatcher(OBJETIVOS_MAP, CONF_THRESHOLD)
+    cache = PerceptualCache(**RESULT_CACHE) if RESULT_CACHE else None
+    set_result_cache(cache)
+    gate = MotionGate(**MOTION_GATE) if MOTION_GATE else None
+    if FRAME_SOURCE:
+        camera = open_source(FRAME_SOURCE)
+    else:
+        camera = get_working_camera(CAMERA_URLS, threaded=CAMERA_THREADED, skip_decode=CAMERA_SKIP_DECODE,
+                                    target_fps=CAMERA_TARGET_FPS, backend=CAMERA_BACKEND,
+                                    decode_scale=CAMERA_DECODE_SCALE)
+    roi = CAMERA_ROIS.get(camera.url)
+
+    def clasificar(frame):
+        # Clasificar el frame (solo si algo cambió en la escena) y revisar si hay
+        # un objetivo con confianza suficiente
+        if gate is not None:
+            if not gate.update(crop_roi(frame.image, roi)):
+                return None
+            if gate.changed:
+                # Escena nueva: no reutilizar resultados de antes del cambio (cinta vacía)
+                invalidate_result_cache()
+        deteccion = classify_targets(frame.image, matcher, roi=roi, tiles=CROP_TILES, overlap=CROP_OVERLAP)
+        return (frame, deteccion) if deteccion is not None else None
+
+    def ejecutar_rutina(deteccion):
+        # Corre en el executor del ActuationController, fuera del pipeline
+        objetivo, confianza, etiqueta = deteccion
+        vel, altura = OBJETIVOS_MAP[objetivo]
+        logging.info("Detectado %s (%.2f). Ejecutando rutina en EV3...", etiqueta, confianza)
+        # Si es un cartón, usar la rutina específica de caja
+        if objetivo == "carton":
+            resp = send_routine("rutina_caja.py", vel, altura)
+        else:
+            resp = send_routine("rutina_botella.py", vel, altura)
+        if resp == "OK":
+            logging.info("Rutina ejecutada correctamente en EV3.")
+        else:
+            logging.error("Falló la ejecución en EV3.")
+        return resp
+
+    actuador = ActuationController(ejecutar_rutina, **ACTUATION)
+
+    def actuar(resultado):
+        # No bloquea: lanza la rutina en segundo plano o la deja pendiente si el EV3 está ocupado
+        frame, deteccion = resultado
+        logging.debug(f"Edad del frame clasificado: {time.time() - frame.timestamp:.3f}s")
+        actuador.offer(deteccion, frame.timestamp)
+        return resultado
 
+    # Fuentes offline en modo rápido: sin espera entre frames
+    pipeline = (
+        Pipeline("main_pc")
+        .source("captura", frame_source_reader(camera), interval=FRAME_DELAY if camera.realtime else 0.0)
+        .stage("clasificar", clasificar, **PIPELINE_CLASSIFY)
+        .stage("actuar", actuar, **PIPELINE_ACTUATE)
+    )
+    pipeline.start()
+    try:
+        # Mostrar la cámara en ventana (HighGUI en el hilo principal)
+        shown = None
+        while not pipeline.finished.is_set():
+            frame = pipeline.latest("captura")
+            if frame is not None and frame is not shown:
+                shown = frame
+                cv2.imshow("Cámara IP", frame.image)
             # Salir con la tecla 'q'
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if cv2.waitKey(30) & 0xFF == ord('q'):
                 break
-
-            time.sleep(FRAME_DELAY)
     except KeyboardInterrupt:
         logging.info("Ejecución interrumpida por el usuario.")
     finally:
+        pipeline.stop()
+        pipeline.log_stats()
+        actuador.shutdown()
+        logging.info(f"Actuación: {actuador.stats()}")
+        close_clients()
+        close_links()
+        logging.info(f"Cámara: {camera.stats()}")
         camera.release()
         cv2.destroyAllWindows()
+        if cache is not None:
+            cache.log_stats()
+        if gate is not None:
+            gate.log_stats()
 
 if __name__ == "__main__":
     main()
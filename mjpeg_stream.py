@@ -0,0 +1,284 @@
+r"""
+mjpeg_stream.py
+
+Lector nativo de streams MJPEG (multipart/x-mixed-replace, p. ej. `http://…:8080/video`
+de IP Webcam) sobre una conexión HTTP persistente.
+A diferencia de `cv2.VideoCapture`, puede decodificar cada JPEG directamente a 1/2, 1/4
+o 1/8 de resolución (`cv2.IMREAD_REDUCED_COLOR_*`) cuando solo se necesita una entrada
+de 224x224, y no decodifica en absoluto los frames que se descartan.
+Expone la misma API que `cv2.VideoCapture` (isOpened, grab, retrieve, read, set, release)
+para poder usarse como fuente de `IPCamera`.
+
+Para pruebas sin cámara incluye un servidor local que emite como MJPEG los JPEG de una carpeta:
+    python mjpeg_stream.py serve .\frames_muestra --port 8080 --fps 30
+    python mjpeg_stream.py read http://127.0.0.1:8080/video --scale 4
+"""
+
+
+import argparse
+import http.client
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+
+# Bandera de imdecode según la reducción pedida
+SCALE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class MJPEGStream:
+    """
+    Cliente MJPEG con API compatible con `cv2.VideoCapture`.
+    `grab()` solo lee los bytes del siguiente JPEG; `retrieve()` lo decodifica a la escala
+    configurada. Así los frames descartados nunca se decodifican.
+    """
+
+    def __init__(self, url, scale=1, timeout=5.0):
+        """
+        Abre la conexión HTTP y localiza el boundary del stream.
+
+        Args:
+            url (str): URL del stream MJPEG.
+            scale (int, optional): Reducción al decodificar: 1, 2, 4 u 8. Default=1.
+            timeout (float, optional): Timeout de conexión y lectura en segundos. Default=5.0.
+        """
+        if scale not in SCALE_FLAGS:
+            raise ValueError(f"Escala de decodificación inválida: {scale} (use 1, 2, 4 u 8)")
+        self.url = url
+        self.scale = scale
+        self.timeout = timeout
+        self._flag = SCALE_FLAGS[scale]
+        self._conn = None
+        self._resp = None
+        self._boundary = None
+        self._pending = None
+        self._boundary_consumed = False
+        try:
+            self._open()
+        except Exception as e:
+            logging.error(f"No se pudo abrir el stream MJPEG {url}: {e}")
+            self.release()
+
+    def _open(self):
+        parts = urlsplit(self.url)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._conn = conn_cls(parts.hostname, parts.port, timeout=self.timeout)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        self._conn.request("GET", path, headers={"Connection": "keep-alive"})
+        self._resp = self._conn.getresponse()
+        if self._resp.status != 200:
+            raise RuntimeError(f"HTTP {self._resp.status} {self._resp.reason}")
+        content_type = self._resp.getheader("Content-Type", "")
+        if "multipart" not in content_type.lower():
+            raise RuntimeError(f"El stream no es multipart (Content-Type: {content_type})")
+        boundary = None
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "boundary":
+                boundary = value.strip().strip('"')
+        if not boundary:
+            raise RuntimeError("El stream MJPEG no declara boundary")
+        if not boundary.startswith("--"):
+            boundary = "--" + boundary
+        self._boundary = boundary.encode("latin-1")
+
+    def isOpened(self):
+        return self._resp is not None
+
+    def set(self, prop_id, value):
+        """Compatibilidad con cv2.VideoCapture.set: no hay buffer interno que configurar."""
+        return False
+
+    def _read_part(self):
+        """
+        Lee la siguiente parte del multipart y retorna los bytes del JPEG.
+        Usa Content-Length si está presente; si no, lee hasta el siguiente boundary.
+        """
+        resp = self._resp
+        # Saltar hasta la línea del boundary (salvo que la parte anterior ya la consumiera)
+        while not self._boundary_consumed:
+            line = resp.readline()
+            if not line:
+                raise EOFError("Fin del stream MJPEG")
+            if line.strip().startswith(self._boundary):
+                break
+        self._boundary_consumed = False
+        # Cabeceras de la parte
+        length = None
+        while True:
+            line = resp.readline()
+            if not line:
+                raise EOFError("Fin del stream MJPEG")
+            line = line.strip()
+            if not line:
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            if key.strip().lower() == "content-length":
+                length = int(value.strip())
+        if length is not None:
+            data = resp.read(length)
+            if len(data) < length:
+                raise EOFError("JPEG incompleto en el stream MJPEG")
+            return data
+        # Sin Content-Length: acumular hasta el siguiente boundary
+        chunks = []
+        while True:
+            line = resp.readline()
+            if not line:
+                raise EOFError("Fin del stream MJPEG")
+            if line.strip().startswith(self._boundary):
+                self._boundary_consumed = True
+                break
+            chunks.append(line)
+        return b"".join(chunks).rstrip(b"\r\n")
+
+    def grab(self):
+        """Lee (sin decodificar) el siguiente JPEG del stream."""
+        if not self.isOpened():
+            return False
+        try:
+            self._pending = self._read_part()
+            return True
+        except Exception as e:
+            logging.warning(f"Error leyendo el stream MJPEG {self.url}: {e}")
+            self.release()
+            return False
+
+    def retrieve(self):
+        """Decodifica el último JPEG leído con grab() a la escala configurada."""
+        if self._pending is None:
+            return False, None
+        frame = cv2.imdecode(np.frombuffer(self._pending, dtype=np.uint8), self._flag)
+        self._pending = None
+        return frame is not None, frame
+
+    def read(self):
+        """Equivalente a grab() + retrieve()."""
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        try:
+            if self._resp is not None:
+                self._resp.close()
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        finally:
+            self._resp = None
+            self._conn = None
+            self._pending = None
+
+
+def serve_jpeg_directory(directory, host="127.0.0.1", port=8080, fps=30.0, boundary="frame"):
+    """
+    Servidor MJPEG de pruebas: emite en bucle los JPEG de una carpeta en `/video`.
+
+    Args:
+        directory (str): Carpeta con archivos .jpg/.jpeg.
+        host (str, optional): Dirección de escucha. Default="127.0.0.1".
+        port (int, optional): Puerto. Default=8080.
+        fps (float, optional): Frames por segundo emitidos. Default=30.0.
+        boundary (str, optional): Boundary del multipart. Default="frame".
+
+    Returns:
+        ThreadingHTTPServer: Servidor (llamar a serve_forever() o shutdown()).
+    """
+    files = sorted(f for f in os.listdir(directory) if f.lower().endswith((".jpg", ".jpeg")))
+    if not files:
+        raise ValueError(f"No hay JPEG en {directory}")
+    frames = []
+    for name in files:
+        with open(os.path.join(directory, name), "rb") as f:
+            frames.append(f.read())
+    period = 1.0 / fps if fps else 0.0
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/video":
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={boundary}")
+            self.end_headers()
+            try:
+                i = 0
+                while True:
+                    data = frames[i % len(frames)]
+                    self.wfile.write(f"--{boundary}\r\nContent-Type: image/jpeg\r\n"
+                                     f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1"))
+                    self.wfile.write(data)
+                    self.wfile.write(b"\r\n")
+                    i += 1
+                    if period:
+                        time.sleep(period)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            logging.debug("MJPEG server: " + format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Lector y servidor MJPEG de pruebas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="emitir una carpeta de JPEG como MJPEG en /video")
+    p_serve.add_argument("directory")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8080)
+    p_serve.add_argument("--fps", type=float, default=30.0)
+    p_read = sub.add_parser("read", help="medir fps de lectura y decodificación de un stream")
+    p_read.add_argument("url")
+    p_read.add_argument("--scale", type=int, default=1, choices=sorted(SCALE_FLAGS))
+    p_read.add_argument("--frames", type=int, default=300)
+    p_read.add_argument("--decode-every", type=int, default=1, help="decodificar 1 de cada N frames")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = serve_jpeg_directory(args.directory, args.host, args.port, args.fps)
+        logging.info(f"Sirviendo {args.directory} en http://{args.host}:{args.port}/video")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        stream = MJPEGStream(args.url, scale=args.scale)
+        if not stream.isOpened():
+            raise SystemExit(2)
+        start = time.perf_counter()
+        decoded, shape = 0, None
+        for i in range(args.frames):
+            if not stream.grab():
+                break
+            if i % args.decode_every == 0:
+                ok, frame = stream.retrieve()
+                decoded += int(ok)
+                shape = frame.shape if ok else shape
+        elapsed = time.perf_counter() - start
+        stream.release()
+        logging.info(f"{args.frames} frames en {elapsed:.2f}s ({args.frames / elapsed:.1f} fps), "
+                     f"{decoded} decodificados a {shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+motion_gate.py
+
+Etapa previa al clasificador que solo deja pasar frames cuando algo entra o cambia
+en la escena. Usa sustracción de fondo por media móvil (cv2.accumulateWeighted)
+sobre una copia pequeña en escala de grises de cada frame, de modo que con la
+cinta vacía el coste por frame es mínimo y la red no se ejecuta.
+"""
+
+
+import logging
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Puerta de movimiento/cambio para decidir si un frame debe clasificarse.
+
+    El primer frame con movimiento pasa inmediatamente (el tiempo de reacción ante
+    una caja nueva no cambia) y se siguen dejando pasar frames durante `settle_time`
+    segundos tras el último movimiento, para clasificar el objeto ya quieto antes de
+    que el fondo lo absorba.
+
+    Tras cada `update`, `changed` indica si ese frame mostró un cambio real en la escena
+    (no solo el margen de asentamiento): quien combine la puerta con la caché de
+    resultados debe invalidarla entonces, para que un resultado anterior al cambio (p. ej.
+    la cinta vacía) no se reutilice para el objeto nuevo.
+    """
+
+    def __init__(self, min_area=0.01, settle_time=1.5, alpha=0.05, diff_threshold=25,
+                 width=160, blur=5, idle_refresh=None):
+        """
+        Args:
+            min_area (float, optional): Fracción del frame (0-1) que debe cambiar para considerar movimiento. Default=0.01.
+            settle_time (float, optional): Segundos que se sigue clasificando tras el último movimiento. Default=1.5.
+            alpha (float, optional): Tasa de aprendizaje de la media móvil del fondo. Default=0.05.
+            diff_threshold (int, optional): Diferencia de gris (0-255) para marcar un píxel como cambiado. Default=25.
+            width (int, optional): Ancho de la copia reducida usada para la detección. Default=160.
+            blur (int, optional): Tamaño (impar) del desenfoque gaussiano contra el ruido; 0 lo desactiva. Default=5.
+            idle_refresh (float, optional): Si se indica, deja pasar un frame cada N segundos aunque no haya movimiento.
+        """
+        if not 0.0 <= min_area <= 1.0:
+            raise ValueError("min_area debe ser una fracción entre 0 y 1")
+        self.min_area = min_area
+        self.settle_time = settle_time
+        self.alpha = alpha
+        self.diff_threshold = diff_threshold
+        self.width = width
+        self.blur = blur
+        self.idle_refresh = idle_refresh
+        self._background = None
+        self._last_motion = None
+        self._last_passed = None
+        self.last_changed_fraction = 0.0
+        self.changed = False
+        self.frames = 0
+        self.passed = 0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(round(h * self.width / float(w))))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.blur:
+            small = cv2.GaussianBlur(small, (self.blur, self.blur), 0)
+        return small
+
+    def reset(self):
+        """Olvida el fondo aprendido (p. ej. tras cambiar de cámara)."""
+        self._background = None
+        self._last_motion = None
+
+    def update(self, frame, now=None):
+        """
+        Actualiza el modelo de fondo con un frame y decide si debe clasificarse.
+
+        Args:
+            frame (np.ndarray): Frame BGR.
+            now (float, optional): Marca de tiempo (time.monotonic) del frame.
+
+        Returns:
+            bool: True si el frame debe pasar al clasificador.
+        """
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        self.changed = False
+        gray = self._small_gray(frame)
+
+        if self._background is None or self._background.shape != gray.shape:
+            # Sin fondo de referencia: clasificar y empezar a aprender
+            self._background = gray.astype(np.float32)
+            self._last_motion = now
+            self.changed = True
+            return self._pass(now)
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        changed = cv2.countNonZero(cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY)[1])
+        self.last_changed_fraction = changed / float(diff.size)
+        cv2.accumulateWeighted(gray, self._background, self.alpha)
+
+        if self.last_changed_fraction >= self.min_area:
+            self._last_motion = now
+            self.changed = True
+            return self._pass(now)
+        if self._last_motion is not None and now - self._last_motion <= self.settle_time:
+            return self._pass(now)
+        if self.idle_refresh is not None and (self._last_passed is None or now - self._last_passed >= self.idle_refresh):
+            return self._pass(now)
+        return False
+
+    def _pass(self, now):
+        self._last_passed = now
+        self.passed += 1
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frames vistos, frames que pasaron al clasificador y fracción omitida.
+        """
+        skipped = self.frames - self.passed
+        return {
+            "frames": self.frames,
+            "passed": self.passed,
+            "skipped": skipped,
+            "skip_rate": skipped / self.frames if self.frames else 0.0,
+        }
+
+    def log_stats(self):
+        """Escribe en el log cuántos frames se ahorraron al clasificador."""
+        s = self.stats()
+        logging.info(
+            f"Puerta de movimiento: {s['passed']}/{s['frames']} frames clasificados "
+            f"({s['skip_rate']:.1%} omitidos)"
+        )
@@ -0,0 +1,509 @@
+r"""
+motor_client.py
+
+Cliente TCP de `motor_server.py` con pool de conexiones, timeouts y reintentos.
+
+`motor_server.py` corre residente en el EV3 con los motores ya inicializados. Enviarle
+`PALLETIZE` evita lanzar `rutina_*.py` por SSH, donde cada ítem paga el arranque de Python y
+la importación de ev3dev2 en la CPU ARM del brick (varios segundos antes de mover un motor).
+`main_pc.py` y `app_gui.py` usan este cliente como camino principal y dejan SSH (ev3_link.py)
+como respaldo cuando el servidor no responde.
+
+Cada comando viaja con un id (`#<n> STATUS`) que motor_server repite en la respuesta, así una
+respuesta atrasada nunca se confunde con la de otra petición sobre la misma conexión.
+
+Reintentos: solo se repite un comando si no llegó a enviarse (fallo al conectar) o si es
+idempotente (`STATUS`, `STOP`). Un `PALLETIZE` cuya respuesta se pierde no se reenvía, para no
+ejecutar la rutina dos veces. `MotorServerUnavailable` solo sale de comandos que no llegaron a
+entregarse, así que es seguro pasar a SSH; una vez encolada la rutina, cualquier fallo al seguirla
+es `MotorServerPollError` (la rutina puede seguir en curso) y nunca debe repetirse por SSH.
+
+Uso:
+    python .\motor_client.py status --host 192.168.137.3
+    python .\motor_client.py palletize 25 0.6
+    python .\motor_client.py queue
+    python .\motor_client.py job 3
+    python .\motor_client.py stop
+    python .\motor_client.py latency --runs 20 --ssh-runs 5
+"""
+
+
+import argparse
+import collections
+import itertools
+import logging
+import select
+import socket
+import threading
+import time
+
+
+# Servidor por defecto (motor_server.py escucha en 0.0.0.0:9999)
+EV3_HOST = "ev3dev.local"
+MOTOR_PORT = 9999
+CONNECT_TIMEOUT = 3.0
+RESPONSE_TIMEOUT = 5.0
+# Conexiones abiertas como máximo hacia un mismo servidor
+POOL_SIZE = 2
+RETRIES = 2
+RETRY_BACKOFF = 0.2
+# Espera de la rutina: intervalo de consulta del trabajo (JOB) y espera máxima (cola + rutina)
+POLL_INTERVAL = 0.5
+ROUTINE_TIMEOUT = 120.0
+# motor_server ejecuta una sola rutina: cada script remoto equivale a una fracción de la altura
+ROUTINE_HEIGHT = {"rutina_botella.py": 1.0, "rutina_caja.py": 0.5}
+# Comandos que se pueden repetir sin efectos dobles
+IDEMPOTENT = ("STATUS", "STOP", "JOB", "QUEUE")
+# Importación de ev3dev2 e inicialización de un motor: lo que paga rutina_*.py antes de moverse
+SSH_MOTOR_PROBE = "python3 -c \"from ev3dev2.motor import LargeMotor, OUTPUT_A; LargeMotor(OUTPUT_A)\""
+
+
+class MotorServerError(RuntimeError):
+    """motor_server respondió algo inesperado o la respuesta se perdió."""
+
+
+class MotorServerUnavailable(MotorServerError):
+    """No se pudo conectar con motor_server: el comando no se entregó."""
+
+
+class MotorServerPollError(MotorServerError):
+    """Se perdió el seguimiento de un trabajo ya encolado: la rutina puede seguir en curso."""
+
+
+class _Connection:
+    """Socket TCP con lectura por líneas."""
+
+    def __init__(self, host, port, connect_timeout, timeout):
+        self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.settimeout(timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+
+    def send(self, line):
+        self.sock.sendall(line.encode("utf-8") + b"\n")
+
+    def readline(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("conexión cerrada por el servidor")
+        return line.decode("utf-8").strip()
+
+    def is_dropped(self):
+        # Sin petición en curso el socket no debería tener nada que leer: si es legible, el
+        # servidor lo cerró (EOF) o quedaron datos sueltos; en ambos casos no se reutiliza.
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def close(self):
+        for closeable in (self.rfile, self.sock):
+            try:
+                closeable.close()
+            except OSError:
+                pass
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    values = sorted(samples)
+    pick = lambda q: values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+    return {"p50": pick(50), "p99": pick(99)}
+
+
+class MotorClient:
+    """
+    Cliente thread-safe de motor_server con un pool de conexiones persistentes.
+    Las conexiones que el servidor cerró se detectan antes de reutilizarlas y se reabren.
+    """
+
+    def __init__(self, host=EV3_HOST, port=MOTOR_PORT, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 timeout=RESPONSE_TIMEOUT, retries=RETRIES, backoff=RETRY_BACKOFF):
+        """
+        Args:
+            host (str, optional): Host o IP del EV3. Default=EV3_HOST.
+            port (int, optional): Puerto de motor_server. Default=MOTOR_PORT.
+            pool_size (int, optional): Conexiones simultáneas como máximo. Default=POOL_SIZE.
+            connect_timeout (float, optional): Timeout de conexión en segundos. Default=CONNECT_TIMEOUT.
+            timeout (float, optional): Timeout de cada respuesta en segundos. Default=RESPONSE_TIMEOUT.
+            retries (int, optional): Reintentos tras un fallo de red. Default=RETRIES.
+            backoff (float, optional): Espera base entre reintentos (se duplica). Default=RETRY_BACKOFF.
+
+        Raises:
+            ValueError: Si pool_size < 1 o retries < 0.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size debe ser >= 1")
+        if retries < 0:
+            raise ValueError("retries debe ser >= 0")
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.connects = 0
+        self.reused = 0
+        self.retried = 0
+        self.failures = 0
+        self._rtt = collections.deque(maxlen=200)
+        self._dispatch = collections.deque(maxlen=200)
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+    def _acquire(self):
+        # Conexión libre del pool o una nueva; el llamante ya tiene un hueco del pool
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            if not conn.is_dropped():
+                self.reused += 1
+                return conn
+            conn.close()
+        try:
+            conn = _Connection(self.host, self.port, self.connect_timeout, self.timeout)
+        except OSError as e:
+            raise MotorServerUnavailable(f"No se pudo conectar con motor_server en {self}: {e}") from e
+        self.connects += 1
+        return conn
+
+    def request(self, command):
+        """
+        Envía un comando y retorna la línea de respuesta.
+
+        Args:
+            command (str): Comando de una línea (p. ej. "STATUS").
+
+        Returns:
+            str: Respuesta del servidor sin el salto de línea.
+
+        Raises:
+            MotorServerUnavailable: Si no se pudo conectar tras los reintentos (comando no entregado).
+            MotorServerError: Si se perdió la respuesta de un comando no idempotente o se agotó el pool.
+        """
+        idempotent = command.split()[0].upper() in IDEMPOTENT
+        if not self._slots.acquire(timeout=self.connect_timeout + self.timeout):
+            raise MotorServerError(f"Pool de conexiones con {self} agotado")
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.retried += 1
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                sent = False
+                try:
+                    conn = self._acquire()
+                except MotorServerUnavailable:
+                    if attempt == self.retries:
+                        self.failures += 1
+                        raise
+                    continue
+                tag = f"#{next(self._ids)} "
+                try:
+                    start = time.perf_counter()
+                    conn.send(tag + command)
+                    sent = True
+                    reply = conn.readline()
+                except OSError as e:
+                    conn.close()
+                    if sent and not idempotent:
+                        self.failures += 1
+                        raise MotorServerError(f"Respuesta perdida de {self} a '{command}': {e}") from e
+                    if attempt == self.retries:
+                        self.failures += 1
+                        raise MotorServerUnavailable(f"motor_server en {self} no responde: {e}") from e
+                    logging.warning(f"Conexión con motor_server {self} fallida ({e}); reintentando...")
+                    continue
+                if not reply.startswith(tag):
+                    # Respuesta atrasada de otra petición: la conexión ya no es confiable
+                    conn.close()
+                    self.failures += 1
+                    raise MotorServerError(f"Respuesta de {self} a '{command}' sin su id: {reply}")
+                reply = reply[len(tag):]
+                self._rtt.append((time.perf_counter() - start) * 1000.0)
+                self.requests += 1
+                with self._lock:
+                    self._idle.append(conn)
+                return reply
+        finally:
+            self._slots.release()
+
+    def status(self):
+        """Retorna "OK" (libre) o "BUSY" (rutina en curso o trabajos en cola)."""
+        return self.request("STATUS")
+
+    def stop(self):
+        """Detiene los motores y cancela los trabajos del servidor. Retorna True si confirmó."""
+        return self.request("STOP") == "STOPPED"
+
+    def palletize(self, velocidad, altura):
+        """
+        Encola la rutina en motor_server sin esperar a que termine.
+
+        Returns:
+            int: Id del trabajo, o None si la cola del servidor está llena.
+
+        Raises:
+            MotorServerError: Si la respuesta no es QUEUED/FULL.
+        """
+        reply = self.request(f"PALLETIZE {int(velocidad)} {float(altura)}")
+        if reply == "FULL":
+            return None
+        parts = reply.split()
+        if len(parts) != 2 or parts[0] != "QUEUED":
+            raise MotorServerError(f"Respuesta inesperada de {self} a PALLETIZE: {reply}")
+        return int(parts[1])
+
+    def job(self, job_id):
+        """
+        Estado de un trabajo.
+
+        Returns:
+            dict: id, state (QUEUED/RUNNING/DONE/FAILED/CANCELLED), vel, altura, queued, started,
+            finished (epoch del EV3 o None) y result ("OK"/"ERR"/"STOPPED" o None), o None si el
+            servidor ya no recuerda el trabajo.
+        """
+        reply = self.request(f"JOB {int(job_id)}")
+        if reply == "UNKNOWN_JOB":
+            return None
+        parts = reply.split()
+        if len(parts) < 3 or parts[0] != "JOB":
+            raise MotorServerError(f"Respuesta inesperada de {self} a JOB: {reply}")
+        info = {"id": int(parts[1]), "state": parts[2]}
+        for field in parts[3:]:
+            key, _, value = field.partition("=")
+            info[key] = None if value == "-" else value
+        for key, cast in (("vel", int), ("altura", float), ("queued", float), ("started", float), ("finished", float)):
+            if info.get(key) is not None:
+                info[key] = cast(info[key])
+        return info
+
+    def queue(self):
+        """
+        Returns:
+            dict: running (id o None), pending (lista de ids en orden) y depth (pendientes como máximo).
+        """
+        reply = self.request("QUEUE")
+        fields = dict(field.partition("=")[::2] for field in reply.split()[1:])
+        pending = fields.get("pending", "-")
+        return {
+            "running": None if fields.get("running", "-") == "-" else int(fields["running"]),
+            "pending": [] if pending == "-" else [int(job_id) for job_id in pending.split(",")],
+            "depth": int(fields["depth"]) if "depth" in fields else None,
+        }
+
+    def run_routine(self, velocidad, altura, wait=True, timeout=ROUTINE_TIMEOUT):
+        """
+        Encola la rutina de paletizado en motor_server y, por defecto, espera a que termine
+        (mismo contrato que `send_routine` por SSH, que bloquea hasta el final del script).
+        Si el EV3 está ocupado el trabajo espera en la cola del servidor y arranca en cuanto
+        termine el anterior.
+
+        Args:
+            velocidad (int): Velocidad de la base giratoria.
+            altura (float): Rotaciones de subida/bajada del vinilo.
+            wait (bool, optional): Esperar a que la rutina termine. Default=True.
+            timeout (float, optional): Espera máxima en segundos (cola + rutina). Default=ROUTINE_TIMEOUT.
+
+        Returns:
+            str: Resultado del trabajo ("OK", "ERR" o "STOPPED"; "OK" al encolar con wait=False),
+            "BUSY" si la cola del servidor está llena y "TIMEOUT" si no terminó a tiempo.
+
+        Raises:
+            MotorServerUnavailable: Si no se pudo entregar PALLETIZE (nada se ejecutó).
+            MotorServerError: Si se perdió la respuesta a PALLETIZE (la rutina pudo lanzarse).
+            MotorServerPollError: Si tras encolar el trabajo falla su seguimiento (conexión caída o
+                trabajo olvidado por el servidor); la rutina puede seguir en curso en el EV3.
+        """
+        start = time.perf_counter()
+        job_id = self.palletize(velocidad, altura)
+        self._dispatch.append((time.perf_counter() - start) * 1000.0)
+        if job_id is None:
+            logging.warning(f"Cola de motor_server {self} llena: rutina no encolada")
+            return "BUSY"
+        logging.info(f"Rutina encolada en motor_server {self} como trabajo {job_id} en {self._dispatch[-1]:.0f} ms")
+        if not wait:
+            return "OK"
+        submitted = time.monotonic()
+        while time.monotonic() - submitted < timeout:
+            time.sleep(POLL_INTERVAL)
+            try:
+                info = self.job(job_id)
+            except MotorServerError as e:
+                # Incluye MotorServerUnavailable: el trabajo ya se entregó, no es seguro repetirlo
+                raise MotorServerPollError(f"Seguimiento del trabajo {job_id} en {self} perdido: {e}") from e
+            if info is None:
+                raise MotorServerPollError(f"motor_server {self} ya no recuerda el trabajo {job_id}")
+            if info["finished"] is not None:
+                if info["started"] is not None:
+                    logging.info(f"Trabajo {job_id}: {info['result']} (cola {info['started'] - info['queued']:.1f}s, "
+                                 f"rutina {info['finished'] - info['started']:.1f}s)")
+                return info["result"]
+        logging.error(f"El trabajo {job_id} en motor_server {self} no terminó en {timeout:.0f}s")
+        return "TIMEOUT"
+
+    def run_script(self, script_name, velocidad, altura, **kwargs):
+        """
+        Equivalente en motor_server de ejecutar `script_name` por SSH: aplica el factor de
+        altura de ROUTINE_HEIGHT (rutina_caja.py usa la mitad) y llama a `run_routine`.
+        """
+        factor = ROUTINE_HEIGHT.get(script_name, 1.0)
+        return self.run_routine(velocidad, altura * factor, **kwargs)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Peticiones, conexiones abiertas/reutilizadas, reintentos, fallos y tiempos (ms,
+            p50/p99) de ida y vuelta y de despacho de rutinas.
+        """
+        return {
+            "requests": self.requests,
+            "connects": self.connects,
+            "reused": self.reused,
+            "retried": self.retried,
+            "failures": self.failures,
+            "rtt_ms": _percentiles(self._rtt),
+            "dispatch_ms": _percentiles(self._dispatch),
+        }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host=EV3_HOST, port=MOTOR_PORT, **options):
+    """
+    Retorna el cliente compartido para (host, puerto), creándolo la primera vez. Así las
+    rutinas en segundo plano y los comandos de la GUI reutilizan el mismo pool.
+    """
+    key = (host, port)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MotorClient(host, port, **options)
+            _clients[key] = client
+            logging.info(f"Cliente de motor_server: {client}")
+        return client
+
+
+def close_clients():
+    """Cierra las conexiones de todos los clientes compartidos (p. ej. al salir)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def _median(samples):
+    return sorted(samples)[len(samples) // 2]
+
+
+def _summary(samples):
+    return f"p50={_median(samples):.0f}ms min={min(samples):.0f}ms max={max(samples):.0f}ms"
+
+
+def compare_latency(host, port, runs, ssh_runs, user="robot", transport="auto"):
+    """
+    Compara el tiempo desde el disparo hasta que el EV3 puede mover un motor en ambos caminos,
+    sin mover nada: por motor_server es la ida y vuelta de un comando (los motores ya están
+    inicializados); por SSH es lanzar un Python que importa ev3dev2 e inicializa un motor, lo
+    mismo que pagan rutina_*.py antes de su primer movimiento.
+
+    Returns:
+        dict: Muestras en ms por camino ("server" y "ssh"); vacías si el camino no está disponible.
+    """
+    from ev3_link import get_link
+
+    results = {"server": [], "ssh": []}
+    client = MotorClient(host, port)
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            client.status()
+            results["server"].append((time.perf_counter() - start) * 1000.0)
+    except MotorServerError as e:
+        logging.error(f"motor_server no disponible: {e}")
+    finally:
+        client.close()
+    link = get_link(host, user, transport)
+    try:
+        link.connect()
+        for _ in range(ssh_runs):
+            start = time.perf_counter()
+            result = link.run(SSH_MOTOR_PROBE, timeout=60)
+            if result.returncode != 0:
+                logging.error(f"Prueba SSH falló: {result.stderr.strip()}")
+                break
+            results["ssh"].append((time.perf_counter() - start) * 1000.0)
+    except Exception as e:
+        logging.error(f"SSH no disponible: {e}")
+    finally:
+        link.close()
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Cliente TCP de motor_server.py")
+    parser.add_argument("--host", default=EV3_HOST)
+    parser.add_argument("--port", type=int, default=MOTOR_PORT)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="estado del servidor (OK/BUSY)")
+    sub.add_parser("queue", help="trabajo en curso y trabajos pendientes")
+    p_job = sub.add_parser("job", help="estado de un trabajo")
+    p_job.add_argument("job_id", type=int)
+    sub.add_parser("stop", help="detener los motores")
+    p_run = sub.add_parser("palletize", help="ejecutar la rutina y esperar a que termine")
+    p_run.add_argument("velocidad", type=int)
+    p_run.add_argument("altura", type=float)
+    p_run.add_argument("--no-wait", action="store_true", help="no esperar a que termine")
+    p_lat = sub.add_parser("latency", help="latencia disparo→motor: motor_server vs SSH")
+    p_lat.add_argument("--runs", type=int, default=20)
+    p_lat.add_argument("--ssh-runs", type=int, default=5)
+    p_lat.add_argument("--user", default="robot")
+    p_lat.add_argument("--transport", default="auto")
+    args = parser.parse_args()
+
+    if args.command == "latency":
+        results = compare_latency(args.host, args.port, args.runs, args.ssh_runs, args.user, args.transport)
+        for label, key in (("motor_server", "server"), ("SSH + ev3dev2", "ssh")):
+            samples = results[key]
+            print(f"{label:>14}: {_summary(samples) if samples else 'no disponible'}")
+        if results["server"] and results["ssh"]:
+            ratio = _median(results["ssh"]) / max(_median(results["server"]), 1e-3)
+            print(f"motor_server es {ratio:.0f}x más rápido hasta el primer movimiento")
+        return
+    client = MotorClient(args.host, args.port)
+    try:
+        if args.command == "status":
+            print(client.status())
+        elif args.command == "queue":
+            print(client.queue())
+        elif args.command == "job":
+            print(client.job(args.job_id))
+        elif args.command == "stop":
+            print("STOPPED" if client.stop() else "ERR")
+        else:
+            print(client.run_routine(args.velocidad, args.altura, wait=not args.no_wait))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
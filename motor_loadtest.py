@@ -0,0 +1,217 @@
+r"""
+motor_loadtest.py
+
+Prueba de carga de motor_server.py: varias conexiones concurrentes enviando STATUS tan rápido
+como pueden, y un cliente aparte que mide cuánto tarda un STOP con el servidor saturado y una
+rutina en curso. Reporta comandos por segundo y latencia p50/p99 de respuesta.
+
+Modos:
+    - "persistent": una conexión por cliente con muchos comandos (protocolo actual).
+    - "per-command": una conexión TCP nueva por comando (como los clientes antiguos).
+
+Uso (con motores simulados, sin EV3):
+    python .\motor_loadtest.py --spawn-stub --connections 8 --seconds 10
+    python .\motor_loadtest.py --spawn-stub --mode per-command
+    python .\motor_loadtest.py --host 192.168.137.3 --connections 4   # servidor ya corriendo
+"""
+
+
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+MOTOR_PORT = 9999
+TIMEOUT = 5.0
+MODES = ("persistent", "per-command")
+# Intervalo entre STOP del cliente de sondeo
+STOP_INTERVAL = 0.2
+
+
+def _percentiles(samples):
+    values = sorted(samples)
+    pick = lambda q: values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+    return {"p50": pick(50), "p99": pick(99), "max": values[-1]}
+
+
+class _Client:
+    """Conexión TCP que envía comandos con id y verifica el id de cada respuesta."""
+
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port), timeout=TIMEOUT)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        self.next_id = 0
+
+    def request(self, command):
+        self.next_id += 1
+        tag = f"#{self.next_id} "
+        self.sock.sendall((tag + command + "\n").encode("utf-8"))
+        reply = self.rfile.readline().decode("utf-8")
+        if not reply.startswith(tag):
+            raise ConnectionError(f"respuesta inesperada a '{command}': {reply.strip()!r}")
+        return reply[len(tag):].strip()
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def _load_worker(host, port, mode, deadline, latencies, errors):
+    client = None
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if client is None:
+                client = _Client(host, port)
+            client.request("STATUS")
+        except OSError as e:
+            errors.append(str(e))
+            if client is not None:
+                client.close()
+                client = None
+            continue
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        if mode == "per-command":
+            client.close()
+            client = None
+    if client is not None:
+        client.close()
+
+
+def _stop_prober(host, port, deadline, latencies, errors):
+    # Encola una rutina y la detiene con STOP mientras los demás clientes saturan el servidor
+    try:
+        client = _Client(host, port)
+        while time.perf_counter() < deadline:
+            client.request("PALLETIZE 25 0.6")
+            time.sleep(STOP_INTERVAL)
+            start = time.perf_counter()
+            if client.request("STOP") != "STOPPED":
+                errors.append("STOP sin confirmar")
+                continue
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        client.close()
+    except OSError as e:
+        errors.append(f"STOP: {e}")
+
+
+def run_load(host, port, connections, seconds, mode="persistent", stop_probe=True):
+    """
+    Ejecuta la prueba de carga.
+
+    Args:
+        host (str): Host de motor_server.
+        port (int): Puerto de motor_server.
+        connections (int): Clientes concurrentes enviando STATUS.
+        seconds (float): Duración de la prueba.
+        mode (str, optional): "persistent" o "per-command". Default="persistent".
+        stop_probe (bool, optional): Medir STOP bajo carga (lanza una rutina). Default=True.
+
+    Returns:
+        dict: Comandos, comandos/s, latencias (ms) de STATUS y de STOP, y errores.
+
+    Raises:
+        ValueError: Si el modo es desconocido.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo desconocido: {mode}")
+    latencies, stop_latencies, errors = [], [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=_load_worker, args=(host, port, mode, deadline, latencies, errors), daemon=True)
+        for _ in range(connections)
+    ]
+    if stop_probe:
+        threads.append(threading.Thread(target=_stop_prober, args=(host, port, deadline, stop_latencies, errors),
+                                        daemon=True))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "commands": len(latencies),
+        "cmds_per_s": len(latencies) / elapsed,
+        "latency_ms": _percentiles(latencies) if latencies else None,
+        "stop_ms": _percentiles(stop_latencies) if stop_latencies else None,
+        "errors": errors,
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_stub_server(port, timeout=10.0):
+    """
+    Arranca `motor_server.py --stub` en un subproceso local y espera a que acepte conexiones.
+
+    Returns:
+        subprocess.Popen: Proceso del servidor (terminarlo al acabar).
+
+    Raises:
+        RuntimeError: Si el servidor no arranca a tiempo.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "motor_server.py")
+    process = subprocess.Popen([sys.executable, script, "--stub", "--host", "127.0.0.1", "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"motor_server --stub terminó con código {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("motor_server --stub no arrancó a tiempo")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Prueba de carga de motor_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=MOTOR_PORT)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mode", choices=MODES, default="persistent")
+    parser.add_argument("--no-stop-probe", action="store_true", help="no lanzar rutina ni medir STOP")
+    parser.add_argument("--spawn-stub", action="store_true", help="arrancar motor_server.py --stub local")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_stub:
+        args.host, args.port = "127.0.0.1", _free_port()
+        server = spawn_stub_server(args.port)
+        logging.info(f"motor_server --stub en {args.host}:{args.port}")
+    try:
+        result = run_load(args.host, args.port, args.connections, args.seconds, args.mode,
+                          stop_probe=not args.no_stop_probe)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    latency = result["latency_ms"]
+    print(f"modo {args.mode}, {args.connections} conexiones, {args.seconds:.0f}s: "
+          f"{result['commands']} comandos ({result['cmds_per_s']:.0f} cmds/s)")
+    if latency:
+        print(f"  STATUS: p50={latency['p50']:.2f}ms p99={latency['p99']:.2f}ms max={latency['max']:.2f}ms")
+    if result["stop_ms"]:
+        stop = result["stop_ms"]
+        print(f"  STOP bajo carga: p50={stop['p50']:.2f}ms p99={stop['p99']:.2f}ms max={stop['max']:.2f}ms")
+    if result["errors"]:
+        print(f"  errores: {len(result['errors'])} (primero: {result['errors'][0]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,32 @@ motor_server.py
 Servidor TCP para controlar los motores de la paletizadora en EV3.
 Recibe comandos desde un cliente (PC) y ejecuta rutinas de movimiento.
 Incluye manejo de concurrencia y logs detallados.
+
+Protocolo: comandos de una línea, muchos por conexión:
+    PALLETIZE <vel> <altura>  → `QUEUED <job_id>` (o `FULL` si la cola está llena)
+    JOB <job_id>              → `JOB <id> <estado> vel=.. altura=.. queued=.. started=.. finished=.. result=..`
+    QUEUE                     → `QUEUE running=<id|-> pending=<ids|-> depth=<n>`
+    STATUS                    → `BUSY` si hay trabajos en curso o pendientes, si no `OK`
+    STOP                      → `STOPPED` (detiene motores, interrumpe la rutina y vacía la cola)
+Las rutinas se ejecutan en orden de llegada, una tras otra y sin pausas (ver JobQueue).
+Cada conexión se atiende en su propio hilo, así un cliente lento no bloquea a los
+demás y un STOP nunca espera detrás de otro cliente. Si la línea empieza con `#<id> ` la
+respuesta lleva el mismo prefijo (`#7 STATUS` → `#7 OK`) para emparejar peticiones y
+respuestas; sin prefijo la respuesta va sin él.
+
+Uso:
+    python3 motor_server.py                # en el EV3
+    python3 motor_server.py --stub         # motores simulados (pruebas y motor_loadtest.py)
 """
 
 
 
+import argparse
+import collections
 import socketserver
 import threading
 import time
 import logging
-from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
-from ev3dev2.sensor import INPUT_1
-from ev3dev2.sensor.lego import TouchSensor
 
 
 
@@ -27,35 +42,96 @@ logging.basicConfig(
 )
 
 
-# Inicialización de motores y sensor de presión
-try:
-    motor_vinilo = LargeMotor(OUTPUT_A)   # Motor que sube/baja el vinilo
-    motor_base = LargeMotor(OUTPUT_B)     # Motor de la base giratoria
-    sensor_presion = TouchSensor(INPUT_1) # Sensor de presión en la base
-except Exception as e:
-    logging.error(f"Error inicializando hardware EV3: {e}")
-    raise
+HOST, PORT = "0.0.0.0", 9999
+# Segundos sin comandos tras los que se cierra una conexión (clientes caídos)
+CLIENT_IDLE_TIMEOUT = 600.0
+# Longitud máxima de un comando en bytes
+MAX_LINE = 256
+
+
+class StubMotor:
+    """
+    Motor simulado para --stub: registra los comandos y simula la duración de los movimientos.
+    """
+
+    def __init__(self, name, seconds_per_rotation=0.5):
+        self.name = name
+        self.seconds_per_rotation = seconds_per_rotation
+        self.speed = 0
+
+    def on(self, speed):
+        self.speed = speed
+        logging.debug(f"[stub] {self.name}.on({speed})")
+
+    def on_for_rotations(self, speed, rotations):
+        logging.debug(f"[stub] {self.name}.on_for_rotations({speed}, {rotations})")
+        time.sleep(abs(rotations) * self.seconds_per_rotation)
 
+    def stop(self):
+        self.speed = 0
+        logging.debug(f"[stub] {self.name}.stop()")
 
 
-# Control de concurrencia para la rutina de paletizado
-routine_lock = threading.Lock()
-routine_busy = False
+class StubTouchSensor:
+    """Sensor de presión simulado: siempre presionado (el vinilo ya está abajo)."""
 
-def rutina_paletizadora(velocidad_base=25, altura=0.6):
+    is_pressed = True
+
+
+# Motores y sensor de presión (ver init_hardware)
+motor_vinilo = None
+motor_base = None
+sensor_presion = None
+
+
+def init_hardware(stub=False):
+    """
+    Inicializa motores y sensor de presión.
+    :param stub: Usar motores simulados (sin ev3dev2), para probar fuera del EV3.
+    :raises Exception: Si el hardware EV3 no se puede inicializar.
+    """
+    global motor_vinilo, motor_base, sensor_presion
+    if stub:
+        motor_vinilo = StubMotor("motor_vinilo")
+        motor_base = StubMotor("motor_base")
+        sensor_presion = StubTouchSensor()
+        logging.info("Motores simulados (--stub)")
+        return
+    try:
+        from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
+        from ev3dev2.sensor import INPUT_1
+        from ev3dev2.sensor.lego import TouchSensor
+        motor_vinilo = LargeMotor(OUTPUT_A)   # Motor que sube/baja el vinilo
+        motor_base = LargeMotor(OUTPUT_B)     # Motor de la base giratoria
+        sensor_presion = TouchSensor(INPUT_1) # Sensor de presión en la base
+    except Exception as e:
+        logging.error(f"Error inicializando hardware EV3: {e}")
+        raise
+
+
+
+# Cola de trabajos: profundidad máxima de trabajos pendientes y trabajos terminados que se recuerdan
+JOB_QUEUE_DEPTH = 4
+JOB_HISTORY = 50
+
+
+class RoutineAborted(Exception):
+    """La rutina se interrumpió por un comando STOP."""
+
+
+def rutina_paletizadora(velocidad_base=25, altura=0.6, abort=None):
     """
     Ejecuta la rutina de paletizado con los parámetros dados.
-    Controla concurrencia para evitar ejecuciones simultáneas.
+    Solo la llama el hilo de la cola de trabajos, así nunca hay dos rutinas a la vez.
     :param velocidad_base: Velocidad de la base giratoria.
     :param altura: Altura de subida/bajada del vinilo.
-    :return: 'OK' si completado, 'BUSY' si ya estaba en ejecución, 'ERR' si hubo error.
-    """
-    global routine_busy
-    with routine_lock:
-        if routine_busy:
-            logging.warning("Rutina ya en ejecución, ignorando nueva petición.")
-            return "BUSY"
-        routine_busy = True
+    :param abort: threading.Event opcional; si se activa (STOP) la rutina se detiene entre movimientos.
+    :return: 'OK' si completado, 'STOPPED' si se interrumpió, 'ERR' si hubo error.
+    """
+    def check_abort():
+        if abort is not None and abort.is_set():
+            raise RoutineAborted()
+
     logging.info(f"Iniciando rutina de paletizado (velocidad={velocidad_base}, altura={altura})")
     try:
         # Bajar hasta el sensor de presión
@@ -63,6 +139,7 @@ def rutina_paletizadora(velocidad_base=25, altura=0.6):
         start = time.time()
         while not sensor_presion.is_pressed:
             time.sleep(0.1)
+            check_abort()
             if time.time() - start > 10.0:
                 logging.error("Timeout bajando vinilo (sensor no presionado)")
                 break
@@ -72,11 +149,13 @@ def rutina_paletizadora(velocidad_base=25, altura=0.6):
         motor_base.on(velocidad_base)
 
         for i in range(6):
+            check_abort()
             logging.info(f"Ciclo {i+1}/6: Subiendo vinilo")
             motor_vinilo.on_for_rotations(-15, altura)
             time.sleep(0.5)
             motor_vinilo.stop()
             time.sleep(0.5)
+            check_abort()
             logging.info(f"Ciclo {i+1}/6: Bajando vinilo")
             motor_vinilo.on_for_rotations(15, altura)
             time.sleep(0.5)
@@ -85,78 +164,268 @@ def rutina_paletizadora(velocidad_base=25, altura=0.6):
         motor_base.stop()
         logging.info("Rutina completada")
         return "OK"
+    except RoutineAborted:
+        logging.warning("Rutina interrumpida por STOP")
+        motor_vinilo.stop()
+        motor_base.stop()
+        return "STOPPED"
     except Exception as e:
         logging.error(f"Error en rutina: {e}")
         motor_vinilo.stop()
         motor_base.stop()
         return "ERR"
-    finally:
-        with routine_lock:
-            routine_busy = False
+
+
+class Job:
+    """
+    Trabajo de paletizado: QUEUED → RUNNING → DONE/FAILED, o CANCELLED si un STOP lo
+    interrumpe o lo saca de la cola. Las marcas de tiempo son epoch en segundos.
+    """
+
+    def __init__(self, job_id, velocidad, altura):
+        self.id = job_id
+        self.velocidad = velocidad
+        self.altura = altura
+        self.state = "QUEUED"
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.abort = threading.Event()
+
+    def describe(self):
+        """Texto de una línea: `<id> <estado> vel=.. altura=.. queued=.. started=.. finished=.. result=..`."""
+        ts = lambda t: f"{t:.3f}" if t is not None else "-"
+        return (f"{self.id} {self.state} vel={self.velocidad} altura={self.altura} queued={ts(self.queued)} "
+                f"started={ts(self.started)} finished={ts(self.finished)} result={self.result or '-'}")
+
+
+class JobQueue:
+    """
+    Cola FIFO de rutinas con profundidad máxima. Un único hilo las ejecuta una tras otra
+    sin pausas entre trabajos; las peticiones que llegan mientras el EV3 trabaja esperan
+    en la cola en lugar de perderse.
+    """
+
+    def __init__(self, runner, depth=JOB_QUEUE_DEPTH, history=JOB_HISTORY):
+        """
+        :param runner: Función (velocidad, altura, abort) → resultado, p. ej. rutina_paletizadora.
+        :param depth: Trabajos pendientes como máximo (sin contar el que está en ejecución).
+        :param history: Trabajos terminados que se conservan para el comando JOB.
+        :raises ValueError: Si depth < 1.
+        """
+        if depth < 1:
+            raise ValueError("depth debe ser >= 1")
+        self.runner = runner
+        self.depth = depth
+        self.history = history
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._jobs = collections.OrderedDict()
+        self._next_id = 1
+        self.current = None
+        self._thread = threading.Thread(target=self._worker, name="job-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, velocidad, altura):
+        """
+        Encola una rutina.
+        :return: Job encolado, o None si la cola está llena.
+        """
+        with self._cond:
+            if len(self._pending) >= self.depth:
+                return None
+            job = Job(self._next_id, velocidad, altura)
+            self._next_id += 1
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._trim()
+            self._cond.notify()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def busy(self):
+        with self._cond:
+            return self.current is not None or bool(self._pending)
+
+    def snapshot(self):
+        """:return: (id en ejecución o None, lista de ids pendientes)."""
+        with self._cond:
+            return (self.current.id if self.current else None), [job.id for job in self._pending]
+
+    def cancel_all(self):
+        """
+        Interrumpe la rutina en curso y cancela los trabajos pendientes (comando STOP).
+        :return: Número de trabajos afectados.
+        """
+        with self._cond:
+            now = time.time()
+            cancelled = list(self._pending)
+            self._pending.clear()
+            for job in cancelled:
+                job.state = "CANCELLED"
+                job.finished = now
+                job.result = "STOPPED"
+            if self.current is not None:
+                self.current.abort.set()
+                cancelled.append(self.current)
+            return len(cancelled)
+
+    def _trim(self):
+        # Olvidar los trabajos terminados más antiguos (nunca los pendientes ni el actual)
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                job.state = "RUNNING"
+                job.started = time.time()
+                self.current = job
+            logging.info(f"Trabajo {job.id} iniciado (esperó {job.started - job.queued:.1f}s en cola)")
+            try:
+                result = self.runner(job.velocidad, job.altura, job.abort)
+            except Exception as e:
+                logging.error(f"Error en trabajo {job.id}: {e}")
+                result = "ERR"
+            with self._cond:
+                job.finished = time.time()
+                job.result = result
+                job.state = {"OK": "DONE", "STOPPED": "CANCELLED"}.get(result, "FAILED")
+                self.current = None
+                self._trim()
+            logging.info(f"Trabajo {job.id} terminado: {result} ({job.finished - job.started:.1f}s)")
+
+
+# Cola de trabajos del servidor (ver __main__)
+job_queue = None
+
+
+def handle_command(line):
+    """
+    Procesa un comando (sin prefijo de id) y retorna la respuesta.
+    :param line: Comando, p. ej. "PALLETIZE 25 0.6".
+    :return: Respuesta sin salto de línea.
+    """
+    parts = line.split()
+    cmd = parts[0].upper()
+
+    if cmd == "PALLETIZE":
+        logging.info(f"Comando recibido: {line}")
+        try:
+            vel = int(parts[1]) if len(parts) > 1 else 25
+            altura = float(parts[2]) if len(parts) > 2 else 0.6
+        except Exception:
+            vel = 25
+            altura = 0.6
+        job = job_queue.submit(vel, altura)
+        if job is None:
+            logging.warning(f"Cola llena ({job_queue.depth} pendientes): trabajo rechazado")
+            return "FULL"
+        return f"QUEUED {job.id}"
+
+    elif cmd == "STOP":
+        # Sin esperar a la rutina: se atiende en el hilo de la conexión, detiene los motores,
+        # interrumpe la rutina en curso y vacía la cola (ningún trabajo arranca tras un STOP)
+        motor_vinilo.stop()
+        motor_base.stop()
+        cancelled = job_queue.cancel_all()
+        logging.info(f"Motores detenidos por comando STOP ({cancelled} trabajos cancelados)")
+        return "STOPPED"
+
+    elif cmd == "JOB":
+        try:
+            job = job_queue.get(int(parts[1]))
+        except (IndexError, ValueError):
+            return "ERR"
+        return f"JOB {job.describe()}" if job is not None else "UNKNOWN_JOB"
+
+    elif cmd == "QUEUE":
+        running, pending = job_queue.snapshot()
+        pending_txt = ",".join(str(job_id) for job_id in pending) or "-"
+        return f"QUEUE running={running or '-'} pending={pending_txt} depth={job_queue.depth}"
+
+    elif cmd == "STATUS":
+        busy_status = "BUSY" if job_queue.busy() else "OK"
+        logging.debug(f"Status reportado: {busy_status}")
+        return busy_status
+
+    else:
+        logging.warning(f"Comando desconocido: {cmd}")
+        return "UNKNOWN"
 
 
 class Handler(socketserver.StreamRequestHandler):
     """
-    Handler de conexiones TCP entrantes. Procesa comandos y ejecuta rutinas.
+    Handler de una conexión TCP: atiende comandos línea a línea hasta que el cliente cierra
+    o pasa CLIENT_IDLE_TIMEOUT sin comandos.
     """
+
+    timeout = CLIENT_IDLE_TIMEOUT
+    disable_nagle_algorithm = True
+
     def handle(self):
+        peer = "%s:%s" % self.client_address[:2]
+        logging.info(f"Cliente conectado: {peer}")
         try:
-            line = self.rfile.readline().decode("utf-8").strip()
-            logging.info(f"Comando recibido: {line}")
-            if not line:
-                return
-            parts = line.split()
-            cmd = parts[0].upper()
-
-            if cmd == "PALLETIZE":
-                try:
-                    vel = int(parts[1]) if len(parts) > 1 else 25
-                    altura = float(parts[2]) if len(parts) > 2 else 0.6
-                except Exception:
-                    vel = 25
-                    altura = 0.6
-                # Responder inmediatamente
-                self.wfile.write(b"STARTED\n")
-                self.wfile.flush()
-                # Ejecutar rutina en un hilo aparte y loggear resultado
-                def run_and_log():
-                    res = rutina_paletizadora(vel, altura)
-                    logging.info(f"Resultado rutina: {res}")
-                threading.Thread(
-                    target=run_and_log,
-                    daemon=True
-                ).start()
-
-            elif cmd == "STOP":
-                motor_vinilo.stop()
-                motor_base.stop()
-                self.wfile.write(b"STOPPED\n")
-                self.wfile.flush()
-                logging.info("Motores detenidos por comando STOP")
-
-            elif cmd == "STATUS":
-                busy_status = b"BUSY\n" if routine_busy else b"OK\n"
-                self.wfile.write(busy_status)
-                self.wfile.flush()
-                logging.info(f"Status reportado: {busy_status.decode().strip()}")
-
-            else:
-                self.wfile.write(b"UNKNOWN\n")
-                self.wfile.flush()
-                logging.warning(f"Comando desconocido: {cmd}")
-
+            while True:
+                raw = self.rfile.readline(MAX_LINE + 1)
+                if not raw:
+                    break
+                if len(raw) > MAX_LINE:
+                    logging.warning(f"Comando demasiado largo de {peer}; cerrando conexión")
+                    self.wfile.write(b"ERR\n")
+                    break
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                req_id = None
+                if line.startswith("#"):
+                    req_id, _, line = line[1:].partition(" ")
+                reply = handle_command(line) if line else "UNKNOWN"
+                if req_id is not None:
+                    reply = f"#{req_id} {reply}"
+                self.wfile.write(reply.encode("utf-8") + b"\n")
+        except OSError as e:
+            # Incluye el timeout por inactividad
+            logging.info(f"Conexión con {peer} terminada: {e}")
         except Exception as e:
             logging.error(f"Handler error: {e}")
+        logging.info(f"Cliente desconectado: {peer}")
+
+
+class MotorServer(socketserver.ThreadingTCPServer):
+    """Un hilo por conexión; los hilos no impiden cerrar el servidor."""
+
+    daemon_threads = True
+    allow_reuse_address = True
 
 
 if __name__ == "__main__":
     """
     Punto de entrada principal: inicia el servidor TCP y espera comandos.
     """
-    HOST, PORT = "0.0.0.0", 9999
-    logging.info(f"Servidor de motores escuchando en {HOST}:{PORT}")
+    parser = argparse.ArgumentParser(description="Servidor TCP de motores de la paletizadora")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--stub", action="store_true", help="motores simulados (sin ev3dev2)")
+    parser.add_argument("--queue-depth", type=int, default=JOB_QUEUE_DEPTH, help="trabajos pendientes como máximo")
+    args = parser.parse_args()
+    init_hardware(stub=args.stub)
+    job_queue = JobQueue(rutina_paletizadora, depth=args.queue_depth).start()
+    logging.info(f"Servidor de motores escuchando en {args.host}:{args.port}")
     try:
-        with socketserver.TCPServer((HOST, PORT), Handler) as server:
+        with MotorServer((args.host, args.port), Handler) as server:
             server.serve_forever()
     except KeyboardInterrupt:
         logging.info("Servidor detenido por el usuario.")
@@ -0,0 +1,328 @@
+r"""
+multi_camera.py
+
+Gestor de varias cámaras (puestos de la cinta) con un único clasificador compartido.
+
+Cada `Station` tiene su fuente de frames, ROI, mapa de objetivos y EV3 de destino. El
+`MultiCameraManager` toma el último frame nuevo de cada puesto, clasifica los de todos los
+puestos en un solo lote (`classifier.predict_regions_batch`) y entrega cada resultado a su
+puesto. Añadir una segunda cámara agranda el lote en lugar de duplicar las pasadas del modelo.
+Expone por cámara los fps clasificados, la latencia captura→resultado y la profundidad de cola
+(frames capturados pendientes de clasificar).
+
+Uso:
+    python .\multi_camera.py               # puestos definidos en STATIONS
+    python .\multi_camera.py --stats 5     # estadísticas cada 5 segundos
+"""
+
+
+import argparse
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from classifier import TargetMatcher, crop_roi, latency_stats, load_model, predict_regions_batch, warmup
+from frame_cache import PerceptualCache
+from frame_sources import open_source
+from main_pc import CONF_THRESHOLD, MOTION_GATE, OBJETIVOS_MAP, RESULT_CACHE, send_routine
+from motion_gate import MotionGate
+
+
+# Puestos de la cinta: fuente (ver frame_sources.open_source), ROI, objetivos y EV3 de destino
+STATIONS = [
+    {
+        "name": "puesto_1",
+        "source": {"type": "camera", "urls": ["http://192.168.1.28:8080/video"], "skip_decode": True},
+        "roi": None,
+        "targets": OBJETIVOS_MAP,
+        "ev3_host": "ev3dev.local",
+    },
+    {
+        "name": "puesto_2",
+        "source": {"type": "camera", "urls": ["http://192.168.1.29:8080/video"], "skip_decode": True},
+        "roi": None,
+        "targets": OBJETIVOS_MAP,
+        "ev3_host": "ev3dev-2.local",
+    },
+]
+
+# Máximo de frames por lote (None = todos los puestos con frame nuevo) y espera cuando no hay frames nuevos
+MAX_BATCH = None
+POLL_INTERVAL = 0.005
+# Muestras de latencia guardadas por puesto para las estadísticas
+LATENCY_WINDOW = 200
+
+
+class Station:
+    """
+    Puesto de la cinta: una fuente de frames con su ROI, objetivos, EV3 de destino y estadísticas.
+    """
+
+    def __init__(self, name, source, roi=None, targets=OBJETIVOS_MAP, threshold=CONF_THRESHOLD, exact=False,
+                 tiles=(1, 1), overlap=0.0, ev3_host=None, motion_gate=MOTION_GATE, result_cache=RESULT_CACHE,
+                 on_detection=None):
+        """
+        Args:
+            name (str): Nombre del puesto (aparece en los logs y estadísticas).
+            source (FrameSource | dict): Fuente de frames o su configuración para open_source.
+            roi (tuple, optional): (x, y, ancho, alto) de la cinta en el frame. Default=None.
+            targets (dict | list, optional): Objetivos del puesto (p. ej. OBJETIVOS_MAP). Default=OBJETIVOS_MAP.
+            threshold (float, optional): Confianza mínima. Default=CONF_THRESHOLD.
+            exact (bool, optional): Emparejamiento exacto de etiquetas. Default=False.
+            tiles (tuple, optional): (columnas, filas) del modo multi-recorte. Default=(1, 1).
+            overlap (float, optional): Solapamiento entre recortes. Default=0.0.
+            ev3_host (str, optional): EV3 que atiende este puesto. Default=None (EV3_HOST de main_pc).
+            motion_gate (dict, optional): Opciones de MotionGate; None para clasificar todos los frames.
+            result_cache (dict, optional): Opciones de la PerceptualCache propia del puesto; None para no
+                cachear. Default=RESULT_CACHE.
+            on_detection (callable, optional): fn(station, deteccion) al detectar un objetivo.
+                Default=None (rutina por SSH en `ev3_host`).
+        """
+        self.name = name
+        self.source = open_source(source) if isinstance(source, dict) else source
+        self.roi = roi
+        self.tiles = tuple(tiles)
+        self.overlap = overlap
+        self.targets = targets
+        self.matcher = TargetMatcher(targets, threshold, exact)
+        self.ev3_host = ev3_host
+        self.gate = MotionGate(**motion_gate) if motion_gate else None
+        # Caché por puesto: un cambio de escena en una cámara no vacía los resultados de las demás
+        self.cache = PerceptualCache(**result_cache) if result_cache else None
+        self.on_detection = on_detection or run_station_routine
+        self.busy = False  # hay una rutina en curso en el EV3 del puesto
+
+        self.last_seq = 0
+        self.last_result = None
+        self.frames_classified = 0
+        self.frames_gated = 0
+        self.frames_dropped = 0
+        self.detections = 0
+        self.queue_depth = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._classified_times = deque(maxlen=LATENCY_WINDOW)
+
+    def poll(self):
+        """
+        Retorna el frame nuevo del puesto si hay uno que clasificar, o None.
+        La profundidad de cola es el número de frames capturados desde el último consumido.
+        """
+        frame = self.source.get_frame_info()
+        if frame.image is None or frame.seq == self.last_seq:
+            self.queue_depth = 0
+            return None
+        self.queue_depth = frame.seq - self.last_seq
+        if self.last_seq:
+            self.frames_dropped += max(0, self.queue_depth - 1)
+        self.last_seq = frame.seq
+        if self.gate is not None:
+            # Misma región que se clasifica: el movimiento fuera del ROI no abre la puerta y un
+            # objeto pequeño dentro del ROI no se diluye en el frame completo
+            if not self.gate.update(crop_roi(frame.image, self.roi)):
+                self.frames_gated += 1
+                return None
+            if self.gate.changed and self.cache is not None:
+                # Escena nueva: no reutilizar resultados de antes del cambio (cinta vacía)
+                self.cache.clear()
+        return frame
+
+    def record(self, frame, deteccion, now):
+        """Registra el resultado de un frame clasificado."""
+        self.last_result = deteccion
+        self.frames_classified += 1
+        self._classified_times.append(now)
+        if frame.timestamp is not None:
+            self._latencies.append((now - frame.timestamp) * 1000.0)
+
+    def stats(self):
+        """
+        Returns:
+            dict: fps clasificados, latencia captura→resultado (ms), profundidad de cola y contadores.
+        """
+        times = list(self._classified_times)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            "fps": fps,
+            "latency_ms": latency_stats(self._latencies) if self._latencies else None,
+            "queue_depth": self.queue_depth,
+            "classified": self.frames_classified,
+            "gated": self.frames_gated,
+            "dropped": self.frames_dropped,
+            "detections": self.detections,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+def run_station_routine(station, deteccion):
+    """Acción por defecto: ejecuta la rutina del objetivo en el EV3 del puesto (como main_pc)."""
+    objetivo, confianza, etiqueta = deteccion
+    vel, altura = station.targets[objetivo]
+    logging.info(f"[{station.name}] Detectado {etiqueta} ({confianza:.2f}). Ejecutando rutina en EV3...")
+    script = "rutina_caja.py" if objetivo == "carton" else "rutina_botella.py"
+    if send_routine(script, vel, altura, host=station.ev3_host) == "OK":
+        logging.info(f"[{station.name}] Rutina ejecutada correctamente en EV3.")
+    else:
+        logging.error(f"[{station.name}] Falló la ejecución en EV3.")
+
+
+class MultiCameraManager:
+    """
+    Reúne los frames nuevos de todos los puestos en un lote, ejecuta una sola inferencia y
+    entrega cada resultado a su puesto. Las rutinas del EV3 se ejecutan en segundo plano
+    (una a la vez por puesto), así un puesto ocupado no frena la clasificación de los demás.
+    """
+
+    def __init__(self, stations, max_batch=MAX_BATCH, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            stations (list): Lista de Station.
+            max_batch (int, optional): Máximo de frames por lote. Default=MAX_BATCH.
+            poll_interval (float, optional): Espera cuando ningún puesto tiene frames nuevos. Default=POLL_INTERVAL.
+        """
+        if not stations:
+            raise ValueError("MultiCameraManager necesita al menos un puesto")
+        self.stations = list(stations)
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.batches = 0
+        self.batch_frames = 0
+        self._next = 0  # puesto por el que empieza el siguiente lote (reparto equitativo con max_batch)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._actions = ThreadPoolExecutor(max_workers=len(self.stations), thread_name_prefix="ev3-action")
+
+    def step(self):
+        """
+        Un ciclo: recoge los frames nuevos, los clasifica en un solo lote y enruta los resultados.
+
+        Returns:
+            int: Frames clasificados en este ciclo.
+        """
+        count = len(self.stations)
+        order = self.stations[self._next:] + self.stations[:self._next]
+        pending = []
+        for station in order:
+            if self.max_batch is not None and len(pending) >= self.max_batch:
+                break
+            frame = station.poll()
+            if frame is not None:
+                pending.append((station, frame))
+        self._next = (self._next + 1) % count
+        if not pending:
+            return 0
+
+        probs = predict_regions_batch(
+            [(frame.image, station.roi, station.tiles, station.overlap) for station, frame in pending],
+            caches=[station.cache for station, _ in pending],
+        )
+        now = time.time()
+        self.batches += 1
+        self.batch_frames += len(pending)
+        for (station, frame), station_probs in zip(pending, probs):
+            deteccion = station.matcher.match(station_probs)
+            station.record(frame, deteccion, now)
+            if deteccion is not None:
+                self._dispatch(station, deteccion)
+        return len(pending)
+
+    def _dispatch(self, station, deteccion):
+        if station.busy:
+            logging.debug(f"[{station.name}] Rutina en curso; se ignora la detección")
+            return
+        station.busy = True
+        station.detections += 1
+
+        def _run():
+            try:
+                station.on_detection(station, deteccion)
+            except Exception as e:
+                logging.error(f"[{station.name}] Error en la acción: {e}")
+            finally:
+                station.busy = False
+
+        self._actions.submit(_run)
+
+    def run(self):
+        """Bucle de clasificación hasta `stop()`."""
+        while not self._stopped.is_set():
+            if self.step() == 0:
+                if all(station.source.finished for station in self.stations):
+                    logging.info("Todas las fuentes de frames se agotaron.")
+                    break
+                self._stopped.wait(self.poll_interval)
+
+    def start(self):
+        """Ejecuta `run()` en un hilo propio."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="MultiCameraManager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el bucle, espera las rutinas en curso y libera las fuentes."""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._actions.shutdown(wait=True)
+        for station in self.stations:
+            try:
+                station.source.release()
+            except Exception as e:
+                logging.error(f"[{station.name}] Error al liberar la fuente: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Tamaño medio de lote y estadísticas por puesto.
+        """
+        return {
+            "batches": self.batches,
+            "mean_batch": self.batch_frames / self.batches if self.batches else 0.0,
+            "stations": {station.name: station.stats() for station in self.stations},
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"Lotes: {stats['batches']} (media {stats['mean_batch']:.2f} frames)")
+        for name, st in stats["stations"].items():
+            latency = st["latency_ms"]
+            latency_txt = f"p50={latency['p50']:.0f}ms p99={latency['p99']:.0f}ms" if latency else "sin datos"
+            logging.info(f"[{name}] {st['fps']:.1f} fps, latencia {latency_txt}, cola {st['queue_depth']}, "
+                         f"clasificados {st['classified']}, descartados {st['dropped']}, detecciones {st['detections']}")
+            if st["cache"]:
+                logging.info(f"[{name}] caché: {st['cache']['hits']} aciertos / {st['cache']['misses']} fallos "
+                             f"({st['cache']['hit_rate']:.1%}), {st['cache']['entries']} entradas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varias cámaras con un clasificador compartido")
+    parser.add_argument("--stats", type=float, default=10.0, help="segundos entre estadísticas")
+    args = parser.parse_args()
+
+    load_model()
+    warmup(batch_size=len(STATIONS))
+    stations = []
+    try:
+        for config in STATIONS:
+            config = dict(config)
+            stations.append(Station(config.pop("name"), config.pop("source"), **config))
+        manager = MultiCameraManager(stations)
+    except Exception:
+        for station in stations:
+            station.source.release()
+        raise
+    manager.start()
+    try:
+        while manager._thread.is_alive():
+            manager._thread.join(timeout=args.stats)
+            manager.log_stats()
+    except KeyboardInterrupt:
+        logging.info("Ejecución interrumpida por el usuario.")
+    finally:
+        manager.stop()
+        manager.log_stats()
+
+
+if __name__ == "__main__":
+    main()
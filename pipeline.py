@@ -0,0 +1,412 @@
+"""
+pipeline.py
+
+Motor de pipeline por etapas para el flujo captura→clasificación→decisión→actuación.
+
+Una fuente produce elementos y cada etapa los procesa con uno o varios hilos de trabajo;
+las etapas se conectan con colas acotadas con política por etapa:
+    - "drop_oldest": si la cola está llena se descarta el elemento más antiguo (prioriza frescura).
+    - "block": el productor espera a que haya sitio (contrapresión hacia las etapas anteriores).
+Opcionalmente una etapa descarta los elementos más viejos que `max_age` segundos al sacarlos
+de la cola (p. ej. no actuar sobre una detección de hace varios segundos).
+Cada elemento lleva su marca de creación (la captura del frame) y la hora de salida de cada
+etapa; `stats()` reporta por etapa procesados, descartados, profundidad de cola, tiempo de
+servicio y latencia desde la captura. Así el ajuste de rendimiento se hace en un solo sitio.
+
+Usado por main_pc.py, logica_paletizadora.py y app_gui.py.
+"""
+
+
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from camera import Frame
+
+
+POLICIES = ("drop_oldest", "block")
+# Espera de los hilos cuando no hay trabajo (segundos)
+POLL_INTERVAL = 0.005
+# Muestras guardadas por etapa para las estadísticas de tiempos
+STATS_WINDOW = 200
+
+
+class PipelineItem:
+    """Elemento en tránsito: carga útil, número de secuencia y marcas de tiempo por etapa."""
+
+    __slots__ = ("payload", "seq", "created", "timestamps")
+
+    def __init__(self, payload, seq, created=None):
+        self.payload = payload
+        self.seq = seq
+        self.created = created if created is not None else time.time()
+        self.timestamps = {}
+
+    def age(self, now=None):
+        """Segundos desde la creación (captura) del elemento."""
+        return (now or time.time()) - self.created
+
+
+class BoundedQueue:
+    """Cola acotada thread-safe con política de desborde "drop_oldest" o "block"."""
+
+    def __init__(self, maxsize, policy="drop_oldest"):
+        if maxsize < 1:
+            raise ValueError("La cola necesita al menos una posición")
+        if policy not in POLICIES:
+            raise ValueError(f"Política de cola desconocida: {policy} (use {', '.join(POLICIES)})")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item, stopped):
+        """
+        Encola un elemento aplicando la política. Con "block" espera hasta que haya sitio
+        o hasta que `stopped` se active.
+
+        Returns:
+            bool: False si no se encoló porque el pipeline se detuvo.
+        """
+        with self._cond:
+            while len(self._items) >= self.maxsize:
+                if self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                    break
+                if stopped.is_set():
+                    return False
+                self._cond.wait(POLL_INTERVAL * 10)
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout):
+        """
+        Returns:
+            PipelineItem | None: Siguiente elemento, o None si no llegó ninguno en `timeout`.
+        """
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+                if not self._items:
+                    return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Stage:
+    """
+    Etapa del pipeline: `fn(payload)` retorna la nueva carga útil o None para no pasar el
+    elemento a la siguiente etapa. `setup()` se llama una vez en cada hilo de trabajo antes
+    del primer elemento (p. ej. cargar el modelo fuera del hilo de la GUI) y `on_output(payload)`
+    con cada resultado (p. ej. emitir una señal de Qt).
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=2, policy="drop_oldest", max_age=None,
+                 setup=None, on_output=None):
+        if workers < 1:
+            raise ValueError(f"La etapa {name} necesita al menos un hilo de trabajo")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = BoundedQueue(queue_size, policy)
+        self.max_age = max_age
+        self.setup = setup
+        self.on_output = on_output
+        self.processed = 0
+        self.filtered = 0
+        self.expired = 0
+        self.errors = 0
+        self.latest = None
+        self.done = threading.Event()
+        self._active_workers = 0
+        self._stats_lock = threading.Lock()
+        self._service_ms = deque(maxlen=STATS_WINDOW)
+        self._latency_ms = deque(maxlen=STATS_WINDOW)
+
+    def _record(self, item, started, now):
+        with self._stats_lock:
+            self.processed += 1
+            self._service_ms.append((now - started) * 1000.0)
+            self._latency_ms.append(item.age(now) * 1000.0)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Contadores, profundidad de cola y tiempos (ms, p50/p99) de servicio y de latencia desde la captura.
+        """
+        with self._stats_lock:
+            service, latency = list(self._service_ms), list(self._latency_ms)
+            processed, filtered, expired, errors = self.processed, self.filtered, self.expired, self.errors
+        return {
+            "processed": processed,
+            "filtered": filtered,
+            "dropped": self.queue.dropped,
+            "expired": expired,
+            "errors": errors,
+            "queue_depth": len(self.queue),
+            "service_ms": _percentiles(service),
+            "latency_ms": _percentiles(latency),
+        }
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples, dtype=np.float64)
+    return {"p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99))}
+
+
+class Pipeline:
+    """
+    Pipeline lineal: una fuente seguida de etapas conectadas por colas acotadas.
+
+    Ejemplo:
+        pipeline = (Pipeline("main_pc")
+                    .source("captura", frame_source_reader(camera), interval=0.5)
+                    .stage("clasificar", clasificar, queue_size=2, policy="drop_oldest")
+                    .stage("actuar", actuar, queue_size=1, max_age=1.0))
+        pipeline.start()
+    """
+
+    def __init__(self, name="pipeline"):
+        self.name = name
+        self.stages = []
+        self.finished = threading.Event()
+        self._source = None
+        self._interval = 0.0
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def source(self, name, fn, interval=0.0, on_output=None):
+        """
+        Define la fuente: `fn()` retorna una carga útil, None si aún no hay nada nuevo, o lanza
+        StopIteration cuando se agota. La marca de creación del elemento es el `timestamp` de
+        la carga útil si lo tiene (Frame) o la hora actual.
+
+        Args:
+            name (str): Nombre de la etapa fuente.
+            fn (callable): Productor de cargas útiles.
+            interval (float, optional): Tiempo mínimo entre elementos (limita el ritmo). Default=0.0.
+            on_output (callable, optional): fn(payload) con cada elemento producido. Default=None.
+
+        Returns:
+            Pipeline: self (para encadenar).
+        """
+        self._source = Stage(name, fn, on_output=on_output)
+        self._interval = interval
+        return self
+
+    def stage(self, name, fn, workers=1, queue_size=2, policy="drop_oldest", max_age=None,
+              setup=None, on_output=None):
+        """
+        Añade una etapa al final del pipeline (ver `Stage`).
+
+        Args:
+            name (str): Nombre de la etapa.
+            fn (callable): fn(payload) -> nueva carga útil o None.
+            workers (int, optional): Hilos de trabajo. Default=1.
+            queue_size (int, optional): Tamaño de la cola de entrada. Default=2.
+            policy (str, optional): "drop_oldest" o "block". Default="drop_oldest".
+            max_age (float, optional): Descartar elementos más viejos (segundos desde la captura). Default=None.
+            setup (callable, optional): Inicialización por hilo de trabajo. Default=None.
+            on_output (callable, optional): fn(payload) con cada resultado. Default=None.
+
+        Returns:
+            Pipeline: self (para encadenar).
+        """
+        self.stages.append(Stage(name, fn, workers, queue_size, policy, max_age, setup, on_output))
+        return self
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self.finished.is_set()
+
+    def start(self):
+        """Arranca el hilo de la fuente y los hilos de trabajo de cada etapa."""
+        if self._source is None:
+            raise RuntimeError(f"El pipeline {self.name} no tiene fuente")
+        self._stopped.clear()
+        self.finished.clear()
+        self._threads = [threading.Thread(target=self._source_loop, name=f"{self.name}-{self._source.name}",
+                                          daemon=True)]
+        upstream = self._source
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            stage._active_workers = stage.workers
+            for n in range(stage.workers):
+                self._threads.append(threading.Thread(target=self._worker_loop, args=(stage, upstream, downstream),
+                                                      name=f"{self.name}-{stage.name}-{n}", daemon=True))
+            upstream = stage
+        for thread in self._threads:
+            thread.start()
+
+    def _emit(self, stage, item, downstream):
+        stage.latest = item.payload
+        if stage.on_output is not None:
+            try:
+                stage.on_output(item.payload)
+            except Exception as e:
+                logging.error(f"Error en la salida de la etapa {stage.name}: {e}")
+        if downstream is not None:
+            downstream.queue.put(item, self._stopped)
+
+    def _source_loop(self):
+        source = self._source
+        downstream = self.stages[0] if self.stages else None
+        seq = 0
+        last = 0.0
+        try:
+            while not self._stopped.is_set():
+                wait = last + self._interval - time.time()
+                if wait > 0:
+                    self._stopped.wait(wait)
+                    continue
+                started = time.time()
+                try:
+                    payload = source.fn()
+                except StopIteration:
+                    logging.info(f"Pipeline {self.name}: la fuente {source.name} se agotó")
+                    break
+                except Exception as e:
+                    source.errors += 1
+                    logging.error(f"Error en la fuente {source.name}: {e}")
+                    self._stopped.wait(POLL_INTERVAL * 20)
+                    continue
+                if payload is None:
+                    self._stopped.wait(POLL_INTERVAL)
+                    continue
+                last = started
+                seq += 1
+                item = PipelineItem(payload, seq, getattr(payload, "timestamp", None))
+                now = time.time()
+                item.timestamps[source.name] = now
+                source._record(item, started, now)
+                self._emit(source, item, downstream)
+        finally:
+            source.done.set()
+            if not self.stages:
+                self.finished.set()
+
+    def _worker_loop(self, stage, upstream, downstream):
+        try:
+            if stage.setup is not None:
+                try:
+                    stage.setup()
+                except Exception as e:
+                    logging.error(f"Error inicializando la etapa {stage.name}: {e}")
+                    self.stop(wait=False)
+                    return
+            while not self._stopped.is_set():
+                item = stage.queue.get(POLL_INTERVAL * 10)
+                if item is None:
+                    if upstream.done.is_set() and not len(stage.queue):
+                        break
+                    continue
+                started = time.time()
+                # Contadores bajo el mismo lock que _record: con workers > 1 compiten entre hilos
+                if stage.max_age is not None and item.age(started) > stage.max_age:
+                    with stage._stats_lock:
+                        stage.expired += 1
+                    continue
+                try:
+                    result = stage.fn(item.payload)
+                except Exception as e:
+                    with stage._stats_lock:
+                        stage.errors += 1
+                    logging.error(f"Error en la etapa {stage.name}: {e}")
+                    continue
+                now = time.time()
+                if result is None:
+                    with stage._stats_lock:
+                        stage.filtered += 1
+                        stage._service_ms.append((now - started) * 1000.0)
+                    continue
+                item.payload = result
+                item.timestamps[stage.name] = now
+                stage._record(item, started, now)
+                self._emit(stage, item, downstream)
+        finally:
+            with stage._stats_lock:
+                stage._active_workers -= 1
+                last_worker = stage._active_workers == 0
+            if last_worker:
+                stage.done.set()
+                if stage is self.stages[-1]:
+                    self.finished.set()
+
+    def latest(self, name):
+        """Última carga útil producida por la fuente o la etapa `name` (p. ej. para mostrarla)."""
+        for stage in [self._source] + self.stages:
+            if stage.name == name:
+                return stage.latest
+        raise KeyError(name)
+
+    def wait(self, timeout=None):
+        """Espera a que el pipeline termine. Retorna True si terminó."""
+        return self.finished.wait(timeout)
+
+    def stop(self, wait=True, timeout=5.0):
+        """Detiene la fuente y las etapas (los elementos pendientes se descartan)."""
+        self._stopped.set()
+        for stage in self.stages:
+            stage.queue.clear()
+        if wait:
+            deadline = time.time() + timeout
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=max(0.0, deadline - time.time()))
+        self.finished.set()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Estadísticas por etapa (fuente incluida), en orden.
+        """
+        return {stage.name: stage.stats() for stage in [self._source] + self.stages}
+
+    def log_stats(self):
+        for name, st in self.stats().items():
+            latency = st["latency_ms"]
+            latency_txt = f"latencia p50={latency['p50']:.0f}ms p99={latency['p99']:.0f}ms" if latency else "sin datos"
+            logging.info(f"[{self.name}/{name}] procesados {st['processed']}, filtrados {st['filtered']}, "
+                         f"descartados {st['dropped']}, caducados {st['expired']}, errores {st['errors']}, "
+                         f"cola {st['queue_depth']}, {latency_txt}")
+
+
+def frame_source_reader(source):
+    """
+    Adapta una `camera.FrameSource` como fuente de pipeline: entrega cada frame nuevo una sola
+    vez (por número de secuencia) y lanza StopIteration cuando una fuente finita se agota.
+    Los frames de fuentes sin copia (memoria compartida) se copian, porque cruzan de hilo.
+    """
+    last_seq = [None]
+
+    def read():
+        frame = source.get_frame_info()
+        if frame.image is None:
+            if source.finished:
+                raise StopIteration
+            return None
+        if frame.seq == last_seq[0]:
+            return None
+        last_seq[0] = frame.seq
+        if getattr(source, "zero_copy", False):
+            frame = Frame(frame.image.copy(), frame.timestamp, frame.seq)
+        return frame
+
+    return read
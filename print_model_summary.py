@@ -1,7 +1,9 @@
 """
 print_model_summary.py
 Imprime el resumen del modelo EfficientNetV2B0 y el número total de parámetros.
-Usa el mismo modelo que `classifier.py`.
+Usa el mismo modelo que `classifier.py`: si existe el artefacto congelado en la
+caché local (`python export_model.py frozen`) lo carga desde ahí, sin red; si no,
+construye el modelo Keras.
 
 Ejecución:
     python .\print_model_summary.py
@@ -18,15 +20,43 @@ except Exception as e:
     print("ERROR: no se pudo importar TensorFlow:", e)
     sys.exit(2)
 
+import classifier
+
+
+def print_frozen_summary():
+    """Resume el artefacto congelado: nodos, tipos de operación y parámetros constantes."""
+    backend = classifier.FrozenGraphBackend()
+    graph = backend._forward.graph
+    ops = graph.get_operations()
+    op_types = {}
+    params = 0
+    for op in ops:
+        op_types[op.type] = op_types.get(op.type, 0) + 1
+        if op.type == "Const":
+            shape = op.outputs[0].shape
+            if shape.rank:
+                params += shape.num_elements() or 0
+    print("Artefacto congelado:", backend.artifact_dir)
+    print("sha256:", backend.manifest.get("sha256"), "| TensorFlow:", backend.manifest.get("tensorflow"))
+    print("Operaciones por tipo:")
+    for op_type, count in sorted(op_types.items(), key=lambda kv: -kv[1]):
+        print(f"  {op_type:<28}{count:>6}")
+    print("Parametros totales (constantes):", params)
+    print("Numero de nodos:", len(ops))
+
+
 try:
-    model = EfficientNetV2B0(weights="imagenet", include_top=True, input_shape=(224,224,3))
-    model.summary()
-    print("Parametros totales:", model.count_params())
-    try:
-        print("Numero de capas (len(model.layers)):", len(model.layers))
-    except Exception:
-        # fallback if layers attribute not available for some reason
-        print("Numero de capas: (no disponible)")
+    if classifier.frozen_artifact_available():
+        print_frozen_summary()
+    else:
+        model = EfficientNetV2B0(weights="imagenet", include_top=True, input_shape=(224,224,3))
+        model.summary()
+        print("Parametros totales:", model.count_params())
+        try:
+            print("Numero de capas (len(model.layers)):", len(model.layers))
+        except Exception:
+            # fallback if layers attribute not available for some reason
+            print("Numero de capas: (no disponible)")
 except Exception as e:
     print("ERROR al construir o cargar el modelo:", e)
     sys.exit(3)
@@ -0,0 +1,330 @@
+r"""
+shm_transport.py
+
+Transporte de frames por memoria compartida entre un proceso de captura y el proceso de inferencia.
+
+La captura y la decodificación JPEG corren en un proceso aparte que escribe cada frame en un
+buffer circular de `multiprocessing.shared_memory`. El proceso principal los lee sin copia como
+vistas NumPy: entre procesos solo viajan índices de ranura y números de secuencia (cabecera en la
+misma memoria compartida). Así la captura no compite por el GIL con TensorFlow ni con la GUI y sus
+fps no caen durante una pasada del modelo.
+
+Uso desde configuración (ver frame_sources.open_source):
+    FRAME_SOURCE = {"type": "shared_memory", "source": {"type": "camera", "urls": CAMERA_URLS}}
+
+Benchmark (fps de captura en reposo y con el clasificador ocupado, en proceso vs memoria compartida):
+    python .\shm_transport.py bench --url http://192.168.1.28:8080/video --seconds 10
+    python .\shm_transport.py bench --video .\grabacion.mp4
+"""
+
+
+import argparse
+import logging
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from camera import Frame, FrameSource
+
+
+# Campos de la cabecera (int64) al inicio del segmento compartido
+_LATEST_SLOT = 0    # ranura del último frame publicado (-1 = ninguno)
+_LATEST_SEQ = 1     # secuencia del último frame publicado
+_HELD_SLOT = 2      # ranura que está leyendo el consumidor (el escritor no la toca)
+_WRITTEN = 3        # frames escritos por el proceso de captura
+_HEADER_FIELDS = 4
+
+# Ranuras del buffer circular: una retenida por el consumidor, una en escritura y margen
+DEFAULT_SLOTS = 4
+# Espera del escritor cuando la fuente aún no tiene un frame nuevo (segundos)
+POLL_INTERVAL = 0.001
+
+
+def _layout(slots, shape):
+    """Retorna (bytes de cabecera, bytes de marcas de tiempo, bytes por frame, tamaño total)."""
+    header = 8 * (_HEADER_FIELDS + slots)
+    stamps = 8 * slots
+    frame_bytes = int(np.prod(shape))
+    offset = -(-(header + stamps) // 64) * 64  # frames alineados a 64 bytes
+    return header, stamps, frame_bytes, offset + slots * frame_bytes
+
+
+class _RingViews:
+    """Vistas NumPy sobre el segmento compartido: cabecera, secuencia y marca de tiempo por ranura, frames."""
+
+    def __init__(self, shm, slots, shape):
+        header, stamps, frame_bytes, _ = _layout(slots, shape)
+        buf = shm.buf
+        self.header = np.ndarray((_HEADER_FIELDS + slots,), dtype=np.int64, buffer=buf)
+        self.slot_seq = self.header[_HEADER_FIELDS:]
+        self.stamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=header)
+        offset = -(-(header + stamps) // 64) * 64
+        self.frames = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=buf, offset=offset)
+
+
+def _close_segment(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # Aún quedan vistas NumPy vivas (p. ej. el último frame entregado): se libera con ellas
+        logging.debug("Segmento compartido con vistas activas; se cerrará al liberarlas")
+
+
+def _capture_process(source_config, conn, lock, stop):
+    """
+    Proceso de captura: abre la fuente, informa la forma del frame, se conecta al segmento
+    creado por el proceso principal y publica cada frame nuevo en el buffer circular.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    from frame_sources import open_source
+
+    source = None
+    shm = None
+    ring = None
+    try:
+        source = open_source(source_config)
+        first = source.get_frame_info()
+        deadline = time.time() + 10.0
+        while first.image is None and not source.finished and time.time() < deadline:
+            time.sleep(0.05)
+            first = source.get_frame_info()
+        if first.image is None:
+            conn.send(("error", "la fuente no entregó ningún frame"))
+            return
+        shape = first.image.shape
+        conn.send(("shape", shape, source.url, source.realtime))
+        name, slots = conn.recv()
+        shm = shared_memory.SharedMemory(name=name)
+        ring = _RingViews(shm, slots, shape)
+        height, width = shape[:2]
+
+        frame, last_seq, published, slot = first, None, 0, -1
+        while not stop.is_set():
+            if frame.image is None or frame.seq == last_seq:
+                if source.finished:
+                    break
+                time.sleep(POLL_INTERVAL)
+                frame = source.get_frame_info()
+                continue
+            last_seq = frame.seq
+            with lock:
+                # siguiente ranura que no esté retenida por el consumidor
+                held = ring.header[_HELD_SLOT]
+                slot = (slot + 1) % slots
+                if slot == held:
+                    slot = (slot + 1) % slots
+                ring.slot_seq[slot] = -1
+            image = frame.image
+            if image.shape != shape:
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            np.copyto(ring.frames[slot], image)
+            published += 1
+            with lock:
+                ring.slot_seq[slot] = published
+                ring.stamps[slot] = frame.timestamp or time.time()
+                ring.header[_LATEST_SLOT] = slot
+                ring.header[_LATEST_SEQ] = published
+                ring.header[_WRITTEN] = published
+            frame = source.get_frame_info()
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        logging.error(f"Error en el proceso de captura: {e}")
+        try:
+            conn.send(("error", str(e)))
+        except Exception:
+            pass
+    finally:
+        if source is not None:
+            source.release()
+        ring = None
+        if shm is not None:
+            _close_segment(shm)
+
+
+class SharedMemoryFrameSource(FrameSource):
+    """
+    Fuente de frames cuya captura corre en otro proceso (ver el docstring del módulo).
+
+    `get_frame_info()` retorna de inmediato el último frame publicado como una vista sin copia
+    del buffer compartido. La vista es válida hasta la siguiente llamada: el escritor nunca
+    toca la ranura retenida por el consumidor, pero sí la reutiliza después. Con `copy=True`
+    se entrega una copia (necesario si el frame se pasa a otro hilo, p. ej. a la GUI).
+    """
+
+    def __init__(self, source_config, slots=DEFAULT_SLOTS, copy=False, start_timeout=15.0):
+        """
+        Arranca el proceso de captura y crea el segmento compartido.
+
+        Args:
+            source_config (dict): Configuración de la fuente real para frame_sources.open_source.
+            slots (int, optional): Ranuras del buffer circular (mínimo 3). Default=DEFAULT_SLOTS.
+            copy (bool, optional): Entregar copias en lugar de vistas. Default=False.
+            start_timeout (float, optional): Espera máxima del primer frame en segundos. Default=15.0.
+
+        Raises:
+            ValueError: Si slots < 3.
+            RuntimeError: Si el proceso de captura no entrega un frame a tiempo.
+        """
+        if slots < 3:
+            raise ValueError("El buffer circular necesita al menos 3 ranuras")
+        self.slots = slots
+        self.copy = copy
+        self.zero_copy = not copy
+        self.shm = None
+        ctx = mp.get_context("spawn")
+        self._lock = ctx.Lock()
+        self._stop = ctx.Event()
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_capture_process, args=(source_config, child_conn, self._lock, self._stop),
+                                    name="captura-shm", daemon=True)
+        self._process.start()
+        try:
+            if not self._conn.poll(start_timeout):
+                raise RuntimeError("El proceso de captura no respondió a tiempo")
+            message = self._conn.recv()
+            if message[0] == "error":
+                raise RuntimeError(f"Error en el proceso de captura: {message[1]}")
+            _, self.shape, self.url, self.realtime = message
+            size = _layout(slots, self.shape)[3]
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self._ring = _RingViews(self.shm, slots, self.shape)
+            self._ring.header[:] = 0
+            self._ring.header[_LATEST_SLOT] = -1
+            self._ring.header[_HELD_SLOT] = -1
+            self._ring.slot_seq[:] = -1
+            self._conn.send((self.shm.name, slots))
+        except Exception:
+            self.release()
+            raise
+        self.finished = False
+        self.frames_read = 0
+        self._last_seq = 0
+        self._last_time = None
+        self._started = time.time()
+        logging.info(f"Captura en proceso aparte ({self._process.pid}) para {self.url}, frames {self.shape}")
+
+    def get_frame_info(self):
+        ring = self._ring
+        with self._lock:
+            slot = int(ring.header[_LATEST_SLOT])
+            if slot < 0:
+                ring.header[_HELD_SLOT] = -1
+                image = None
+            else:
+                ring.header[_HELD_SLOT] = slot
+                seq = int(ring.slot_seq[slot])
+                timestamp = float(ring.stamps[slot])
+                image = ring.frames[slot]
+        if image is None:
+            if not self._process.is_alive():
+                self.finished = True
+            return Frame(None, None, self._last_seq)
+        if seq != self._last_seq:
+            self._last_seq = seq
+            self._last_time = timestamp
+            self.frames_read += 1
+        elif not self._process.is_alive():
+            # la captura terminó y ya se entregó el último frame
+            self.finished = True
+        return Frame(image.copy() if self.copy else image, timestamp, seq)
+
+    def frame_age(self):
+        return None if self._last_time is None else time.time() - self._last_time
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frames escritos por la captura, fps de captura, frames leídos y descartados.
+        """
+        written = int(self._ring.header[_WRITTEN]) if self.shm is not None else 0
+        elapsed = time.time() - self._started
+        return {
+            "frames_written": written,
+            "capture_fps": written / elapsed if elapsed > 0 else 0.0,
+            "frames_read": self.frames_read,
+            "dropped_frames": max(0, written - self.frames_read),
+            "frame_age": self.frame_age(),
+        }
+
+    def release(self):
+        """Detiene el proceso de captura y libera el segmento compartido."""
+        self._stop.set()
+        if self._process.is_alive():
+            self._process.join(timeout=3.0)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self.shm is not None:
+            self._ring = None
+            _close_segment(self.shm)
+            self.shm.unlink()
+            self.shm = None
+
+
+def _measure_capture(source, seconds, busy):
+    """Mide los frames nuevos por segundo que recibe el consumidor, opcionalmente con el clasificador ocupado."""
+    from classifier import predict_batch
+
+    stop = threading.Event()
+    load = None
+    if busy:
+        dummy = np.zeros((480, 640, 3), dtype=np.uint8)
+
+        def _inference_loop():
+            # Carga de inferencia continua, como el bucle de clasificación real
+            while not stop.is_set():
+                predict_batch([dummy])
+
+        load = threading.Thread(target=_inference_loop, daemon=True)
+        load.start()
+    frames, last_seq = 0, None
+    end = time.time() + seconds
+    while time.time() < end:
+        frame = source.get_frame_info()
+        if frame.image is not None and frame.seq != last_seq:
+            last_seq = frame.seq
+            frames += 1
+        time.sleep(POLL_INTERVAL)
+    stop.set()
+    if load is not None:
+        load.join()
+    return frames / seconds
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Transporte de frames por memoria compartida")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="fps de captura con y sin inferencia, en proceso vs memoria compartida")
+    group = p_bench.add_mutually_exclusive_group(required=True)
+    group.add_argument("--url", help="URL de una cámara IP")
+    group.add_argument("--video", help="video reproducido en tiempo real")
+    p_bench.add_argument("--seconds", type=float, default=10.0)
+    p_bench.add_argument("--slots", type=int, default=DEFAULT_SLOTS)
+    args = parser.parse_args()
+
+    from classifier import load_model, warmup
+    from frame_sources import open_source
+
+    if args.url:
+        config = {"type": "camera", "urls": [args.url], "threaded": True}
+    else:
+        config = {"type": "video", "path": args.video, "realtime": True, "loop": True}
+    load_model()
+    warmup()
+    for label, factory in (
+        ("en proceso", lambda: open_source(config)),
+        ("memoria compartida", lambda: SharedMemoryFrameSource(config, slots=args.slots)),
+    ):
+        with factory() as source:
+            idle = _measure_capture(source, args.seconds, busy=False)
+            busy = _measure_capture(source, args.seconds, busy=True)
+        print(f"{label:>20}: {idle:6.1f} fps en reposo, {busy:6.1f} fps con el clasificador ocupado")
+
+
+if __name__ == "__main__":
+    main()
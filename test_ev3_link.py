@@ -0,0 +1,64 @@
+"""
+test_ev3_link.py
+
+Pruebas de EV3Link con el transporte simulado (sin EV3 ni sshd):
+    python -m pytest -q test_ev3_link.py
+"""
+
+
+import pytest
+
+from ev3_link import EV3ConnectionError, EV3Link
+
+
+def test_una_conexion_para_varios_comandos():
+    link = EV3Link("ev3-test", "robot", "fake")
+    for speed in (10, 20, 30):
+        result = link.run(f"rutina_botella.py {speed} 0.6")
+        assert result.returncode == 0
+        assert result.stdout == "OK\n"
+    assert link.transport.connects == 1
+    assert len(link.transport.commands) == 3
+    assert link.reconnects == 0
+
+
+def test_reconecta_tras_close():
+    link = EV3Link("ev3-test", "robot", "fake")
+    link.run("true")
+    link.close()
+    assert not link.transport.connected
+    link.run("true")
+    assert link.transport.connects == 2
+    assert link.transport.commands == ["true", "true"]
+
+
+def test_no_reintenta_si_falla_a_mitad_del_comando():
+    def handler(command):
+        # Como ParamikoTransport al perder la sesión con el comando ya lanzado
+        raise RuntimeError("Sesión SSH perdida durante el comando")
+
+    link = EV3Link("ev3-test", "robot", "fake", handler=handler)
+    with pytest.raises(RuntimeError):
+        link.run("rutina_botella.py 25 0.6")
+    assert link.transport.commands == ["rutina_botella.py 25 0.6"]
+    assert link.transport.connects == 1
+    assert link.reconnects == 0
+
+
+def test_reconecta_y_reintenta_si_la_sesion_se_cae():
+    link = EV3Link("ev3-test", "robot", "fake", drops=1)
+    result = link.run("rutina_botella.py 25 0.6")
+    assert result.returncode == 0
+    assert result.stdout == "OK\n"
+    assert link.reconnects == 1
+    assert link.transport.connects == 2
+    # La caída ocurre antes de enviar: el comando sale una sola vez, ya reconectado
+    assert link.transport.commands == ["rutina_botella.py 25 0.6"]
+
+
+def test_solo_reintenta_una_vez():
+    link = EV3Link("ev3-test", "robot", "fake", drops=2)
+    with pytest.raises(EV3ConnectionError):
+        link.run("true")
+    assert link.transport.commands == []
+    assert link.reconnects == 1